@@ -2,7 +2,11 @@ import os
 import subprocess
 import asyncio
 import logging
-from typing import Annotated, TypedDict, List
+import re
+import signal
+import time
+from functools import lru_cache
+from typing import Annotated, TypedDict, List, Optional
 
 from langchain_openai import AzureChatOpenAI
 
@@ -16,7 +20,17 @@ from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode, tools_condition  # tools_condition kept for compatibility; custom route_tools_or_end used instead
 
 # Import broadcast_log, workspace path, and process tracking from utils
-from utils import broadcast_log, get_workspace_path as _get_workspace_path, running_processes
+from utils import broadcast_log, get_workspace_path as _get_workspace_path, running_processes, loop_lag_monitor, current_session
+from review_cache import review_verdict_cache
+from file_cache import file_content_cache
+import file_ranges
+from request_classifier import KeywordMatcher, RequestProfile
+from task_plan import TaskPlan, PLAN_TYPES, plan_from_state, step_key, critical_path_report
+from plan_templates import (PLAN_TEMPLATE_CACHE, ARCHETYPES, ENTITY_FILL_PROMPT, extract_entities,
+                            extra_features, normalize_entities, parse_entity_fill,
+                            plan_template_cache)
+from workspace_index import get_workspace_index
+from workspace_walker import get_ignore_matcher
 
 # -------------------------------------------------
 # 1. Define Tools
@@ -43,6 +57,237 @@ def get_workspace_path():
         return workspace
     return os.getcwd()
 
+# -------------------------------------------------
+# COMMAND OUTPUT BUFFER (bounded capture + on-disk spill)
+# -------------------------------------------------
+# Verbose commands (npm install, dotnet test -v) can print tens of MB. Only the first
+# COMMAND_OUTPUT_HEAD_LINES, the last COMMAND_OUTPUT_TAIL_LINES and up to
+# COMMAND_OUTPUT_MAX_ERROR_LINES error-looking lines in between are kept in memory and
+# returned to the LLM. Every line is also written to COMMAND_LOG_DIR/<log_id>.log so the
+# agent can page through the full output with read_command_log; lines are batched and the
+# batches written by one background thread, so the read loop never waits on the disk.
+
+COMMAND_OUTPUT_HEAD_LINES = int(os.getenv("COMMAND_OUTPUT_HEAD_LINES", "60"))
+COMMAND_OUTPUT_TAIL_LINES = int(os.getenv("COMMAND_OUTPUT_TAIL_LINES", "120"))
+COMMAND_OUTPUT_MAX_ERROR_LINES = int(os.getenv("COMMAND_OUTPUT_MAX_ERROR_LINES", "80"))
+COMMAND_OUTPUT_MAX_LINE_CHARS = 2000
+COMMAND_LOG_DIR = os.getenv(
+    "COMMAND_LOG_DIR", os.path.join(os.path.expanduser("~"), ".neuralstack", "command_logs")
+)
+COMMAND_LOG_KEEP = int(os.getenv("COMMAND_LOG_KEEP", "200"))
+COMMAND_LOG_PRUNE_INTERVAL = 60.0  # seconds between pruning passes over COMMAND_LOG_DIR
+COMMAND_LOG_SPILL_BATCH = 64 * 1024  # chars buffered per command before a batch goes to the writer
+
+_ERROR_LINE_RE = re.compile(
+    r"\berror\b|\bfail(ed|ure)?\b|exception|traceback|npm ERR!|\berror [A-Z]{2,}\d+|❌",
+    re.IGNORECASE,
+)
+_LOG_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+
+
+class _BoundedLines:
+    """Head + tail ring buffer + error-line matches for one output stream."""
+
+    def __init__(self, head: int, tail: int, max_errors: int):
+        from collections import deque
+        self.head_cap = head
+        self.head = []
+        self.tail = deque(maxlen=tail)
+        self.errors = []
+        self.max_errors = max_errors
+        self.count = 0
+
+    def append(self, line: str):
+        if len(line) > COMMAND_OUTPUT_MAX_LINE_CHARS:
+            line = line[:COMMAND_OUTPUT_MAX_LINE_CHARS] + " …(line truncated)"
+        entry = (self.count, line)
+        self.count += 1
+        if len(self.head) < self.head_cap:
+            self.head.append(entry)
+            return
+        if self.tail.maxlen and len(self.tail) == self.tail.maxlen:
+            evicted = self.tail[0]
+            if len(self.errors) < self.max_errors and _ERROR_LINE_RE.search(evicted[1]):
+                self.errors.append(evicted)
+        self.tail.append(entry)
+
+    @property
+    def truncated(self) -> bool:
+        return self.count > len(self.head) + len(self.tail)
+
+    def __bool__(self):
+        return self.count > 0
+
+    def render(self) -> str:
+        entries = self.head + self.errors + list(self.tail)
+        out, expected = [], 0
+        for lineno, line in entries:
+            if lineno > expected:
+                out.append(f"... [{lineno - expected} lines omitted] ...")
+            out.append(line)
+            expected = lineno + 1
+        return "\n".join(out)
+
+
+class _SpillWriter:
+    """One daemon thread that writes spill batches and closes spill files, in submission order."""
+
+    def __init__(self):
+        import queue
+        import threading
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, fh, text: str, close: bool = False):
+        import threading
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="command-log-writer", daemon=True)
+                self._thread.start()
+        self._queue.put((fh, text, close))
+
+    def _run(self):
+        while True:
+            fh, text, close = self._queue.get()
+            try:
+                if text:
+                    fh.write(text)
+                if close:
+                    fh.close()
+            except (OSError, ValueError) as e:
+                logger.warning("[command_log] spill write failed for %s: %s", getattr(fh, "name", "?"), e)
+
+
+_spill_writer = _SpillWriter()
+
+
+class CommandOutput:
+    """Bounded in-memory capture of one command's stdout/stderr, fully spilled to disk."""
+
+    def __init__(self, command: str):
+        import uuid
+        self.log_id = uuid.uuid4().hex[:12]
+        self.path = os.path.join(COMMAND_LOG_DIR, f"{self.log_id}.log")
+        self.stdout = _BoundedLines(COMMAND_OUTPUT_HEAD_LINES, COMMAND_OUTPUT_TAIL_LINES,
+                                    COMMAND_OUTPUT_MAX_ERROR_LINES)
+        self.stderr = _BoundedLines(COMMAND_OUTPUT_HEAD_LINES, COMMAND_OUTPUT_TAIL_LINES,
+                                    COMMAND_OUTPUT_MAX_ERROR_LINES)
+        try:
+            os.makedirs(COMMAND_LOG_DIR, exist_ok=True)
+            _schedule_log_prune()
+            self._fh = open(self.path, "w", encoding="utf-8", errors="replace")
+        except OSError as e:
+            logger.warning("[command_log] spill disabled for this command: %s", e)
+            self._fh = None
+        self._pending = [f"$ {command}\n"]
+        self._pending_chars = 0
+
+    def add(self, stream: str, line: str):
+        (self.stderr if stream == "stderr" else self.stdout).append(line)
+        if self._fh:
+            entry = f"[stderr] {line}\n" if stream == "stderr" else f"{line}\n"
+            self._pending.append(entry)
+            self._pending_chars += len(entry)
+            if self._pending_chars >= COMMAND_LOG_SPILL_BATCH:
+                self._flush()
+
+    def _flush(self, close: bool = False):
+        _spill_writer.submit(self._fh, "".join(self._pending), close)
+        self._pending, self._pending_chars = [], 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.stdout.truncated or self.stderr.truncated
+
+    def close(self):
+        if self._fh:
+            self._flush(close=True)
+            self._fh = None
+
+    def notice(self) -> str:
+        """Pointer to the full log, appended to the tool result when output was cut."""
+        if not self.truncated:
+            return ""
+        total = self.stdout.count + self.stderr.count
+        if not os.path.exists(self.path):
+            return f"\n[Output truncated: {total} lines total; the full log could not be saved.]"
+        return (f"\n[Output truncated: {total} lines total (log_id={self.log_id}). "
+                f"Use read_command_log with this log_id to page through the full output.]")
+
+
+_last_log_prune = 0.0
+
+
+def _schedule_log_prune():
+    """Prune spill files at most once per COMMAND_LOG_PRUNE_INTERVAL, in a worker thread when on the loop."""
+    global _last_log_prune
+    now = time.monotonic()
+    if now - _last_log_prune < COMMAND_LOG_PRUNE_INTERVAL:
+        return
+    _last_log_prune = now
+    try:
+        asyncio.get_running_loop().run_in_executor(None, _prune_command_logs)
+    except RuntimeError:  # no event loop (sync caller)
+        _prune_command_logs()
+
+
+def _prune_command_logs():
+    """Keep only the newest COMMAND_LOG_KEEP spill files."""
+    try:
+        entries = [e for e in os.scandir(COMMAND_LOG_DIR) if e.name.endswith(".log")]
+    except OSError:
+        return
+    if len(entries) < COMMAND_LOG_KEEP:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for e in entries[:len(entries) - COMMAND_LOG_KEEP + 1]:
+        try:
+            os.remove(e.path)
+        except OSError:
+            pass
+
+
+@tool
+def read_command_log(log_id: str, offset: int = 0, limit: int = 200, pattern: str = ""):
+    """
+    Page through the full output of an earlier execute_terminal command whose result was truncated.
+
+    Args:
+        log_id: The log_id printed in the "[Output truncated ...]" notice
+        offset: First line to return (0-based, counted after pattern filtering)
+        limit: Maximum number of lines to return (max 500)
+        pattern: Optional case-insensitive regex; only matching lines are returned (e.g. "error CS|FAILED")
+
+    Returns: Numbered lines from the saved log, stderr lines prefixed with [stderr]
+    """
+    from itertools import islice
+
+    if not _LOG_ID_RE.match(log_id or ""):
+        return f"Error: invalid log_id '{log_id}'"
+    path = os.path.join(COMMAND_LOG_DIR, f"{log_id}.log")
+    if not os.path.exists(path):
+        return f"Error: no saved log for log_id {log_id} (it may have been pruned)"
+    try:
+        matcher = re.compile(pattern, re.IGNORECASE) if pattern else None
+    except re.error as e:
+        return f"Error: invalid pattern: {e}"
+    offset, limit = max(0, offset), max(1, min(limit, 500))
+
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        numbered = ((n, line.rstrip("\n")) for n, line in enumerate(fh))
+        if matcher:
+            numbered = ((n, line) for n, line in numbered if matcher.search(line))
+        page = list(islice(numbered, offset, offset + limit + 1))
+    more = len(page) > limit
+    page = page[:limit]
+    if not page:
+        return f"No lines at offset {offset}" + (f" matching '{pattern}'" if pattern else "")
+    body = "\n".join(f"{n}: {line}" for n, line in page)
+    footer = f"\n[more lines — call again with offset={offset + limit}]" if more else "\n[end of log]"
+    return body + footer
+
+
 @tool
 async def execute_terminal(command: str):
     """
@@ -161,8 +406,8 @@ async def execute_terminal(command: str):
     # Notify UI that process started (for showing input controls)
     await broadcast_process_event("start", process_id, command)
 
-    stdout_lines = []
-    stderr_lines = []
+    # Bounded capture (head/tail/error lines); the full output is spilled to a log file
+    output = CommandOutput(command)
     
     # Read stdout
     async def read_stdout():
@@ -171,9 +416,9 @@ async def execute_terminal(command: str):
                 line = await process.stdout.readline()
                 if not line:
                     break
-                msg = line.decode().strip()
+                msg = line.decode(errors="replace").strip()
                 if msg:
-                    stdout_lines.append(msg)
+                    output.add("stdout", msg)
                     await broadcast_log(f"  {msg}")
             except Exception:
                 break
@@ -185,9 +430,9 @@ async def execute_terminal(command: str):
                 line = await process.stderr.readline()
                 if not line:
                     break
-                msg = line.decode().strip()
+                msg = line.decode(errors="replace").strip()
                 if msg:
-                    stderr_lines.append(msg)
+                    output.add("stderr", msg)
                     await broadcast_log(f"  ❌ {msg}")
             except Exception:
                 break
@@ -211,6 +456,8 @@ async def execute_terminal(command: str):
         await broadcast_log(f"⏱️ Command timed out after {COMMAND_TIMEOUT}s and was stopped: {command}")
     except Exception as e:
         await broadcast_log(f"⚠️ Process error: {e}")
+    finally:
+        output.close()
     
     # Clean up process tracking
     if process_id in running_processes:
@@ -222,10 +469,11 @@ async def execute_terminal(command: str):
     # Prepare result
     exit_code = process.returncode if process.returncode is not None else (-9 if timed_out else -1)
     result = {
-        "stdout": "\n".join(stdout_lines) if stdout_lines else "",
-        "stderr": "\n".join(stderr_lines) if stderr_lines else "",
+        "stdout": output.stdout.render(),
+        "stderr": output.stderr.render(),
         "exit_code": exit_code
     }
+    log_notice = output.notice()
     logger.info("[execute_terminal] Step 5: command finished exit_code=%s", exit_code)
     
     # Track command execution for summary
@@ -239,8 +487,8 @@ async def execute_terminal(command: str):
     
     if exit_code == 0:
         await broadcast_log(f"✅ Command completed successfully: {command}")
-        if stdout_lines:
-            return f"Command executed successfully.\nOutput:\n{result['stdout']}"
+        if output.stdout:
+            return f"Command executed successfully.\nOutput:\n{result['stdout']}{log_notice}"
         else:
             return "Command executed successfully (no output produced)."
     elif timed_out or exit_code == -9:
@@ -249,50 +497,213 @@ async def execute_terminal(command: str):
             err += f"Output so far:\n{result['stdout']}\n"
         if result["stderr"]:
             err += f"Stderr:\n{result['stderr']}"
-        return err
+        return err + log_notice
     elif exit_code == -15 or exit_code == 130:  # SIGTERM or SIGINT
         await broadcast_log(f"🛑 Command was terminated: {command}")
         return "Command was terminated by user."
     else:
         await broadcast_log(f"❌ Command failed with exit code {exit_code}: {command}")
         error_msg = f"Command failed with exit_code {exit_code}.\n"
-        if stderr_lines:
+        if output.stderr:
             error_msg += f"Error:\n{result['stderr']}\n"
-        if stdout_lines:
+        if output.stdout:
             error_msg += f"Output:\n{result['stdout']}"
-        return error_msg
+        return error_msg + log_notice
 
 
 async def broadcast_process_event(event_type: str, process_id: str, command: str):
     """Broadcast process start/end events to UI"""
-    from utils import connected_clients
+    from utils import broadcast_json
     
     message = {
         "type": f"process_{event_type}",
         "process_id": process_id,
         "command": command
     }
-    
-    for ws in connected_clients:
-        try:
-            await ws.send_json(message)
-        except Exception:
-            pass
+    await broadcast_json(message)
+
+
 
+# ── Edit blocks (manage_file action="edit") ──────
+# The agent sends only what changes — SEARCH/REPLACE blocks or a unified diff — instead of
+# re-emitting the whole file. Every block must match before anything is written.
+
+_EDIT_BLOCK_RE = re.compile(
+    r"^<{5,9} SEARCH[^\n]*\n(.*?)^={5,9}[ \t]*\n(.*?)^>{5,9} REPLACE[^\n]*$",
+    re.MULTILINE | re.DOTALL,
+)
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,\d+)? \+\d+(?:,\d+)? @@")
+# A file header: "--- a/x" directly followed by "+++ b/x" (optionally after "diff --git ...")
+_FILE_HEADER_RE = re.compile(r"^--- [^\n]*\n\+\+\+ [^\n]*$", re.MULTILINE)
+
+
+def _parse_edit_blocks(spec: str) -> list:
+    """[(search, replace, line hint or None)] from SEARCH/REPLACE blocks or a unified diff."""
+    blocks = [(m.group(1), m.group(2), None) for m in _EDIT_BLOCK_RE.finditer(spec)]
+    if blocks:
+        return blocks
+    if len(_FILE_HEADER_RE.findall(spec)) > 1 or len(re.findall(r"^diff --git ", spec, re.MULTILINE)) > 1:
+        raise ValueError("the diff touches more than one file; send one manage_file edit per file")
+    hunks, current = [], None
+    for line in spec.splitlines():
+        m = _HUNK_HEADER_RE.match(line)
+        if m:
+            current = ([], [], int(m.group(1)))
+            hunks.append(current)
+        elif current is None or line.startswith("\\ No newline"):
+            continue  # file headers ("--- a/x", "+++ b/x") only come before the first @@
+        elif line.startswith("-"):
+            current[0].append(line[1:])
+        elif line.startswith("+"):
+            current[1].append(line[1:])
+        else:  # context (a blank line is an empty context line)
+            current[0].append(line[1:])
+            current[1].append(line[1:])
+    return [("".join(l + "\n" for l in old), "".join(l + "\n" for l in new), hint)
+            for old, new, hint in hunks]
+
+
+def _locate(text: str, search: str, hint: int = None) -> tuple:
+    """
+    (start, end) of `search` in `text` as whole lines, falling back to a match that ignores
+    trailing whitespace on each line (indentation must still match); ties are broken by the
+    hunk's line hint. The final line may also match the file's last line when the file has no
+    trailing newline. Raises ValueError.
+    """
+    body, eol = (search[:-1], r"(?:\n|\Z)") if search.endswith("\n") else (search, r"(?=\n|\Z)")
+    # Anchored at a line start: "count = 0" must not match inside "total_count = 0"
+    hits = [(m.start(), m.end()) for m in re.finditer(r"(?m)^" + re.escape(body) + eol, text)]
+    if not hits and search.strip():
+        loose = r"[ \t]*\n".join(re.escape(l.rstrip()) for l in body.split("\n"))
+        hits = [(m.start(), m.end()) for m in re.finditer(r"(?m)^" + loose + r"[ \t]*" + eol, text)]
+    if not hits:
+        raise ValueError("not found")
+    if len(hits) == 1:
+        return hits[0]
+    if hint is None:
+        raise ValueError(f"matches {len(hits)} places — include more surrounding lines to make it unique")
+    return min(hits, key=lambda h: abs(text.count("\n", 0, h[0]) + 1 - hint))
+
+
+def _apply_edit_blocks(original: str, spec: str):
+    """
+    Apply SEARCH/REPLACE blocks (or unified-diff hunks) to `original`.
+    Returns (new content, unified diff of just the edited spans, block count); raises ValueError.
+    """
+    blocks = _parse_edit_blocks(spec or "")
+    if not blocks:
+        raise ValueError("no edit blocks found. Use <<<<<<< SEARCH / ======= / >>>>>>> REPLACE blocks "
+                         "or a unified diff with @@ hunk headers")
+    text = original
+    spans = []  # [start line in the new text, old lines, new lines]
+    shift = 0   # lines added so far: later hunks' line hints refer to the original file
+    for n, (search, replace, hint) in enumerate(blocks, 1):
+        if hint is not None:
+            hint += shift
+        if not search.strip():
+            if hint is None:
+                raise ValueError(f"block {n}: empty SEARCH section")
+            # Pure insertion hunk without context: insert after the hinted line
+            lines = text.splitlines(keepends=True)
+            idx = end = len("".join(lines[:max(hint, 0)]))
+        else:
+            try:
+                idx, end = _locate(text, search, hint)
+            except ValueError as e:
+                raise ValueError(f"block {n}: SEARCH text {e}:\n{search[:300]}") from None
+            if end == len(text) and not text.endswith("\n") and replace.endswith("\n"):
+                replace = replace[:-1]  # matched the last line: keep the file without a final newline
+        line = text.count("\n", 0, idx) + 1
+        old_lines, new_lines = text[idx:end].splitlines(), replace.splitlines()
+        text = text[:idx] + replace + text[end:]
+        delta = len(new_lines) - len(old_lines)
+        shift += delta
+        # Record only what changed, not the context lines the block carried to anchor itself
+        while old_lines and new_lines and old_lines[0] == new_lines[0]:
+            old_lines, new_lines, line = old_lines[1:], new_lines[1:], line + 1
+        while old_lines and new_lines and old_lines[-1] == new_lines[-1]:
+            old_lines, new_lines = old_lines[:-1], new_lines[:-1]
+        for span in spans:
+            if span[0] > line:
+                span[0] += delta
+        spans.append([line, old_lines, new_lines])
+
+    hunks, shift = [], 0
+    for start, old_lines, new_lines in sorted(spans, key=lambda s: s[0]):
+        hunks.append(f"@@ -{start - shift},{len(old_lines)} +{start},{len(new_lines)} @@")
+        hunks.extend("-" + l for l in old_lines)
+        hunks.extend("+" + l for l in new_lines)
+        shift += len(new_lines) - len(old_lines)
+    return text, "\n".join(hunks), len(blocks)
+
+
+# Files larger than this are never returned whole by manage_file(action="read"): the
+# agent gets a size/outline preamble plus the first page and pages on with start_line/offset.
+MANAGE_FILE_READ_MAX_BYTES = int(os.getenv("MANAGE_FILE_READ_MAX_BYTES", "200000"))
+
+
+def _paged_read(path: str, start_line: int = None, end_line: int = None,
+                offset: int = None, length: int = None) -> str:
+    """One window of a file for the agent, headed by where it sits in the file and how to continue."""
+    if offset is not None or (length is not None and start_line is None):
+        window = file_ranges.read_bytes(path, offset or 0, min(length or file_ranges.PAGE_BYTES, file_ranges.PAGE_BYTES * 2))
+        where = f"bytes {window['offset']:,}–{window['end_offset']:,} of {window['size']:,}"
+        nxt = f"offset={window['next_offset']}" if window["next_offset"] is not None else None
+        preamble = []
+    else:
+        window = file_ranges.read_lines(path, start_line or 1, end_line, max_bytes=file_ranges.PAGE_BYTES)
+        where = (f"lines {window['start_line']:,}–{window['end_line']:,} of {window['total_lines']:,} "
+                 f"({file_ranges.format_size(window['size'])})")
+        if window["next_line"] is not None:
+            nxt = f"start_line={window['next_line']}"
+        elif window["next_offset"] is not None:
+            nxt = f"offset={window['next_offset']}"
+        else:
+            nxt = None
+        preamble = []
+        if start_line is None and end_line is None:
+            # First look at an oversized file: say why it's paged and what is in it
+            info = file_ranges.describe(path)
+            preamble.append(f"📄 {path} is {file_ranges.format_size(info['size'])} / {info['total_lines']:,} lines "
+                            f"— too large to return whole. Page with start_line/end_line (or offset/length for "
+                            f"minified files).")
+            if info["outline"]:
+                preamble.append("Outline:\n" + "\n".join(f"  {entry}" for entry in info["outline"]))
+    header = f"[{where}" + (f" · next: {nxt}]" if nxt else " · end of file]")
+    return "\n".join(preamble + [header, window["content"] or "(empty range)"])
 
 
 @tool
-async def manage_file(path: str, content: str = None, action: str = "write"):
+async def manage_file(path: str, content: str = None, action: str = "write",
+                      start_line: int = None, end_line: int = None,
+                      offset: int = None, length: int = None):
     """
     Manages files - read or write operations.
     
     IMPORTANT: For 'write' action, changes are APPLIED DIRECTLY to the file!
     The changes will be tracked and shown in the sidebar with diff view and revert options.
     
+    Prefer action='edit' for changes to an existing file: send only SEARCH/REPLACE blocks
+    (or a unified diff) in `content` instead of the whole file:
+        <<<<<<< SEARCH
+        exact lines currently in the file (include enough to be unique)
+        =======
+        the lines to put there instead
+        >>>>>>> REPLACE
+    Several blocks may be sent at once; nothing is written unless every block matches.
+    
+    Large files (package-lock.json, migration snapshots, minified bundles) are not returned
+    whole: 'read' gives a size/outline preamble and the first page; pass start_line/end_line
+    (1-based, inclusive) or offset/length (bytes) to read further.
+    
     Args:
         path: File path (relative or absolute)
-        content: Content to write (required for write action)
-        action: 'write' to apply file changes, 'read' to read file contents
+        content: Content to write (write action), or SEARCH/REPLACE blocks / unified diff (edit action)
+        action: 'write' to write the whole file, 'edit' to patch an existing file, 'read' to read file contents
+        start_line: First line to read (read only)
+        end_line: Last line to read, inclusive (read only; default one page)
+        offset: Byte offset to read from (read only; for files with very long lines)
+        length: Number of bytes to read from offset (read only)
     
     Returns: Success message for write, file contents for read, or error message
     """
@@ -307,9 +718,9 @@ async def manage_file(path: str, content: str = None, action: str = "write"):
         file_name = os.path.basename(path)
         logger.info("[manage_file] Step 2: resolved path=%s", path)
         
-        if action == "write":
+        if action in ("write", "edit"):
             if content is None:
-                return "Error: content parameter is required for write action"
+                return f"Error: content parameter is required for {action} action"
 
             # Block writes to template folders (read-only) — do not edit or write solution/tests inside them
             norm_workspace = os.path.normpath(workspace_path)
@@ -317,39 +728,52 @@ async def manage_file(path: str, content: str = None, action: str = "write"):
             try:
                 rel = os.path.relpath(norm_path, norm_workspace)
                 if not rel.startswith("..") and not os.path.isabs(rel):
+                    # ./angularscaffolding/ is the COPIED Angular project (the template itself is
+                    # dotnettemplates/angularscaffolding/), so it is writable like ./dotnetwebapi/
                     first_part = rel.split(os.sep)[0] if os.sep in rel else rel
-                    if first_part in ("dotnettemplates", "templates", "template", "angularscaffolding"):
+                    if first_part in ("dotnettemplates", "templates", "template"):
                         logger.info("[manage_file] Step 3: BLOCKED write to template folder: first_part=%s", first_part)
-                        return ("Error: Writing to the template folder is not allowed. Template folders (dotnettemplates/, templates/, template/, angularscaffolding/) are read-only. "
-                                "Do not edit or write solution/test files inside the template. Write only to the COPIED project in the workspace (e.g. ./dotnetwebapi/, ./webapi/, ./dotnetconsole/).")
+                        return ("Error: Writing to the template folder is not allowed. Template folders (dotnettemplates/, templates/, template/, dotnettemplates/angularscaffolding/) are read-only. "
+                                "Do not edit or write solution/test files inside the template. Write only to the COPIED project in the workspace (e.g. ./dotnetwebapi/, ./webapi/, ./dotnetconsole/, ./angularscaffolding/angularapp/).")
             except ValueError:
                 pass
             
             # Check if file exists to determine if it's an edit or new file
             file_exists = os.path.exists(path)
+            if action == "edit" and not file_exists:
+                return f"❌ Error: File '{path}' does not exist — use action='write' to create it"
             
             if file_exists:
                 # Notify UI about editing
                 await broadcast_log(f"✏️ Editing: {file_name}")
                 
                 # Read existing content for diff and backup
-                with open(path, "r") as f:
-                    old_content = f.read()
+                old_content = file_content_cache.read(path)
+                
+                if action == "edit":
+                    # Apply the blocks server-side; the diff is just the edited spans
+                    try:
+                        content, diff_text, block_count = _apply_edit_blocks(old_content, content)
+                    except ValueError as e:
+                        await broadcast_log(f"⚠️ Edit not applied: {file_name}")
+                        return f"❌ Error: edit not applied to {path} (file unchanged): {e}"
+                    diff_text = f"--- {path} (original)\n+++ {path} (modified)\n{diff_text}"
                 
                 # Check if content is actually different
                 if old_content == content:
                     return f"✅ No changes needed - {path} already has this content"
                 
-                # Generate diff preview
-                import difflib
-                diff_lines = list(difflib.unified_diff(
-                    old_content.splitlines(keepends=True),
-                    content.splitlines(keepends=True),
-                    fromfile=f"{path} (original)",
-                    tofile=f"{path} (modified)",
-                    lineterm=''
-                ))
-                diff_text = '\n'.join(diff_lines)
+                if action != "edit":
+                    # Generate diff preview
+                    import difflib
+                    diff_lines = list(difflib.unified_diff(
+                        old_content.splitlines(keepends=True),
+                        content.splitlines(keepends=True),
+                        fromfile=f"{path} (original)",
+                        tofile=f"{path} (modified)",
+                        lineterm=''
+                    ))
+                    diff_text = '\n'.join(diff_lines)
                 
                 # APPLY THE CHANGE DIRECTLY
                 with open(path, "w") as f:
@@ -377,6 +801,9 @@ async def manage_file(path: str, content: str = None, action: str = "write"):
                 _track_modified_file(path, content)
                 _update_file_content_cache(path, content)
                 
+                if action == "edit":
+                    return (f"✅ File edited: {path} ({block_count} block(s) applied)\n\n"
+                            f"Diff:\n{diff_text[:1500]}{'...' if len(diff_text) > 1500 else ''}")
                 return f"✅ File updated: {path}\n\n📝 Changes applied! You can view diff or revert in the sidebar.\n\nDiff preview:\n{diff_text[:500]}{'...' if len(diff_text) > 500 else ''}"
             
             else:
@@ -421,41 +848,31 @@ async def manage_file(path: str, content: str = None, action: str = "write"):
             if not os.path.exists(path):
                 return f"❌ Error: File '{path}' does not exist"
             
-            # Use cached content if available and file not modified on disk (avoids re-reading)
-            # If the user (or anyone) edited the file, mtime will differ and we re-read from disk
-            if path in _file_content_cache:
-                try:
-                    current_mtime = os.path.getmtime(path)
-                    cached_mtime = _file_content_cache.get((path, "_mtime"))
-                    if cached_mtime is not None and cached_mtime == current_mtime:
-                        content = _file_content_cache[path]
-                        await broadcast_log(f"✓ Read (cached): {file_name} ({len(content)} chars)")
-                        return content if content else "(File is empty)"
-                except (OSError, TypeError):
-                    pass
-                # Cache stale or missing mtime — remove and re-read below
-                _file_content_cache.pop(path, None)
-                _file_content_cache.pop((path, "_mtime"), None)
+            ranged = any(v is not None for v in (start_line, end_line, offset, length))
+            if ranged or os.path.getsize(path) > MANAGE_FILE_READ_MAX_BYTES:
+                await broadcast_log(f"📖 Reading (paged): {file_name}")
+                text = await asyncio.to_thread(_paged_read, path, start_line, end_line, offset, length)
+                await broadcast_log(f"✓ Read (paged): {file_name} ({len(text)} chars)")
+                return text
+            
+            # Use cached content if the file is unchanged on disk (avoids re-reading).
+            # If the user (or anyone) edited the file, its stat differs and we re-read from disk
+            content = file_content_cache.get(path)
+            if content is not None:
+                await broadcast_log(f"✓ Read (cached): {file_name} ({len(content)} chars)")
+                return content if content else "(File is empty)"
             
             # Notify UI about reading from disk
             await broadcast_log(f"📖 Reading: {file_name}")
             
-            with open(path, "r", encoding="utf-8", errors="replace") as f:
-                content = f.read()
-            
-            # Store in cache (invalidated when file is written via manage_file or mtime changes)
-            _file_content_cache[path] = content
-            try:
-                _file_content_cache[(path, "_mtime")] = os.path.getmtime(path)
-            except OSError:
-                pass
+            content = file_content_cache.read(path)
             
             await broadcast_log(f"✓ Read: {file_name} ({len(content)} chars)")
             
             return content if content else "(File is empty)"
         
         else:
-            return f"❌ Error: Invalid action '{action}'. Use 'read' or 'write'"
+            return f"❌ Error: Invalid action '{action}'. Use 'read', 'write' or 'edit'"
     
     except Exception as e:
         return f"❌ Error: {str(e)}"
@@ -464,14 +881,14 @@ async def manage_file(path: str, content: str = None, action: str = "write"):
 @tool
 def find_file(filename: str, search_dir: str = "."):
     """
-    Searches for a file by name in the given directory and its subdirectories.
-    Returns the full path(s) if found, or a message if not found.
+    Searches for a file (or folder) by name in the given directory and its subdirectories.
+    Returns the full path(s) if found, or the closest matching paths if not.
     
     Args:
-        filename: Name of the file to search for (e.g., 'app.py')
+        filename: Name of the file to search for (e.g., 'app.py', 'nunit/run.sh', '*.sln')
         search_dir: Directory to start the search from (default is current directory)
     """
-    import glob
+    import fnmatch
     logger.info("[find_file] filename=%s search_dir=%s", filename, search_dir)
     
     # Make search_dir absolute relative to workspace
@@ -479,13 +896,42 @@ def find_file(filename: str, search_dir: str = "."):
     if not os.path.isabs(search_dir):
         search_dir = os.path.join(workspace_path, search_dir) if search_dir != "." else workspace_path
     
-    # Search for the file recursively
-    pattern = os.path.join(search_dir, "**", filename)
-    matches = glob.glob(pattern, recursive=True)
+    def walk_matches(use_ignore_files: bool):
+        pattern = filename.replace(os.sep, "/").strip("/")
+        return [
+            entry.path
+            for rel, dirs, files in get_ignore_matcher(search_dir, use_ignore_files=use_ignore_files).walk()
+            for entry in dirs + files
+            if fnmatch.fnmatchcase(entry.name, pattern)
+            or fnmatch.fnmatchcase(f"{rel}/{entry.name}", "*/" + pattern)
+        ]
+
+    rel_dir = os.path.relpath(search_dir, workspace_path)
+    suggestions = []
+    if rel_dir.startswith(".."):
+        # Outside the workspace: no index, walk the directory (same ignore rules, pruned early)
+        matches = walk_matches(use_ignore_files=True)
+    else:
+        # Shared workspace index (also serves the @-mention picker); skips ignored paths
+        # (.gitignore, node_modules, ...) and returns the most recently modified matches first
+        index = get_workspace_index(workspace_path)
+        rel_dir = rel_dir.replace(os.sep, "/")
+        matches = [os.path.join(workspace_path, rel) for rel in index.find_files(filename, under=rel_dir)]
+        if not matches:
+            # Build output is usually .gitignore'd (bin/Debug/.../*.dll): look there before giving up,
+            # still pruning node_modules, .git, ...
+            matches = walk_matches(use_ignore_files=False)
+        if not matches:
+            prefix = "" if rel_dir == "." else rel_dir + "/"
+            suggestions = [f["full_path"] for f in index.search_files(filename, limit=40)
+                           if f["path"].startswith(prefix)][:10]
     logger.info("[find_file] found %s match(es)", len(matches))
     
     if matches:
         return f"Found file(s):\n" + "\n".join(matches)
+    elif suggestions:
+        return (f"File '{filename}' not found in '{search_dir}' or its subdirectories. "
+                f"Closest matches:\n" + "\n".join(suggestions))
     else:
         return f"File '{filename}' not found in '{search_dir}' or its subdirectories."
 
@@ -513,8 +959,9 @@ def list_dir(path: str = "."):
         return f"❌ Not a directory: {path}"
 
     # Check cache first (avoids redundant filesystem reads)
-    if path in _workspace_structure_cache:
-        cached = _workspace_structure_cache[path]
+    structure_cache = current_session().workspace_structure_cache
+    if path in structure_cache:
+        cached = structure_cache[path]
         logger.info("[list_dir] cache hit: path=%s entries=%s", path, len(cached) if cached else 0)
         return "Contents of " + path + " (cached):\n" + "\n".join(cached) if cached else " (empty)"
 
@@ -526,7 +973,7 @@ def list_dir(path: str = "."):
             suffix = "/" if os.path.isdir(full) else ""
             lines.append(name + suffix)
         # Cache the result
-        _workspace_structure_cache[path] = lines
+        structure_cache[path] = lines
         logger.info("[list_dir] listed: path=%s entries=%s", path, len(lines))
         return "Contents of " + path + ":\n" + "\n".join(lines) if lines else " (empty)"
     except Exception as e:
@@ -705,7 +1152,9 @@ async def generate_project_description(
 
     try:
         explicit_stack = stack.strip() or None
-        result = do_generate(
+        # File walking and the description LLM call are synchronous: keep them off the event loop
+        result = await asyncio.to_thread(
+            do_generate,
             workspace_path,
             output_filename=output_filename,
             stack=explicit_stack,
@@ -751,18 +1200,22 @@ The description has been written to: {result['output_path']}"""
 import hashlib
 import json as _json
 
-# ── Global State ──────────────────────────────────
-_modified_files: set = set()      # absolute paths of files written since last review
-_review_cache: dict = {}          # path → sha256 hex of last-reviewed content
+# ── Session State ─────────────────────────────────
+# Per-run state lives on utils.SessionContext (current_session()), so concurrent /chat
+# runs on different workspaces don't clobber each other:
+#   modified_files            absolute paths of files written since last review
+#   review_cache              path → sha256 hex of last-reviewed content
+#   phase_created_files       files created/modified in the CURRENT phase (reset per phase)
+#   workspace_structure_cache dir_path → list of entries (avoids repeated list_dir calls)
+#   dotnet_framework          .NET framework detected by orchestrator_agent
+# File content cache (file_cache.file_content_cache, shared by all sessions):
+# - When we create or write a file, we store its content keyed by path.
+# - On read (manage_file, review collectors): served from cache while the file's
+#   (mtime_ns, size, inode) still match; an edit by the user (or anything else) changes
+#   them and we re-read from disk. Least recently used entries are evicted by total size.
+# Verdicts themselves are persisted in review_cache.review_verdict_cache (on disk),
+# keyed by content hash + mode + layer + rules, so identical content is judged once.
 REVIEW_MODE = "FAST"              # "FAST" (default) or "STRICT"
-_phase_created_files: set = set()  # files created/modified in the CURRENT phase (reset per phase)
-_workspace_structure_cache: dict = {}  # dir_path → list of entries (avoids repeated list_dir calls)
-# File content cache: path → content (and (path, "_mtime") → mtime for change detection).
-# - When we create or write a file, we store its content and mtime here (session-long).
-# - On read: if cache has the path and mtime matches the file's current mtime, return cache.
-# - If the user (or anything else) edits the file, the file's mtime changes; we then re-read
-#   from disk and update the cache. So we "know" a file was edited by comparing mtime.
-_file_content_cache: dict = {}   # absolute path → content; (path, "_mtime") → float
 MAX_PHASE_RETRIES = 3             # max retry attempts per phase for build failures
 
 # Files that should never be reviewed (configs, non-code)
@@ -777,6 +1230,11 @@ _SKIP_EXTENSIONS = {
 # Max lines before a file is chunked
 _MAX_LINES_PER_CHUNK = 400
 
+# Review scheduler limits: how many review LLM calls may be in flight at once,
+# and a rough per-request input budget (tokens ≈ chars / 4) used to split big layer groups.
+REVIEW_MAX_CONCURRENCY = int(os.getenv("REVIEW_MAX_CONCURRENCY", "4"))
+REVIEW_TOKEN_BUDGET = int(os.getenv("REVIEW_TOKEN_BUDGET", "24000"))
+
 # Layer classification patterns (lowercase)
 _LAYER_PATTERNS = {
     "Models":       ["model", "models", "entities", "entity", "dto", "dtos"],
@@ -794,23 +1252,20 @@ def _track_modified_file(abs_path: str, content: str):
     """Called by manage_file after every write. Tracks the path for review and
     invalidates workspace structure cache. File content cache is updated by
     _update_file_content_cache (called from manage_file) so created/edited
-    files are stored in cache until the file is changed again (e.g. by user)."""
-    _modified_files.add(abs_path)
-    _phase_created_files.add(abs_path)
+    files are served from cache until the file is changed again (e.g. by user)."""
+    session = current_session()
+    session.modified_files.add(abs_path)
+    session.phase_created_files.add(abs_path)
     # Invalidate workspace structure cache for this file's directory
     parent_dir = os.path.dirname(abs_path)
-    _workspace_structure_cache.pop(parent_dir, None)
+    session.workspace_structure_cache.pop(parent_dir, None)
 
 
 def _update_file_content_cache(abs_path: str, content: str):
     """Store file content in cache after we create or write a file. Next read
     will use this until the file is modified (e.g. user edits in IDE); then
-    we detect the change via mtime and re-read from disk."""
-    _file_content_cache[abs_path] = content
-    try:
-        _file_content_cache[(abs_path, "_mtime")] = os.path.getmtime(abs_path)
-    except OSError:
-        pass
+    we detect the change via (mtime_ns, size, inode) and re-read from disk."""
+    file_content_cache.put(abs_path, content)
 
 
 def _classify_layer(abs_path: str) -> str:
@@ -826,7 +1281,34 @@ def _classify_layer(abs_path: str) -> str:
 def _is_code_file(abs_path: str) -> bool:
     """Return True if the file is a source-code file worth reviewing."""
     ext = os.path.splitext(abs_path)[1].lower()
-    return ext not in _SKIP_EXTENSIONS and ext != ""
+    return ext not in _SKIP_EXTENSIONS and ext != "" and not _is_ignored_path(abs_path)
+
+
+def _is_ignored_path(abs_path: str) -> bool:
+    """True if the path sits under anything the workspace ignores (node_modules, .gitignore'd output, ...)."""
+    return get_ignore_matcher(get_workspace_path()).is_ignored_path(abs_path)
+
+
+def _estimate_tokens(text: str) -> int:
+    """Cheap token estimate (≈ 4 chars per token) — good enough for budgeting requests."""
+    return len(text) // 4 + 1
+
+
+def _split_by_token_budget(group_files: dict, budget: int = REVIEW_TOKEN_BUDGET) -> list:
+    """Split a layer group {path: content} into sub-groups that each fit the token budget.
+    Paths are visited in sorted order so the split (and therefore the merge) is deterministic."""
+    batches = []
+    current, used = {}, 0
+    for path in sorted(group_files):
+        cost = _estimate_tokens(group_files[path])
+        if current and used + cost > budget:
+            batches.append(current)
+            current, used = {}, 0
+        current[path] = group_files[path]
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
 
 
 def _chunk_content(content: str, chunk_size: int = _MAX_LINES_PER_CHUNK):
@@ -977,6 +1459,14 @@ def _get_review_llm():
     return _review_llm_instance
 
 
+async def _invoke_review_llm(messages: list, semaphore: asyncio.Semaphore = None):
+    """Send one review request, holding a scheduler slot (if given) only while it is in flight."""
+    if semaphore is None:
+        return await _get_review_llm().ainvoke(messages)
+    async with semaphore:
+        return await _get_review_llm().ainvoke(messages)
+
+
 # ── Unified Diff Application ─────────────────────
 
 def _apply_unified_diff(original: str, diff_text: str) -> str:
@@ -1038,7 +1528,7 @@ def _get_review_test_context(layer: str = "") -> str:
         "\n- Test count: there MUST be at least 10 test cases (test methods) in the reviewed test file(s). If the total is fewer than 10, return ISSUES_FOUND with description 'Fewer than 10 test cases; at least 10 required'."
         "\n- Reflection/assembly only: tests MUST NOT call solution types directly. FORBIDDEN: new Book(), new Author(), controller.GetAll(), service.CreateUser(), author.Name, Program.Main(). REQUIRED: use Assembly.LoadFrom/GetType, GetMethod/GetProperty, MethodInfo.Invoke, Activator.CreateInstance for any solution model, controller, or service. Flag any direct instantiation or direct method/property access on solution types as ISSUES_FOUND."
     )
-    framework = _current_dotnet_framework  # set by orchestrator_agent
+    framework = current_session().dotnet_framework  # set by orchestrator_agent
     rules_map = {
         "webapi": (
             "\n\nFRAMEWORK-SPECIFIC TEST RULES (.NET Web API):"
@@ -1068,11 +1558,21 @@ def _get_review_test_context(layer: str = "") -> str:
     return universal + rules_map.get(framework, "")
 
 
-async def _review_file_group(file_contents: dict, mode: str = "FAST", layer: str = "") -> dict:
+def _review_verdict_key(content: str, mode: str, layer: str, prompt: str = None, chunked: bool = False) -> str:
+    """Persistent-cache key for a file's review verdict. `prompt` defaults to the prompt
+    scalable_batch_review sends for this mode/layer, so a rules change invalidates old verdicts."""
+    if prompt is None:
+        prompt = (REVIEW_FAST_PROMPT if mode == "FAST" else REVIEW_STRICT_PROMPT) + _get_review_test_context(layer)
+    return review_verdict_cache.make_key(content, mode, f"{layer}:chunked" if chunked else layer, prompt)
+
+
+async def _review_file_group(file_contents: dict, mode: str = "FAST", layer: str = "",
+                             semaphore: asyncio.Semaphore = None) -> dict:
     """
     Send a group of files to the review LLM in a single call.
     file_contents: {abs_path: content_string, ...}
     layer: logical layer name (e.g., "Tests") — used to inject framework-specific rules.
+    semaphore: optional scheduler slot limiting concurrent review calls.
     Returns parsed JSON result dict, or a safe fallback.
     """
     from langchain_core.messages import SystemMessage as _SysMsg, HumanMessage as _HumMsg
@@ -1093,11 +1593,12 @@ async def _review_file_group(file_contents: dict, mode: str = "FAST", layer: str
     ]
 
     try:
-        response = _get_review_llm().invoke(messages)
+        response = await _invoke_review_llm(messages, semaphore)
         raw = response.content.strip()
     except Exception as e:
         await broadcast_log(f"⚠️ Review LLM error: {e}")
-        return {"files": [{"path": p, "status": "NO_CRITICAL_ISSUES", "patch_required": False} for p in file_contents]}
+        return {"fallback": True,
+                "files": [{"path": p, "status": "NO_CRITICAL_ISSUES", "patch_required": False} for p in file_contents]}
 
     # Parse JSON (strip markdown fences if present)
     try:
@@ -1109,21 +1610,26 @@ async def _review_file_group(file_contents: dict, mode: str = "FAST", layer: str
         result = _json.loads(cleaned.strip())
     except _json.JSONDecodeError:
         await broadcast_log(f"⚠️ Review returned non-JSON, treating group as clean")
-        return {"files": [{"path": p, "status": "NO_CRITICAL_ISSUES", "patch_required": False} for p in file_contents]}
+        return {"fallback": True,
+                "files": [{"path": p, "status": "NO_CRITICAL_ISSUES", "patch_required": False} for p in file_contents]}
 
     return result
 
 
-async def _review_large_file_chunked(abs_path: str, content: str, mode: str = "FAST", layer: str = "") -> dict:
-    """Review a single large file by sending it in chunks."""
+async def _review_large_file_chunked(abs_path: str, content: str, mode: str = "FAST", layer: str = "",
+                                     semaphore: asyncio.Semaphore = None) -> dict:
+    """Review a single large file by sending its chunks concurrently (bounded by semaphore).
+    Issues are merged in chunk order regardless of which request finishes first.
+    The result carries "fallback": True if any chunk could not be reviewed (not cacheable)."""
     from langchain_core.messages import SystemMessage as _SysMsg, HumanMessage as _HumMsg
 
     prompt = REVIEW_FAST_PROMPT if mode == "FAST" else REVIEW_STRICT_PROMPT
     prompt += _get_review_test_context(layer)
     chunks = _chunk_content(content)
-    all_issues = []
 
-    for start_line, chunk_text in chunks:
+    failed_chunks = []
+
+    async def review_chunk(start_line: int, chunk_text: str) -> list:
         end_line = start_line + chunk_text.count("\n")
         await broadcast_log(f"  🔍 Reviewing {os.path.basename(abs_path)} lines {start_line}-{end_line}")
 
@@ -1133,8 +1639,9 @@ async def _review_large_file_chunked(abs_path: str, content: str, mode: str = "F
             _HumMsg(content=f"=== FILE: {abs_path} (lines {start_line}-{end_line}) ===\n```\n{chunk_text}\n```"),
         ]
 
+        chunk_issues = []
         try:
-            response = _get_review_llm().invoke(messages)
+            response = await _invoke_review_llm(messages, semaphore)
             raw = response.content.strip()
             cleaned = raw
             if cleaned.startswith("```"):
@@ -1144,13 +1651,21 @@ async def _review_large_file_chunked(abs_path: str, content: str, mode: str = "F
             chunk_result = _json.loads(cleaned.strip())
             for f_result in chunk_result.get("files", []):
                 if f_result.get("status") == "ISSUES_FOUND":
-                    all_issues.extend(f_result.get("issues", []))
+                    chunk_issues.extend(f_result.get("issues", []))
         except Exception:
-            pass  # skip this chunk, move on
+            failed_chunks.append(start_line)  # skip this chunk, move on
+        return chunk_issues
+
+    chunk_results = await asyncio.gather(*(review_chunk(start, text) for start, text in chunks))
+    all_issues = [issue for chunk_issues in chunk_results for issue in chunk_issues]
 
     if all_issues:
-        return {"path": abs_path, "status": "ISSUES_FOUND", "issues": all_issues, "patch_required": False}
-    return {"path": abs_path, "status": "NO_CRITICAL_ISSUES", "patch_required": False}
+        result = {"path": abs_path, "status": "ISSUES_FOUND", "issues": all_issues, "patch_required": False}
+    else:
+        result = {"path": abs_path, "status": "NO_CRITICAL_ISSUES", "patch_required": False}
+    if failed_chunks:
+        result["fallback"] = True
+    return result
 
 
 # ── The Scalable Batch Review Tool ───────────────
@@ -1168,7 +1683,8 @@ async def scalable_batch_review(mode: str = "FAST"):
     4. Groups remaining files by logical layer (Models, Controllers, Services, Tests, etc.)
     5. Reviews each layer group in a single LLM call (cross-file awareness within layer)
     6. Chunks large files (500+ lines) to stay within token limits
-    7. Applies patches for critical issues
+       (all layer groups and chunks are sent concurrently, bounded by REVIEW_MAX_CONCURRENCY)
+    7. Applies patches for critical issues (in a stable layer/path order)
     8. Clears the modified-files tracker after review
     
     Args:
@@ -1178,12 +1694,13 @@ async def scalable_batch_review(mode: str = "FAST"):
     Returns: Summary of review results across all files.
     """
     global REVIEW_MODE
-    print("scalable_batch_review called")
+    logger.debug("scalable_batch_review called")
     await broadcast_log("scalable_batch_review called")
     effective_mode = mode.upper() if mode else REVIEW_MODE
+    session = current_session()
 
     # ── 1. Collect files to review ────────────────
-    if not _modified_files:
+    if not session.modified_files:
         await broadcast_log("⏭️ No modified files to review")
         return "NO_REVIEW_REQUIRED — no files modified since last review."
 
@@ -1192,57 +1709,104 @@ async def scalable_batch_review(mode: str = "FAST"):
     skipped_non_code = 0
     skipped_unchanged = 0
 
-    for abs_path in list(_modified_files):
+    for abs_path in sorted(session.modified_files):
         if not _is_code_file(abs_path):
             skipped_non_code += 1
             continue
         if not os.path.exists(abs_path):
             continue
         try:
-            with open(abs_path, "r", encoding="utf-8") as f:
-                content = f.read()
+            content = file_content_cache.read(abs_path, strict=True)
         except (UnicodeDecodeError, OSError):
             continue
         if not content.strip():
             continue
 
         content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
-        if _review_cache.get(abs_path) == content_hash:
+        if session.review_cache.get(abs_path) == content_hash:
             skipped_unchanged += 1
             continue
 
         files_to_review[abs_path] = content
 
     if not files_to_review:
-        _modified_files.clear()
+        session.modified_files.clear()
         await broadcast_log(f"⏭️ Review skipped — {skipped_non_code} non-code, {skipped_unchanged} unchanged")
         return f"NO_REVIEW_REQUIRED — {skipped_non_code} non-code files skipped, {skipped_unchanged} unchanged files skipped."
 
     await broadcast_log(f"🔍 Batch review ({effective_mode}): {len(files_to_review)} file(s) to review")
 
-    # ── 2. Group by layer ─────────────────────────
+    # ── 2. Reuse persisted verdicts, group the rest by layer ──
+    # Content already judged under the same mode/layer/rules (this or any earlier
+    # session/workspace) skips the LLM entirely; its stored verdict and patch are reused.
+    cached_verdicts: dict = {}  # abs_path → verdict
+    verdict_keys: dict = {}     # abs_path → persistent cache key
     layer_groups: dict = {}
     large_files: dict = {}  # files that need chunking
 
     for abs_path, content in files_to_review.items():
+        layer = _classify_layer(abs_path)
         line_count = content.count("\n") + 1
-        if line_count > _MAX_LINES_PER_CHUNK:
+        is_large = line_count > _MAX_LINES_PER_CHUNK
+        verdict_keys[abs_path] = _review_verdict_key(content, effective_mode, layer, chunked=is_large)
+        verdict = await asyncio.to_thread(review_verdict_cache.get, verdict_keys[abs_path])
+        if verdict is not None:
+            cached_verdicts[abs_path] = dict(verdict, path=abs_path)
+        elif is_large:
             large_files[abs_path] = content
         else:
-            layer = _classify_layer(abs_path)
             if layer not in layer_groups:
                 layer_groups[layer] = {}
             layer_groups[layer][abs_path] = content
 
-    # ── 3. Review each layer group ────────────────
+    if cached_verdicts:
+        await broadcast_log(f"  📦 Review cache: {len(cached_verdicts)} file(s) already judged, skipping LLM")
+
+    # ── 3. Schedule all layer groups + large files concurrently ──
+    # Every review request goes out at once, bounded by REVIEW_MAX_CONCURRENCY in-flight
+    # LLM calls. Groups over REVIEW_TOKEN_BUDGET are split into several requests.
+    # asyncio.gather keeps job order, so results are merged (and patches applied) in a
+    # stable order: cached verdicts, then layers in _LAYER_PATTERNS order, paths sorted,
+    # large files last.
+    semaphore = asyncio.Semaphore(max(1, REVIEW_MAX_CONCURRENCY))
+    layer_order = list(_LAYER_PATTERNS) + ["Other"]
+    group_jobs = []  # (layer, batch_files)
+    for layer in sorted(layer_groups, key=layer_order.index):
+        batches = _split_by_token_budget(layer_groups[layer])
+        suffix = f" in {len(batches)} request(s)" if len(batches) > 1 else ""
+        await broadcast_log(f"  📂 Reviewing {layer} layer ({len(layer_groups[layer])} file(s){suffix})")
+        for batch in batches:
+            group_jobs.append((layer, batch))
+
+    large_jobs = sorted(large_files.items())
+    for abs_path, content in large_jobs:
+        line_count = content.count("\n") + 1
+        await broadcast_log(f"  📄 Reviewing large file: {os.path.basename(abs_path)} ({line_count} lines, chunked)")
+
+    started = time.monotonic()
+    results = await asyncio.gather(
+        *(_review_file_group(batch, effective_mode, layer=layer, semaphore=semaphore)
+          for layer, batch in group_jobs),
+        *(_review_large_file_chunked(abs_path, content, effective_mode,
+                                     layer=_classify_layer(abs_path), semaphore=semaphore)
+          for abs_path, content in large_jobs),
+    )
+    logger.info("[scalable_batch_review] %s request group(s) reviewed in %.1fs (max in flight=%s, cached=%s)",
+                len(results), time.monotonic() - started, REVIEW_MAX_CONCURRENCY, len(cached_verdicts))
+    group_results = results[:len(group_jobs)]
+    large_results = results[len(group_jobs):]
+
+    # ── 4. Merge results and apply patches (deterministic order) ──
     all_results = []
     total_issues = 0
     total_patched = 0
 
-    for layer, group_files in layer_groups.items():
-        await broadcast_log(f"  📂 Reviewing {layer} layer ({len(group_files)} file(s))")
-        result = await _review_file_group(group_files, effective_mode, layer=layer)
+    merge_batches = [(dict((p, files_to_review[p]) for p in sorted(cached_verdicts)),
+                      {"files": [cached_verdicts[p] for p in sorted(cached_verdicts)]}, True)]
+    for (layer, group_files), result in zip(group_jobs, group_results):
+        merge_batches.append((group_files, result, False))
 
+    for group_files, result, from_cache in merge_batches:
         for f_result in result.get("files", []):
             fpath = f_result.get("path", "")
             status = f_result.get("status", "NO_CRITICAL_ISSUES")
@@ -1252,12 +1816,17 @@ async def scalable_batch_review(mode: str = "FAST"):
                 issues = f_result.get("issues", [])
                 total_issues += len(issues)
 
+            # Resolve to absolute path
+            matching_path = fpath
+            if not os.path.isabs(matching_path):
+                matching_path = os.path.join(get_workspace_path(), matching_path)
+
+            # Persist fresh verdicts (never LLM-error fallbacks) for content-addressed reuse
+            if not from_cache and not result.get("fallback") and matching_path in group_files:
+                await asyncio.to_thread(review_verdict_cache.put, verdict_keys[matching_path], f_result)
+
             # Apply patch if required
             if f_result.get("patch_required") and f_result.get("unified_diff"):
-                matching_path = fpath
-                # Resolve to absolute path
-                if not os.path.isabs(matching_path):
-                    matching_path = os.path.join(get_workspace_path(), matching_path)
                 if matching_path in group_files:
                     original = group_files[matching_path]
                     patched = _apply_unified_diff(original, f_result["unified_diff"])
@@ -1267,32 +1836,30 @@ async def scalable_batch_review(mode: str = "FAST"):
                             await broadcast_log(f"  🩹 Patch: {f_result['unified_diff']}")
                             with open(matching_path, "w", encoding="utf-8") as f:
                                 f.write(patched)
+                            file_content_cache.put(matching_path, patched)
                             await broadcast_log(f"  🩹 Patched: {patched}")
                             total_patched += 1
                             await broadcast_log(f"  🩹 Patch applied: {os.path.basename(matching_path)}")
                             # Update cache to patched content
-                            _review_cache[matching_path] = hashlib.sha256(patched.encode("utf-8")).hexdigest()
+                            session.review_cache[matching_path] = hashlib.sha256(patched.encode("utf-8")).hexdigest()
                         except Exception as e:
                             await broadcast_log(f"  ⚠️ Patch write failed: {e}")
 
             # Update cache for reviewed files
             if fpath in files_to_review:
                 current_content = files_to_review[fpath]
-                _review_cache[fpath] = hashlib.sha256(current_content.encode("utf-8")).hexdigest()
+                session.review_cache[fpath] = hashlib.sha256(current_content.encode("utf-8")).hexdigest()
 
-    # ── 4. Review large files (chunked) ───────────
-    for abs_path, content in large_files.items():
-        large_layer = _classify_layer(abs_path)
-        line_count = content.count("\n") + 1
-        await broadcast_log(f"  📄 Reviewing large file: {os.path.basename(abs_path)} ({line_count} lines, chunked)")
-        chunk_result = await _review_large_file_chunked(abs_path, content, effective_mode, layer=large_layer)
+    for (abs_path, content), chunk_result in zip(large_jobs, large_results):
         all_results.append(chunk_result)
         if chunk_result.get("status") == "ISSUES_FOUND":
             total_issues += len(chunk_result.get("issues", []))
-        _review_cache[abs_path] = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if not chunk_result.get("fallback"):
+            await asyncio.to_thread(review_verdict_cache.put, verdict_keys[abs_path], chunk_result)
+        session.review_cache[abs_path] = hashlib.sha256(content.encode("utf-8")).hexdigest()
 
     # ── 5. Clear modified files ───────────────────
-    _modified_files.clear()
+    session.modified_files.clear()
 
     # ── 6. Build summary ──────────────────────────
     clean_count = sum(1 for r in all_results if r.get("status") == "NO_CRITICAL_ISSUES")
@@ -1306,7 +1873,8 @@ async def scalable_batch_review(mode: str = "FAST"):
         f"  Total issues found: {total_issues}\n"
         f"  Patches applied: {total_patched}\n"
         f"  Non-code skipped: {skipped_non_code}\n"
-        f"  Unchanged skipped: {skipped_unchanged}"
+        f"  Unchanged skipped: {skipped_unchanged}\n"
+        f"  Reused cached verdicts: {len(cached_verdicts)}"
     )
     await broadcast_log(summary)
     return summary
@@ -1328,7 +1896,7 @@ file_tools = [manage_file]
 file_tool_node = ToolNode(file_tools)
 
 # 5) Execution Agent – terminal execution only
-execution_tools = [execute_terminal]
+execution_tools = [execute_terminal, read_command_log]
 execution_tool_node = ToolNode(execution_tools)
 
 # 6) Template Agent – scaffolding/template operations
@@ -1349,7 +1917,7 @@ review_tool_node = ToolNode(review_tools)
 
 # All tools combined – bound to orchestrator LLM so it can call any tool
 # Also used as fallback when LLM calls tools from multiple agents in one response
-all_tools = [execute_terminal, manage_file, find_file, list_dir, create_scaffolding, analyze_test_patterns, generate_project_description, scalable_batch_review]
+all_tools = [execute_terminal, read_command_log, manage_file, find_file, list_dir, create_scaffolding, analyze_test_patterns, generate_project_description, scalable_batch_review]
 all_tool_node = ToolNode(all_tools)
 
 # Tool-name → specialized agent node mapping
@@ -1358,6 +1926,7 @@ TOOL_TO_AGENT = {
     "find_file": "workspace_action",
     "manage_file": "file_action",
     "execute_terminal": "execution_action",
+    "read_command_log": "execution_action",
     "create_scaffolding": "template_action",
     "analyze_test_patterns": "test_action",
     "generate_project_description": "documentation_action",
@@ -1372,6 +1941,13 @@ class State(TypedDict):
     # ── Phase-based Task Plan ──
     # JSON string set by planner_node; empty when no plan is active.
     task_plan: str  # JSON string or ""
+    # The same plan parsed once by planner_node (routing reads this, see task_plan.py).
+    plan: Optional[TaskPlan]
+    # Steps done so far ("<phase>.<step>" keys; fast-path steps may finish out of order),
+    # per-step timings for the critical-path report, and when the current step started.
+    completed_steps: list
+    step_timings: list
+    step_clock: float
     # Phase tracking: which phase and step the executor is currently on.
     current_phase_idx: int    # 0-based index into phases[]
     current_step_idx: int     # 0-based index into current phase's steps[]
@@ -1384,6 +1960,10 @@ class State(TypedDict):
     # Workspace folder structure cache (avoids repeated list_dir calls).
     # JSON dict mapping dir path → list of entries.  Empty string = not cached.
     workspace_structure: str  # JSON string or ""
+    # Running totals from compact_history_node for this run (bytes saved, messages rewritten).
+    compaction_stats: dict
+    # Keyword classification of the run's request (set once per run, see request_profile()).
+    request_profile: Optional[RequestProfile]
 
 
 # -------------------------------------------------
@@ -2651,7 +3231,7 @@ _STACK_KEYWORDS = {
         "asp.net", "blazor", "maui", ".csproj", ".sln", "mssql",
     ],
     "node": [
-        "node", "express", "npm", "package.json", "jest", "mocha",
+        "node", "nodejs", "node.js", "express", "npm", "package.json", "jest", "mocha",
         "javascript", "typescript", "nestjs", "koa", "sequelize",
     ],
     "python": [
@@ -2664,7 +3244,7 @@ _STACK_KEYWORDS = {
         "dotnettemplates/angularscaffolding", "spec.ts",
     ],
     "react": [
-        "react", "vite", "jsx", "tsx", "next.js", "nextjs",
+        "react", "reactjs", "vite", "jsx", "tsx", "next.js", "nextjs",
         "tailwind", "create-react-app",
     ],
     "java": [
@@ -2674,6 +3254,12 @@ _STACK_KEYWORDS = {
 }
 
 
+def _human_texts(messages) -> List[str]:
+    """Lowercased content of the human messages, newest first."""
+    return [str(m.content).lower() for m in reversed(messages)
+            if getattr(m, "type", None) == "human" or isinstance(m, HumanMessage)]
+
+
 def detect_stack(messages) -> str:
     """
     Inspect the conversation messages to determine the project stack.
@@ -2681,31 +3267,14 @@ def detect_stack(messages) -> str:
     
     Returns one of: "dotnet", "node", "python", "react", "java", "generic"
     """
-    # Find the last human message
-    last_human_content = ""
-    for msg in reversed(messages):
-        if hasattr(msg, 'type') and msg.type == 'human':
-            last_human_content = str(msg.content).lower()
-            break
-        elif hasattr(msg, 'content') and isinstance(msg, HumanMessage):
-            last_human_content = str(msg.content).lower()
-            break
-    
-    if not last_human_content:
-        return "generic"
-    
-    # Score each stack by counting keyword matches
-    scores = {}
-    for stack, keywords in _STACK_KEYWORDS.items():
-        score = sum(1 for kw in keywords if kw in last_human_content)
-        if score > 0:
-            scores[stack] = score
-    
-    if not scores:
-        return "generic"
-    
-    # Return the stack with the highest score
-    return max(scores, key=scores.get)
+    texts = _human_texts(messages)
+    return _stack_from_scores(_REQUEST_MATCHER.scores(texts[0])) if texts else "generic"
+
+
+def _stack_from_scores(scores: dict) -> str:
+    """The stack with the most distinct keyword matches (first listed wins a tie)."""
+    stacks = {label[1]: n for label, n in scores.items() if label[0] == "stack"}
+    return max(stacks, key=stacks.get) if stacks else "generic"
 
 
 # .NET framework sub-type keywords
@@ -2726,6 +3295,42 @@ _DOTNET_FRAMEWORK_KEYWORDS = {
     ],
 }
 
+# _is_fullstack_dotnet_angular() needs a keyword from each of these groups
+_FULLSTACK_KEYWORDS = {
+    "dotnet": ["dotnet", ".net", "webapi", "web api", "asp.net", "csharp", "c#"],
+    "angular": ["angular", "ng", "angularapp"],
+    "fullstack": ["full stack", "fullstack", "full-stack", "frontend and backend", "backend and frontend"],
+}
+
+# _needs_planning() — any request to create/build a project goes through the planner
+_PLANNING_TRIGGERS = [
+    "create project", "create a project", "create the project",
+    "full stack", "fullstack", "full-stack",
+    "frontend and backend", "backend and frontend",
+    "build a project", "build project",
+    "implement project", "implement a project",
+    "create application", "create an application",
+    "create app", "build app", "build an app",
+]
+
+# The request (or plan step) is about tests → test-rule blocks go into the prompt
+_TEST_INTENT_KEYWORDS = (
+    "test", "testing", "test case", "unit test", "spec", "nunit", "junit", "xunit",
+    "karma", "jasmine", "pytest", "jest", "weightage",
+)
+
+# Every table above in one precompiled word-boundary matcher (see request_classifier.py);
+# labels are ("stack" | "framework" | "fullstack" | "planning" | "tests", name).
+_REQUEST_MATCHER = KeywordMatcher({
+    **{("stack", k): v for k, v in _STACK_KEYWORDS.items()},
+    **{("framework", k): v for k, v in _DOTNET_FRAMEWORK_KEYWORDS.items()},
+    **{("fullstack", k): v for k, v in _FULLSTACK_KEYWORDS.items()},
+    ("planning", "create"): _PLANNING_TRIGGERS,
+    ("tests", "intent"): _TEST_INTENT_KEYWORDS,
+})
+_TEST_INTENT_MATCHER = KeywordMatcher({"tests": _TEST_INTENT_KEYWORDS})
+
+
 def detect_dotnet_framework(messages) -> str:
     """
     When stack is already detected as 'dotnet', determine the sub-framework.
@@ -2734,26 +3339,13 @@ def detect_dotnet_framework(messages) -> str:
     Returns one of: "webapi", "console", "mvc"
     Default: "webapi" (most common .NET template)
     """
-    combined_content = ""
-    for msg in reversed(messages):
-        if hasattr(msg, 'type') and msg.type == 'human':
-            combined_content += " " + str(msg.content).lower()
-        elif hasattr(msg, 'content') and isinstance(msg, HumanMessage):
-            combined_content += " " + str(msg.content).lower()
-
-    if not combined_content:
-        return "webapi"
-
-    scores = {}
-    for framework, keywords in _DOTNET_FRAMEWORK_KEYWORDS.items():
-        score = sum(1 for kw in keywords if kw in combined_content)
-        if score > 0:
-            scores[framework] = score
+    return _framework_from_texts(_human_texts(messages))
 
-    if not scores:
-        return "webapi"  # default
 
-    return max(scores, key=scores.get)
+def _framework_from_texts(texts: List[str]) -> str:
+    scores = _REQUEST_MATCHER.scores(" \n ".join(texts)) if texts else {}
+    frameworks = {label[1]: n for label, n in scores.items() if label[0] == "framework"}
+    return max(frameworks, key=frameworks.get) if frameworks else "webapi"  # default
 
 
 def _is_fullstack_dotnet_angular(messages) -> bool:
@@ -2762,30 +3354,35 @@ def _is_fullstack_dotnet_angular(messages) -> bool:
     .NET backend AND Angular frontend. When True, the planner should use
     the combined dotnetangularfullstack template (single copy, single section).
     """
-    last_human = ""
-    for msg in reversed(messages):
-        if hasattr(msg, 'type') and msg.type == 'human':
-            last_human = str(msg.content).lower()
-            break
-        elif isinstance(msg, HumanMessage):
-            last_human = str(msg.content).lower()
-            break
-
-    if not last_human:
-        return False
+    texts = _human_texts(messages)
+    return _fullstack_from_scores(_REQUEST_MATCHER.scores(texts[0])) if texts else False
+
+
+def _fullstack_from_scores(scores: dict) -> bool:
+    return all(("fullstack", group) in scores for group in _FULLSTACK_KEYWORDS)
+
+
+def classify_request(messages) -> RequestProfile:
+    """Stack, .NET framework, fullstack and planning verdicts for the latest request in one pass."""
+    texts = _human_texts(messages)
+    if not texts:
+        return RequestProfile()
+    scores = _REQUEST_MATCHER.scores(texts[0])
+    stack = _stack_from_scores(scores)
+    return RequestProfile(
+        stack=stack,
+        # The framework looks at the whole conversation; only needed for .NET requests
+        dotnet_framework=_framework_from_texts(texts) if stack == "dotnet" else "webapi",
+        fullstack_dotnet_angular=_fullstack_from_scores(scores),
+        needs_planning=("planning", "create") in scores,
+        mentions_tests=("tests", "intent") in scores,
+    )
 
-    has_dotnet = any(kw in last_human for kw in [
-        "dotnet", ".net", "webapi", "web api", "asp.net", "csharp", "c#",
-    ])
-    has_angular = any(kw in last_human for kw in [
-        "angular", "ng", "angularapp",
-    ])
-    has_fullstack = any(kw in last_human for kw in [
-        "full stack", "fullstack", "full-stack",
-        "frontend and backend", "backend and frontend",
-    ])
 
-    return has_dotnet and has_angular and has_fullstack
+def request_profile(state) -> RequestProfile:
+    """State["request_profile"] when set for this run, else classified from the messages."""
+    profile = state.get("request_profile")
+    return profile if isinstance(profile, RequestProfile) else classify_request(state.get("messages", []))
 
 
 # -------------------------------------------------
@@ -4464,6 +5061,15 @@ PLANNING RULES
    - Frontend Angular: "cd <root>/angularapp && npx ng build"
    - The executor handles build failures with auto-fix + retry (up to 3 times).
 
+9. STEP DEPENDENCIES (optional "depends_on"):
+   - A step may list the step numbers (same phase) it needs: "depends_on": [1].
+   - A step WITHOUT depends_on waits for every earlier step (strict order).
+   - "execute"/"generate" steps whose dependencies are done run IN PARALLEL when they
+     run in different directories (e.g. npm install in angularapp and dotnet restore in
+     dotnetapp both only need the template copy); steps in the same directory (several
+     ng g c) still run one after another.
+   - Only declare it when steps are truly independent; when unsure, leave it out.
+
 ========================
 FULLSTACK .NET + ANGULAR
 ========================
@@ -4538,8 +5144,9 @@ OUTPUT FORMAT (STRICT JSON ONLY)
       "working_directory": ".",
       "steps": [
         {"step": 1, "action": "Copy template", "command": "cp -r dotnettemplates/dotnetangularfullstack .", "type": "execute"},
-        {"step": 2, "action": "Install Angular deps", "command": "cd dotnetangularfullstack/angularapp && npm install", "type": "execute"},
-        {"step": 3, "action": "Generate components", "command": "cd dotnetangularfullstack/angularapp && npx ng g c components/product-list && npx ng g c components/product-form", "type": "generate"}
+        {"step": 2, "action": "Install Angular deps", "command": "cd dotnetangularfullstack/angularapp && npm install", "type": "execute", "depends_on": [1]},
+        {"step": 3, "action": "Restore .NET packages", "command": "cd dotnetangularfullstack/dotnetapp && dotnet restore", "type": "execute", "depends_on": [1]},
+        {"step": 4, "action": "Generate components", "command": "cd dotnetangularfullstack/angularapp && npx ng g c components/product-list && npx ng g c components/product-form", "type": "generate", "depends_on": [2]}
       ]
     },
     {
@@ -4595,61 +5202,79 @@ def _needs_planning(messages) -> bool:
     Returns True for project creation tasks (single or multi-section).
     Simple questions, file edits, and non-creation tasks skip the planner.
     """
-    # Find the last human message
-    last_human = ""
-    for msg in reversed(messages):
-        if hasattr(msg, 'type') and msg.type == 'human':
-            last_human = str(msg.content).lower()
-            break
-        elif isinstance(msg, HumanMessage):
-            last_human = str(msg.content).lower()
-            break
+    texts = _human_texts(messages)
+    return bool(texts) and ("planning", "create") in _REQUEST_MATCHER.scores(texts[0])
 
-    if not last_human:
-        return False
 
-    # Project creation triggers — any request to create/build a project
-    planning_triggers = [
-        "create project", "create a project", "create the project",
-        "full stack", "fullstack", "full-stack",
-        "frontend and backend", "backend and frontend",
-        "build a project", "build project",
-        "implement project", "implement a project",
-        "create application", "create an application",
-        "create app", "build app", "build an app",
-    ]
+async def _template_plan(messages, profile: RequestProfile, archetype: str, template_cmd: str) -> Optional[str]:
+    """
+    Skeleton plan JSON for a recognized archetype, or None to run the full planner
+    (requests about tests or features the skeletons don't cover). Entities come from the
+    request text; unless it lists them explicitly, a small delta-fill prompt asks the LLM
+    for them (once per request text).
+    """
+    from langchain_core.messages import SystemMessage
 
-    for trigger in planning_triggers:
-        if trigger in last_human:
-            return True
+    request = ""
+    for msg in reversed(messages):
+        if getattr(msg, "type", None) == "human":
+            request = str(msg.content)
+            break
+    # Tests are planned per project/weightage rules the skeletons don't cover
+    if not request or profile.mentions_tests:
+        return None
+    # Anything beyond CRUD on entities (auth, payments, uploads, ...) needs the full planner
+    features = extra_features(request)
+    if features:
+        logger.info("[planner] request asks for %s: using the full planner", ",".join(features))
+        return None
 
-    return False
+    entities, complete = extract_entities(request)
+    if not complete:
+        # The patterns found some or none of them: the delta-fill prompt names them all
+        filled = plan_template_cache.filled_entities(request)
+        if filled is None:
+            try:
+                response = await llm_without_tools.ainvoke(
+                    [SystemMessage(content=ENTITY_FILL_PROMPT), HumanMessage(content=request)]
+                )
+            except Exception as e:
+                logger.warning("[planner] entity delta-fill failed, using full planner: %s", e)
+                return None
+            filled = parse_entity_fill(str(response.content))
+            plan_template_cache.remember_filled(request, filled)
+        entities = normalize_entities(filled + entities)
+    logger.info("[planner] template plan: archetype=%s entities=%s", archetype, ",".join(entities) or "-")
+    return plan_template_cache.plan_json(archetype, entities, template_cmd)
 
 
-def planner_node(state: State):
+async def planner_node(state: State):
     """
     Planner Node: analyzes the user request and outputs a structured
     MULTI-PHASE execution plan. Does NOT call tools — pure reasoning.
     
-    The plan is stored in state['task_plan'] and consumed by phase_executor_node.
+    The plan is stored in state['task_plan'] (JSON) and state['plan'] (parsed TaskPlan).
     Plan format uses 'phases' (not 'sections').
     """
     from langchain_core.messages import SystemMessage, AIMessage
     import json as _json
 
     messages = state["messages"]
-    stack = detect_stack(messages)
+    profile = request_profile(state)
+    stack = profile.stack
+    archetype, template_cmd = None, None
 
     # Build planner messages
     planner_messages = [SystemMessage(content=PLANNER_SYSTEM_PROMPT)]
 
     # Check if this is a fullstack dotnet+angular project FIRST
-    is_fullstack_da = _is_fullstack_dotnet_angular(messages)
+    is_fullstack_da = profile.fullstack_dotnet_angular
 
     # Add context about detected stack and framework
     if is_fullstack_da:
         template_cmd = TEMPLATE_COPY_COMMANDS.get("dotnetangularfullstack",
                                                    "cp -r dotnettemplates/dotnetangularfullstack .")
+        archetype = "dotnetangularfullstack"
         planner_messages.append(SystemMessage(content=(
             f"DETECTED: FULLSTACK .NET + ANGULAR PROJECT\n"
             f"TEMPLATE COPY COMMAND: {template_cmd}\n"
@@ -4663,8 +5288,9 @@ def planner_node(state: State):
             f"BUILD FRONTEND: cd dotnetangularfullstack/angularapp && npx ng build\n"
         )))
     elif stack == "dotnet":
-        framework = detect_dotnet_framework(messages)
+        framework = profile.dotnet_framework
         template_cmd = TEMPLATE_COPY_COMMANDS.get(framework, "DISCOVER_TEMPLATE")
+        archetype = framework
         planner_messages.append(SystemMessage(content=(
             f"DETECTED STACK: dotnet\n"
             f"DETECTED FRAMEWORK: {framework}\n"
@@ -4672,6 +5298,7 @@ def planner_node(state: State):
         )))
     elif stack == "angular":
         template_cmd = TEMPLATE_COPY_COMMANDS.get("angular", "cp -r dotnettemplates/angularscaffolding .")
+        archetype = "angular"
         planner_messages.append(SystemMessage(content=(
             f"DETECTED STACK: angular\n"
             f"TEMPLATE COPY COMMAND: {template_cmd}\n"
@@ -4683,74 +5310,85 @@ def planner_node(state: State):
     else:
         planner_messages.append(SystemMessage(content=f"DETECTED STACK: {stack}\n"))
 
-    # Include user messages for context
-    planner_messages.extend(messages)
+    # Recognized archetype → skeleton plan (no full planner call, see plan_templates.py)
+    plan_json = None
+    if PLAN_TEMPLATE_CACHE and archetype in ARCHETYPES:
+        plan_json = await _template_plan(messages, profile, archetype, template_cmd)
+    if plan_json is not None:
+        plan_obj = _json.loads(plan_json)
+    else:
+        plan_template_cache.note_full_planner()
+        # Include user messages for context
+        planner_messages.extend(messages)
 
-    # Invoke planner LLM (same LLM, no tools)
-    response = llm_without_tools.invoke(planner_messages)
-    raw_plan = response.content.strip()
+        # Invoke planner LLM (same LLM, no tools)
+        response = await llm_without_tools.ainvoke(planner_messages)
+        raw_plan = response.content.strip()
 
-    # Clean up JSON if wrapped in markdown
-    cleaned = raw_plan
-    if cleaned.startswith("```"):
-        cleaned = "\n".join(cleaned.split("\n")[1:])
-    if cleaned.endswith("```"):
-        cleaned = "\n".join(cleaned.split("\n")[:-1])
-    cleaned = cleaned.strip()
+        # Clean up JSON if wrapped in markdown
+        cleaned = raw_plan
+        if cleaned.startswith("```"):
+            cleaned = "\n".join(cleaned.split("\n")[1:])
+        if cleaned.endswith("```"):
+            cleaned = "\n".join(cleaned.split("\n")[:-1])
+        cleaned = cleaned.strip()
 
-    # Validate JSON
-    try:
-        plan_obj = _json.loads(cleaned)
-        # Migrate old 'sections' format to 'phases' if needed
-        if "sections" in plan_obj and "phases" not in plan_obj:
-            plan_obj["phases"] = plan_obj.pop("sections")
-            plan_obj["execution_mode"] = "MULTI_PHASE"
-            for phase in plan_obj.get("phases", []):
-                phase.setdefault("review", True)
-                phase.setdefault("build", True)
-                phase.setdefault("build_commands", [])
-        plan_json = _json.dumps(plan_obj, indent=2)
-    except _json.JSONDecodeError:
-        # If planner didn't return valid JSON, wrap it
-        plan_json = _json.dumps({
-            "project_type": "single",
-            "stack": stack,
-            "dotnet_framework": None,
-            "execution_mode": "MULTI_PHASE",
-            "phases": [{
-                "name": "main",
-                "description": "Execute user request",
-                "review": False,
-                "build": False,
-                "build_commands": [],
-                "working_directory": ".",
-                "steps": [{"step": 1, "action": "Execute as requested", "type": "code"}],
-            }],
-            "final_report": True
-        }, indent=2)
-        plan_obj = _json.loads(plan_json)
+        # Validate JSON
+        try:
+            plan_obj = _json.loads(cleaned)
+            # Migrate old 'sections' format to 'phases' if needed
+            if "sections" in plan_obj and "phases" not in plan_obj:
+                plan_obj["phases"] = plan_obj.pop("sections")
+                plan_obj["execution_mode"] = "MULTI_PHASE"
+                for phase in plan_obj.get("phases", []):
+                    phase.setdefault("review", True)
+                    phase.setdefault("build", True)
+                    phase.setdefault("build_commands", [])
+            plan_json = _json.dumps(plan_obj, indent=2)
+        except _json.JSONDecodeError:
+            # If planner didn't return valid JSON, wrap it
+            plan_json = _json.dumps({
+                "project_type": "single",
+                "stack": stack,
+                "dotnet_framework": None,
+                "execution_mode": "MULTI_PHASE",
+                "phases": [{
+                    "name": "main",
+                    "description": "Execute user request",
+                    "review": False,
+                    "build": False,
+                    "build_commands": [],
+                    "working_directory": ".",
+                    "steps": [{"step": 1, "action": "Execute as requested", "type": "code"}],
+                }],
+                "final_report": True
+            }, indent=2)
+            plan_obj = _json.loads(plan_json)
+    plan = TaskPlan.from_dict(plan_obj if isinstance(plan_obj, dict) else {"phases": []})
 
     # Log the plan
-    num_phases = len(plan_obj.get("phases", []))
-    import asyncio
+    num_phases = len(plan.phases)
+    source = " (from template)" if isinstance(plan_obj, dict) and plan_obj.get("plan_source") == "template" else ""
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            loop.create_task(broadcast_log(f"📋 Task Plan created with {num_phases} phase(s)"))
-        else:
-            asyncio.run(broadcast_log(f"📋 Task Plan created with {num_phases} phase(s)"))
+        await broadcast_log(f"📋 Task Plan created with {num_phases} phase(s){source}")
     except Exception:
         pass
 
-    # Reset phase tracking globals
-    _phase_created_files.clear()
-    _workspace_structure_cache.clear()
+    # Reset phase tracking state for this session
+    session = current_session()
+    session.phase_created_files.clear()
+    session.workspace_structure_cache.clear()
 
     # Return plan as AIMessage so agent can see it, and initialize phase state
     plan_summary = f"[TASK PLAN]\n{plan_json}"
     return {
         "messages": [AIMessage(content=plan_summary)],
         "task_plan": plan_json,
+        "plan": plan,
+        "request_profile": profile,
+        "completed_steps": [],
+        "step_timings": [],
+        "step_clock": time.time(),
         "current_phase_idx": 0,
         "current_step_idx": 0,
         "phase_status": "pending",
@@ -4760,11 +5398,7 @@ def planner_node(state: State):
     }
 
 
-# Global: tracks the detected .NET framework for this session so the
-# review system can also use it without re-scanning messages.
-_current_dotnet_framework: str = "webapi"
-
-def _build_phase_step_context(task_plan: str, phase_idx: int, step_idx: int) -> str:
+def _build_phase_step_context(plan: TaskPlan, phase_idx: int, step_idx: int) -> str:
     """
     Build focused execution context for the CURRENT step within the CURRENT phase.
     Returns a prompt string telling the orchestrator exactly what to do NOW.
@@ -4773,13 +5407,7 @@ def _build_phase_step_context(task_plan: str, phase_idx: int, step_idx: int) ->
     Review and build are handled AUTOMATICALLY by the phase_executor/advance nodes
     based on the phase flags — the agent never needs to call them explicitly.
     """
-    import json as _json
-    try:
-        plan = _json.loads(task_plan)
-    except _json.JSONDecodeError:
-        return ""
-
-    phases = plan.get("phases", [])
+    phases = plan.phases
     if phase_idx >= len(phases):
         # All phases done — generate final report
         return """
@@ -4796,13 +5424,13 @@ Output the final consolidated report:
 """
 
     phase = phases[phase_idx]
-    steps = phase.get("steps", [])
-    phase_name = phase.get("name", f"Phase {phase_idx + 1}")
-    phase_desc = phase.get("description", "")
+    steps = phase.steps
+    phase_name = phase.name
+    phase_desc = phase.description
     total_phases = len(phases)
     total_steps = len(steps)
-    will_review = phase.get("review", False)
-    will_build = phase.get("build", False)
+    will_review = phase.review
+    will_build = phase.build
 
     if step_idx >= total_steps:
         # Phase steps done — system will auto-run review + build
@@ -4822,11 +5450,11 @@ Output: "✅ Phase '{phase_name}' implementation done."
 """
 
     current_step = steps[step_idx]
-    step_num = current_step.get("step", step_idx + 1)
-    step_action = current_step.get("action", "")
-    step_type = current_step.get("type", "code")
-    step_command = current_step.get("command", "")
-    step_details = current_step.get("details", "")
+    step_num = current_step.number
+    step_action = current_step.action
+    step_type = current_step.type
+    step_command = current_step.command
+    step_details = current_step.details
 
     # Build progress
     progress = f"[{step_idx}/{total_steps} steps done]"
@@ -4834,15 +5462,14 @@ Output: "✅ Phase '{phase_name}' implementation done."
     # Completed steps summary
     done_summary = ""
     if step_idx > 0:
-        done_items = [f"  ✅ Step {steps[i].get('step', i+1)}: {steps[i].get('action', '')}"
-                      for i in range(step_idx)]
+        done_items = [f"  ✅ Step {steps[i].number}: {steps[i].action}" for i in range(step_idx)]
         done_summary = "COMPLETED STEPS:\n" + "\n".join(done_items) + "\n\n"
 
     # Upcoming preview (next 2)
     upcoming = ""
     remaining = steps[step_idx + 1:step_idx + 3]
     if remaining:
-        upcoming_items = [f"  → Step {s.get('step', '?')}: {s.get('action', '')}" for s in remaining]
+        upcoming_items = [f"  → Step {s.number}: {s.action}" for s in remaining]
         upcoming = "\nUPCOMING (do NOT execute these yet):\n" + "\n".join(upcoming_items) + "\n"
 
     # Phase info
@@ -4850,7 +5477,7 @@ Output: "✅ Phase '{phase_name}' implementation done."
     if will_review:
         phase_flags.append("review=ON (auto after all steps)")
     if will_build:
-        build_cmds = phase.get("build_commands", [])
+        build_cmds = phase.build_commands
         phase_flags.append(f"build=ON ({', '.join(build_cmds) if build_cmds else 'auto'})")
     flags_str = " | ".join(phase_flags) if phase_flags else "review=OFF, build=OFF"
 
@@ -4895,7 +5522,260 @@ EXECUTION RULES:
     return ctx
 
 
-def orchestrator_agent(state: State):
+# -------------------------------------------------
+# ORCHESTRATOR PROMPT ASSEMBLY (token-aware)
+# -------------------------------------------------
+# The orchestrator prompt is built from named segments so each turn's size is known:
+#   static prefix (SYSTEM_PROMPT + stack rules [+ test rules]) → conversation → step context
+# The static prefix is byte-identical across turns and the history is append-only, so the
+# provider's prompt cache can hit on everything but the small per-step context at the end.
+# Test-rule blocks (the largest stack segments) are only sent when the current plan step
+# (or, without a plan, the request) is about tests. ORCHESTRATOR_MAX_INPUT_TOKENS (0 = off) caps the estimate by
+# dropping optional segments first.
+
+ORCHESTRATOR_MAX_INPUT_TOKENS = int(os.getenv("ORCHESTRATOR_MAX_INPUT_TOKENS", "0"))
+
+# Recent per-turn prompt reports (served by GET /prompt-usage in server.py)
+from collections import deque as _deque
+prompt_usage_history = _deque(maxlen=200)
+
+
+def _needs_test_rules(profile: RequestProfile, plan: Optional[TaskPlan], phase_idx: int, step_idx: int) -> bool:
+    """True when the current plan step (or, without a plan, the latest request) concerns tests."""
+    if plan is None:
+        return profile.mentions_tests
+    phase = plan.phase(phase_idx)
+    if phase is None:
+        return False
+    text = f"{phase.name} {phase.description}"
+    if step_idx < len(phase.steps):
+        step = phase.steps[step_idx]
+        text += f" {step.action} {step.details} {step.command}"
+    return _mentions_tests(text.lower())
+
+
+@lru_cache(maxsize=256)
+def _mentions_tests(text: str) -> bool:
+    return bool(_TEST_INTENT_MATCHER.matches(text))
+
+
+def _message_tokens(msg) -> int:
+    """Estimated tokens for one conversation message (content + tool-call arguments)."""
+    tokens = _estimate_tokens(str(msg.content))
+    for tc in getattr(msg, "tool_calls", None) or []:
+        tokens += _estimate_tokens(_json.dumps(tc.get("args", {}), default=str))
+    return tokens
+
+
+def _build_orchestrator_prompt(messages, stack: str, framework: str, step_context: str,
+                               include_test_rules: bool):
+    """
+    Assemble the orchestrator's message list and a per-segment token report.
+    Returns (enhanced_messages, report).
+    """
+    from langchain_core.messages import SystemMessage
+
+    if stack == "dotnet":
+        stack_rules = DOTNET_FRAMEWORK_RULES.get(framework, DOTNET_WEBAPI_RULES)
+        test_rules = DOTNET_FRAMEWORK_TEST_RULES.get(framework, DOTNET_WEBAPI_TEST_RULES)
+    else:
+        stack_rules = STACK_RULES.get(stack, "")
+        test_rules = STACK_TEST_RULES.get(stack, "")
+
+    # (name, content, droppable) — in prompt order; droppable ones go first when over the cap
+    static_segments = [("system_prompt", SYSTEM_PROMPT, False), ("stack_rules", stack_rules, False)]
+    dropped = []
+    if test_rules:
+        if include_test_rules:
+            static_segments.append(("test_rules", test_rules, True))
+        else:
+            dropped.append("test_rules (not a test step)")
+    static_segments = [seg for seg in static_segments if seg[1]]
+
+    tokens = {name: _estimate_tokens(content) for name, content, _ in static_segments}
+    tokens["history"] = sum(_message_tokens(m) for m in messages)
+    if step_context:
+        tokens["step_context"] = _estimate_tokens(step_context)
+
+    if ORCHESTRATOR_MAX_INPUT_TOKENS:
+        for name, _, droppable in list(static_segments):
+            if sum(tokens.values()) <= ORCHESTRATOR_MAX_INPUT_TOKENS:
+                break
+            if droppable:
+                static_segments = [seg for seg in static_segments if seg[0] != name]
+                tokens.pop(name)
+                dropped.append(f"{name} (over {ORCHESTRATOR_MAX_INPUT_TOKENS} token cap)")
+
+    enhanced_messages = [SystemMessage(content=content) for _, content, _ in static_segments]
+    enhanced_messages.extend(messages)
+    if step_context:
+        enhanced_messages.append(SystemMessage(content=step_context))
+
+    static_tokens = sum(tokens[name] for name, _, _ in static_segments)
+    report = {
+        "segments": tokens,
+        "static_prefix_tokens": static_tokens,
+        "estimated_input_tokens": sum(tokens.values()),
+        "dropped": dropped,
+        "over_cap": bool(ORCHESTRATOR_MAX_INPUT_TOKENS) and sum(tokens.values()) > ORCHESTRATOR_MAX_INPUT_TOKENS,
+    }
+    return enhanced_messages, report
+
+
+# -------------------------------------------------
+# CONVERSATION COMPACTION (between tool nodes and the orchestrator)
+# -------------------------------------------------
+# Long runs accumulate every file read, build log and written file in state["messages"], and
+# the whole list is re-sent to the LLM each turn. compact_history_node rewrites OLD tool
+# results in place (same message id, so add_messages replaces rather than appends) with a short
+# summary + content-hash reference, keeping the last COMPACT_KEEP_RAW_TOOL_RESULTS raw.
+# Old manage_file "write" calls get their content argument replaced the same way.
+# tool_call_id / tool_calls are never touched, so AIMessage ↔ ToolMessage pairing stays valid.
+# If the history is still above COMPACT_TOKEN_CEILING, the kept raw results are compacted
+# oldest-first (the newest one always stays raw).
+
+COMPACT_KEEP_RAW_TOOL_RESULTS = int(os.getenv("COMPACT_KEEP_RAW_TOOL_RESULTS", "6"))
+COMPACT_TOKEN_CEILING = int(os.getenv("COMPACT_TOKEN_CEILING", "60000"))
+COMPACT_MIN_CHARS = int(os.getenv("COMPACT_MIN_CHARS", "1200"))
+
+_COMPACTED_MARKER = "[compacted "
+_COMPACT_HEAD_LINES = 8
+_COMPACT_TAIL_LINES = 8
+_COMPACT_MAX_ERROR_LINES = 12
+
+# Per-run compaction totals (appended by server.py when a run ends; served by GET /compaction-stats)
+compaction_history = _deque(maxlen=100)
+
+
+def _content_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="replace")).hexdigest()[:16]
+
+
+def _compact_text(label: str, text: str, hint: str) -> str:
+    """Head + error lines + tail of `text`, prefixed with its size and hash."""
+    lines = text.splitlines()
+    out = [f"{_COMPACTED_MARKER}{label}: {len(text)} chars, {len(lines)} lines, "
+           f"sha256:{_content_digest(text)}] {hint}"]
+    if len(lines) <= _COMPACT_HEAD_LINES + _COMPACT_TAIL_LINES:
+        out.extend(lines[:_COMPACT_HEAD_LINES])
+        return "\n".join(out)
+    middle = lines[_COMPACT_HEAD_LINES:-_COMPACT_TAIL_LINES]
+    errors = [ln for ln in middle if _ERROR_LINE_RE.search(ln)][:_COMPACT_MAX_ERROR_LINES]
+    out.extend(lines[:_COMPACT_HEAD_LINES])
+    out.append(f"... ({len(middle)} lines omitted" + (", error lines kept below)" if errors else ")"))
+    out.extend(errors)
+    if errors:
+        out.append("...")
+    out.extend(lines[-_COMPACT_TAIL_LINES:])
+    return "\n".join(out)
+
+
+def _compact_tool_result(msg):
+    """Compacted copy of a ToolMessage, or None if it is small / already compacted / has no id."""
+    content = msg.content if isinstance(msg.content, str) else str(msg.content)
+    if not msg.id or content.startswith(_COMPACTED_MARKER) or len(content) < COMPACT_MIN_CHARS:
+        return None
+    name = getattr(msg, "name", None) or "tool"
+    compacted = _compact_text(f"{name} result", content,
+                              f"Older output — re-run {name} if you need it in full.")
+    return msg.model_copy(update={"content": compacted})
+
+
+def _compact_tool_call_args(msg):
+    """Compacted copy of an AIMessage whose manage_file calls carried large file contents."""
+    if not msg.id or not getattr(msg, "tool_calls", None):
+        return None
+    changed = False
+    new_calls = []
+    for tc in msg.tool_calls:
+        args = tc.get("args") or {}
+        content = args.get("content")
+        if isinstance(content, str) and len(content) >= COMPACT_MIN_CHARS \
+                and not content.startswith(_COMPACTED_MARKER):
+            args = dict(args, content=(
+                f"{_COMPACTED_MARKER}file content: {len(content)} chars, "
+                f"sha256:{_content_digest(content)}] Already written to {args.get('path', 'the file')}."
+            ))
+            changed = True
+        new_calls.append(dict(tc, args=args))
+    if not changed:
+        return None
+    return msg.model_copy(update={"tool_calls": new_calls})
+
+
+def _message_bytes(msg) -> int:
+    size = len(str(msg.content).encode("utf-8", errors="replace"))
+    for tc in getattr(msg, "tool_calls", None) or []:
+        size += len(_json.dumps(tc.get("args", {}), default=str).encode("utf-8", errors="replace"))
+    return size
+
+
+def compact_messages(messages, keep_raw: int = None, token_ceiling: int = None):
+    """
+    Decide which messages to rewrite. Returns (replacements, stats) where replacements are
+    copies carrying the original message ids, in history order.
+    """
+    from langchain_core.messages import ToolMessage, AIMessage
+
+    keep_raw = COMPACT_KEEP_RAW_TOOL_RESULTS if keep_raw is None else keep_raw
+    token_ceiling = COMPACT_TOKEN_CEILING if token_ceiling is None else token_ceiling
+
+    tool_idxs = [i for i, m in enumerate(messages) if isinstance(m, ToolMessage)]
+    kept = tool_idxs[-keep_raw:] if keep_raw > 0 else []
+    replaced = {}  # index → compacted copy
+
+    def compact_before(boundary: int):
+        for i in range(boundary):
+            if i in replaced:
+                continue
+            m = messages[i]
+            if isinstance(m, ToolMessage) and i not in kept:
+                new = _compact_tool_result(m)
+            elif isinstance(m, AIMessage):
+                new = _compact_tool_call_args(m)
+            else:
+                new = None
+            if new is not None:
+                replaced[i] = new
+
+    compact_before(kept[0] if kept else len(messages))
+
+    # Token ceiling: give up raw results oldest-first, always leaving the newest one raw
+    if token_ceiling:
+        def total_tokens():
+            return sum(_message_tokens(replaced.get(i, m)) for i, m in enumerate(messages))
+        while len(kept) > 1 and total_tokens() > token_ceiling:
+            kept.pop(0)
+            compact_before(kept[0])
+
+    stats = {"tool_results_compacted": 0, "tool_args_compacted": 0,
+             "bytes_before": 0, "bytes_after": 0}
+    for i, new in replaced.items():
+        key = "tool_results_compacted" if isinstance(new, ToolMessage) else "tool_args_compacted"
+        stats[key] += 1
+        stats["bytes_before"] += _message_bytes(messages[i])
+        stats["bytes_after"] += _message_bytes(new)
+    stats["bytes_saved"] = stats["bytes_before"] - stats["bytes_after"]
+    return [replaced[i] for i in sorted(replaced)], stats
+
+
+async def compact_history_node(state: State):
+    """Rewrite old tool results/arguments before the orchestrator's next turn."""
+    replacements, stats = compact_messages(state["messages"])
+    if not replacements:
+        return {}
+
+    totals = dict(state.get("compaction_stats") or {})
+    totals["compactions"] = totals.get("compactions", 0) + 1
+    for key, value in stats.items():
+        totals[key] = totals.get(key, 0) + value
+    logger.info("[compaction] rewrote %d results + %d write args, saved %d bytes (run total %d)",
+                stats["tool_results_compacted"], stats["tool_args_compacted"],
+                stats["bytes_saved"], totals["bytes_saved"])
+    return {"messages": replacements, "compaction_stats": totals}
+
+
+async def orchestrator_agent(state: State):
     """Orchestrator: understands intent, plans, and invokes tools.
     
     When a task_plan exists (set by planner_node), the orchestrator:
@@ -4907,111 +5787,71 @@ def orchestrator_agent(state: State):
     Phase review/build is handled by phase_review_build_node — NOT here.
     
     When no plan exists, it behaves as the normal orchestrator.
+    Prompt assembly and per-turn token accounting live in _build_orchestrator_prompt.
     """
-    global _current_dotnet_framework
-    from langchain_core.messages import SystemMessage
-    import json as _json
-
     messages = state["messages"]
-    task_plan = state.get("task_plan", "")
+    plan = plan_from_state(state)
     phase_idx = state.get("current_phase_idx", 0)
     step_idx = state.get("current_step_idx", 0)
 
     state_update = {}
     
-    # Detect stack from user messages
-    stack = detect_stack(messages)
-    
-    # Build message list: SYSTEM_PROMPT first
-    enhanced_messages = [SystemMessage(content=SYSTEM_PROMPT)]
-    
+    # Stack/framework of the request: classified on the first turn, then read from State
+    profile = request_profile(state)
+    if state.get("request_profile") is not profile:
+        state_update["request_profile"] = profile
+    stack = profile.stack
+    framework = ""
     if stack == "dotnet":
-        framework = detect_dotnet_framework(messages)
-        _current_dotnet_framework = framework
-        fw_rules = DOTNET_FRAMEWORK_RULES.get(framework, DOTNET_WEBAPI_RULES)
-        enhanced_messages.append(SystemMessage(content=fw_rules))
-        fw_test_rules = DOTNET_FRAMEWORK_TEST_RULES.get(framework, DOTNET_WEBAPI_TEST_RULES)
-        enhanced_messages.append(SystemMessage(content=fw_test_rules))
-    else:
-        stack_rules = STACK_RULES.get(stack, "")
-        if stack_rules:
-            enhanced_messages.append(SystemMessage(content=stack_rules))
-        stack_test_rules = STACK_TEST_RULES.get(stack, "")
-        if stack_test_rules:
-            enhanced_messages.append(SystemMessage(content=stack_test_rules))
+        framework = profile.dotnet_framework
+        current_session().dotnet_framework = framework
     
     # If a task plan exists, inject ONLY the current step context
-    if task_plan:
-        step_context = _build_phase_step_context(task_plan, phase_idx, step_idx)
-        if step_context:
-            enhanced_messages.append(SystemMessage(content=step_context))
-    
-    # Append all conversation messages
-    enhanced_messages.extend(messages)
-    
-    result = {"messages": [llm.invoke(enhanced_messages)]}
+    step_context = _build_phase_step_context(plan, phase_idx, step_idx) if plan else ""
+
+    enhanced_messages, report = _build_orchestrator_prompt(
+        messages, stack, framework, step_context,
+        include_test_rules=_needs_test_rules(profile, plan, phase_idx, step_idx),
+    )
+
+    response = await llm.ainvoke(enhanced_messages)
+
+    # Per-turn size accounting: our estimate per segment + the provider's actual usage
+    usage = getattr(response, "usage_metadata", None) or {}
+    report["provider_input_tokens"] = usage.get("input_tokens")
+    report["provider_cached_tokens"] = (usage.get("input_token_details") or {}).get("cache_read")
+    report["phase_idx"], report["step_idx"] = phase_idx, step_idx
+    prompt_usage_history.append(report)
+    logger.info("[orchestrator] prompt tokens est=%s provider=%s cached=%s segments=%s dropped=%s",
+                report["estimated_input_tokens"], report["provider_input_tokens"],
+                report["provider_cached_tokens"], report["segments"], report["dropped"])
+    if report["over_cap"]:
+        await broadcast_log(f"⚠️ Prompt is ~{report['estimated_input_tokens']} tokens, "
+                            f"over the {ORCHESTRATOR_MAX_INPUT_TOKENS} token cap")
+
+    result = {"messages": [response]}
     result.update(state_update)
     return result
 
 
 def _plan_has_remaining_steps(state: State) -> bool:
     """Check if the active plan still has steps/phases to execute."""
-    import json as _json
-    task_plan = state.get("task_plan", "")
-    if not task_plan:
-        return False
-    try:
-        plan = _json.loads(task_plan)
-        phases = plan.get("phases", [])
-        phase_idx = state.get("current_phase_idx", 0)
-        step_idx = state.get("current_step_idx", 0)
-        if phase_idx >= len(phases):
-            return False
-        current_phase = phases[phase_idx]
-        total_steps = len(current_phase.get("steps", []))
-        # Still has steps in current phase
-        if step_idx < total_steps:
-            return True
-        # Current phase steps done but review/build still pending
-        # (the phase_advance node handles this — let it run)
-        return True
-    except _json.JSONDecodeError:
-        return False
+    plan = plan_from_state(state)
+    # Steps left in the current phase, or its review/build still pending (phase_advance handles that)
+    return plan is not None and plan.phase(state.get("current_phase_idx", 0)) is not None
 
 
 def _phase_steps_done(state: State) -> bool:
     """Check if all steps within the current phase are complete (but review/build may still be needed)."""
-    import json as _json
-    task_plan = state.get("task_plan", "")
-    if not task_plan:
-        return True
-    try:
-        plan = _json.loads(task_plan)
-        phases = plan.get("phases", [])
-        phase_idx = state.get("current_phase_idx", 0)
-        step_idx = state.get("current_step_idx", 0)
-        if phase_idx >= len(phases):
-            return True
-        phase = phases[phase_idx]
-        total_steps = len(phase.get("steps", []))
-        return step_idx >= total_steps
-    except _json.JSONDecodeError:
-        return True
+    plan = plan_from_state(state)
+    phase = plan.phase(state.get("current_phase_idx", 0)) if plan else None
+    return phase is None or state.get("current_step_idx", 0) >= len(phase.steps)
 
 
 def _is_last_phase(state: State) -> bool:
     """Check if the current phase is the last one (integration_validation)."""
-    import json as _json
-    task_plan = state.get("task_plan", "")
-    if not task_plan:
-        return True
-    try:
-        plan = _json.loads(task_plan)
-        phases = plan.get("phases", [])
-        phase_idx = state.get("current_phase_idx", 0)
-        return phase_idx >= len(phases) - 1
-    except _json.JSONDecodeError:
-        return True
+    plan = plan_from_state(state)
+    return plan is None or state.get("current_phase_idx", 0) >= len(plan.phases) - 1
 
 
 def phase_advance_node(state: State):
@@ -5026,32 +5866,38 @@ def phase_advance_node(state: State):
     This is the ONLY place where step/phase advancement happens.
     """
     from langchain_core.messages import SystemMessage
-    import json as _json
 
-    task_plan = state.get("task_plan", "")
+    plan = plan_from_state(state)
     phase_idx = state.get("current_phase_idx", 0)
     step_idx = state.get("current_step_idx", 0)
 
     state_update = {}
 
-    if not task_plan:
+    if plan is None:
         return {"messages": [SystemMessage(content="⚡ Continue with the next action.")]}
 
-    try:
-        plan = _json.loads(task_plan)
-        phases = plan.get("phases", [])
-    except _json.JSONDecodeError:
-        return {"messages": [SystemMessage(content="⚡ Continue with the next action.")]}
-
-    if phase_idx >= len(phases):
+    phase = plan.phase(phase_idx)
+    if phase is None:
         return {"messages": [SystemMessage(content="✅ All phases complete. Generate the final report.")]}
 
-    phase = phases[phase_idx]
-    total_steps = len(phase.get("steps", []))
-    phase_name = phase.get("name", f"Phase {phase_idx + 1}")
+    total_steps = len(phase.steps)
+    phase_name = phase.name
+
+    # The agent just finished step_idx (fast-path steps were already recorded by their node)
+    completed = set(state.get("completed_steps") or [])
+    now = time.time()
+    if step_idx < total_steps and step_key(phase_idx, step_idx) not in completed:
+        completed.add(step_key(phase_idx, step_idx))
+        state_update["completed_steps"] = sorted(completed)
+        state_update["step_timings"] = list(state.get("step_timings") or []) + [
+            _step_timing(phase_idx, step_idx, phase.steps[step_idx], "llm", state.get("step_clock") or now, now)
+        ]
+    state_update["step_clock"] = now
 
-    # Advance to next step
+    # Advance to the next step that is not done yet
     new_step = step_idx + 1
+    while new_step < total_steps and step_key(phase_idx, new_step) in completed:
+        new_step += 1
     # Edge case: phase with 0 steps → immediately mark as steps_done
     if total_steps == 0:
         new_step = 0
@@ -5059,11 +5905,11 @@ def phase_advance_node(state: State):
     if new_step < total_steps:
         # More steps in this phase → advance and loop back to agent
         state_update["current_step_idx"] = new_step
-        next_step_info = phase["steps"][new_step]
+        next_step_info = phase.steps[new_step]
         nudge = (
             f"⚡ Step completed. Phase '{phase_name}' → "
-            f"Step {next_step_info.get('step', new_step+1)}: "
-            f"{next_step_info.get('action', '')}. "
+            f"Step {next_step_info.number}: "
+            f"{next_step_info.action}. "
             f"Execute this step NOW."
         )
         state_update["phase_status"] = "running"
@@ -5074,9 +5920,9 @@ def phase_advance_node(state: State):
         state_update["current_step_idx"] = new_step  # past last step
         state_update["phase_status"] = "steps_done"
         suffix = []
-        if phase.get("review"):
+        if phase.review:
             suffix.append("batch review")
-        if phase.get("build"):
+        if phase.build:
             suffix.append("build")
         auto_note = f" Auto-running: {', '.join(suffix)}." if suffix else ""
         nudge = f"✅ Phase '{phase_name}' implementation complete.{auto_note}"
@@ -5086,53 +5932,333 @@ def phase_advance_node(state: State):
     return result
 
 
-def phase_review_build_node(state: State):
+# -------------------------------------------------
+# PLAN STEP FAST PATH (mechanical steps without an LLM turn)
+# -------------------------------------------------
+# "execute"/"generate" steps whose command is already in the plan (template copy,
+# npm install, npx ng g c ...) are run by step_fast_path_node straight through
+# execute_terminal; the orchestrator LLM is only involved for "code" steps, steps
+# without a concrete command, and when the fast-path command fails (the failure and
+# its output are left in the conversation for the agent to fix). The tool call and
+# result are recorded as AIMessage/ToolMessage so the transcript looks the same as
+# when the LLM makes the call. PLAN_FAST_PATH=0 disables it.
+
+PLAN_FAST_PATH = os.getenv("PLAN_FAST_PATH", "1") != "0"
+PLAN_FAST_PATH_MAX_PARALLEL = int(os.getenv("PLAN_FAST_PATH_MAX_PARALLEL", "4"))
+_FAST_PATH_STEP_TYPES = ("execute", "generate")
+# Placeholders the LLM must fill in, and commands that never exit on their own
+_FAST_PATH_UNSAFE_RE = re.compile(
+    r"<[^<>\n]+>|DISCOVER_TEMPLATE|\b(?:ng serve|npm (?:run )?start|dotnet (?:run|watch)|nodemon|tail -f)\b"
+)
+_FAST_PATH_OK_PREFIXES = ("Command executed successfully", "✅ npm install skipped")
+
+
+def _fast_path_command(step) -> str:
+    """The step's command if it can run without the LLM, else ""."""
+    command = step.command.strip()
+    if step.type not in _FAST_PATH_STEP_TYPES or not command or _FAST_PATH_UNSAFE_RE.search(command):
+        return ""
+    return command
+
+
+# Critical-path reports of recent runs (served by GET /plan-timings in server.py)
+plan_timing_reports = _deque(maxlen=50)
+
+
+def _step_timing(phase_idx: int, step_idx, step, mode: str, start: float, end: float) -> dict:
+    label = f"P{phase_idx + 1}.S{step.number} {step.action[:60]}" if step else f"P{phase_idx + 1} review+build"
+    return {"phase": phase_idx, "step": step_idx, "label": label, "mode": mode, "start": start, "end": end}
+
+
+def _ready_fast_path_steps(plan: TaskPlan, phase_idx: int, completed: set) -> List[int]:
+    """Not-yet-done mechanical steps of the phase whose dependencies are all done (run together)."""
+    phase = plan.phase(phase_idx)
+    ready = []
+    for j, step in enumerate(phase.steps):
+        if step_key(phase_idx, j) in completed or not _fast_path_command(step):
+            continue
+        if all(step_key(phase_idx, d) in completed for d in phase.dependencies(j)):
+            ready.append(j)
+    return ready[:PLAN_FAST_PATH_MAX_PARALLEL]
+
+
+def route_next_step(state: State):
+    """
+    After the planner, phase_advance and phase_review_build:
+    - current step is mechanical and its dependencies are done → step_fast_path
+    - phase steps just finished → phase_review_build (no LLM turn needed to announce it)
+    - otherwise → agent
+    """
+    plan = plan_from_state(state)
+    phase_idx = state.get("current_phase_idx", 0)
+    phase = plan.phase(phase_idx) if plan else None
+    status = state.get("phase_status", "pending")
+    if phase is None or status in ("build_failed", "failed", "fast_path_failed"):
+        return "agent"
+    step_idx = state.get("current_step_idx", 0)
+    if step_idx >= len(phase.steps):
+        return "phase_review_build" if status == "steps_done" else "agent"
+    if PLAN_FAST_PATH and step_idx in _ready_fast_path_steps(plan, phase_idx, set(state.get("completed_steps") or [])):
+        return "step_fast_path"
+    return "agent"
+
+
+async def step_fast_path_node(state: State):
+    """
+    Run the current plan step's command directly, together with every other mechanical step
+    of the phase that is ready (dependencies done); steps sharing a working directory run
+    one after another. phase_status 'fast_path_failed' hands the
+    first failed step to the agent.
+    """
+    from langchain_core.messages import AIMessage, ToolMessage
+    import uuid
+
+    plan = plan_from_state(state)
+    phase_idx = state.get("current_phase_idx", 0)
+    phase = plan.phase(phase_idx)
+    completed = set(state.get("completed_steps") or [])
+    batch = _ready_fast_path_steps(plan, phase_idx, completed)
+
+    # Like run_build_commands: one sequential chain per working directory, so two generators
+    # editing the same angular.json / app.module.ts never run at the same time
+    workspace = get_workspace_path()
+    chains: dict = {}
+    for j in batch:
+        chains.setdefault(_build_dir_key(_fast_path_command(phase.steps[j]), workspace), []).append(j)
+
+    async def run_chain(indices: list) -> list:
+        done = []
+        for j in indices:
+            command = _fast_path_command(phase.steps[j])
+            started = time.time()
+            result = str(await execute_terminal.ainvoke({"command": command}))
+            done.append((j, command, result, started, time.time()))
+            if not result.startswith(_FAST_PATH_OK_PREFIXES):
+                break  # the rest of this directory's steps wait until the failure is fixed
+        return done
+
+    if len(chains) > 1:
+        await broadcast_log(f"⚡ Running {len(batch)} independent steps without the LLM ({len(chains)} directories "
+                            f"in parallel): " + ", ".join(f"Step {phase.steps[j].number}" for j in batch))
+    else:
+        await broadcast_log(f"⚡ Step(s) {', '.join(str(phase.steps[j].number) for j in batch)} run without the LLM: "
+                            + " ; ".join(_fast_path_command(phase.steps[j]) for j in batch))
+    outcomes = [o for chain in await asyncio.gather(*(run_chain(c) for c in chains.values())) for o in chain]
+
+    tool_calls, tool_messages, timings, failed = [], [], [], []
+    for j, command, result, started, ended in outcomes:
+        step = phase.steps[j]
+        call_id = f"fastpath_{uuid.uuid4().hex[:12]}"
+        logger.info("[fast_path] step %s: %s (%.1fs)", step.number, command, ended - started)
+        if result.startswith(_FAST_PATH_OK_PREFIXES):
+            completed.add(step_key(phase_idx, j))
+            timings.append(_step_timing(phase_idx, j, step, "fast_path", started, ended))
+        else:
+            failed.append(j)
+            result += (f"\n\n❌ Step {step.number} ({step.action}) failed when run automatically. Check the output "
+                       f"above, fix the cause (or run a corrected command) and complete step {step.number}.")
+        tool_calls.append({"name": "execute_terminal", "args": {"command": command}, "id": call_id})
+        tool_messages.append(ToolMessage(content=result, tool_call_id=call_id, name="execute_terminal"))
+
+    update = {
+        "messages": [AIMessage(content="", tool_calls=tool_calls), *tool_messages],
+        "completed_steps": sorted(completed),
+        "step_timings": list(state.get("step_timings") or []) + timings,
+        "step_clock": time.time(),
+    }
+    if failed:
+        # The agent fixes the first failed step; the others are retried when their turn comes
+        update.update(current_step_idx=failed[0], phase_status="fast_path_failed")
+    else:
+        update["phase_status"] = "running"
+    return update
+
+
+def route_after_fast_path(state: State):
+    """Successful fast-path step → phase_advance; failure → compact → agent."""
+    return "compact" if state.get("phase_status") == "fast_path_failed" else "phase_advance"
+
+
+# -------------------------------------------------
+# PHASE BUILD EXECUTOR (async, parallel per working directory)
+# -------------------------------------------------
+# Build commands from the plan ("cd <dir> && dotnet build", "cd <dir> && npx ng build")
+# run as asyncio subprocesses. Commands that target different directories are
+# independent and run in parallel; commands for the same directory keep their order.
+# Output is streamed through broadcast_log like execute_terminal, and each process is
+# registered in running_processes so /kill-process works for builds too.
+
+BUILD_TIMEOUT = 120  # seconds per build command
+BUILD_FAIL_FAST = os.getenv("BUILD_FAIL_FAST", "0") == "1"  # cancel sibling builds on first failure
+
+_BUILD_CD_RE = re.compile(r"^\s*cd\s+([^&;|]+?)\s*&&")
+
+
+def _build_dir_key(command: str, workspace: str) -> str:
+    """Directory a build command runs in (from a leading `cd <dir> &&`), used to group commands."""
+    m = _BUILD_CD_RE.match(command)
+    if not m:
+        return os.path.normpath(workspace)
+    return os.path.normpath(os.path.join(workspace, m.group(1).strip().strip("'\"")))
+
+
+async def _run_build_command(command: str, workspace: str, timeout: int = BUILD_TIMEOUT) -> dict:
+    """Run one build command, streaming its output. Returns a structured result dict."""
+    import uuid
+    process_id = str(uuid.uuid4())[:8]
+    label = os.path.basename(_build_dir_key(command, workspace)) or "build"
+    started = time.monotonic()
+
+    await broadcast_log(f"🔨 [{label}] Building: {command}")
+    output = CommandOutput(command)
+    try:
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=workspace,
+            start_new_session=True,  # own process group, so a kill also stops msbuild/ng workers
+        )
+    except BaseException:
+        output.close()  # e.g. the workspace directory is gone
+        raise
+    running_processes[process_id] = {"process": process, "command": command, "workspace": workspace}
+    await broadcast_process_event("start", process_id, command)
+
+    async def pump(stream, name, prefix):
+        while True:
+            line = await stream.readline()
+            if not line:
+                break
+            msg = line.decode(errors="replace").strip()
+            if msg:
+                output.add(name, msg)
+                await broadcast_log(f"  [{label}] {prefix}{msg}")
+
+    async def run_until_done():
+        await asyncio.gather(pump(process.stdout, "stdout", ""), pump(process.stderr, "stderr", "❌ "))
+        await process.wait()
+
+    status = "failed"
+    try:
+        await asyncio.wait_for(run_until_done(), timeout=timeout)
+        status = "passed" if process.returncode == 0 else "failed"
+    except asyncio.TimeoutError:
+        status = "timeout"
+    finally:
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+                await asyncio.wait_for(process.wait(), timeout=5.0)
+            except (ProcessLookupError, asyncio.TimeoutError):
+                pass
+        output.close()
+        running_processes.pop(process_id, None)
+        await broadcast_process_event("end", process_id, command)
+
+    duration = time.monotonic() - started
+    icon = "✅" if status == "passed" else "❌"
+    await broadcast_log(f"{icon} [{label}] Build {status} in {duration:.1f}s: {command}")
+    return {
+        "command": command,
+        "status": status,
+        "exit_code": process.returncode,
+        "duration_s": round(duration, 2),
+        "stdout": output.stdout.render(),
+        "stderr": output.stderr.render(),
+        "log_id": output.log_id,
+    }
+
+
+async def run_build_commands(commands: list, workspace: str = None, fail_fast: bool = BUILD_FAIL_FAST,
+                             timeout: int = BUILD_TIMEOUT) -> list:
+    """
+    Run build commands concurrently (one sequential chain per working directory).
+    With fail_fast, the first failure cancels every sibling build still running.
+    Returns one result dict per command, in the original command order; commands
+    that never ran (cancelled) have status "cancelled" and exit_code None.
+    """
+    workspace = workspace or get_workspace_path()
+    results = [None] * len(commands)
+    chains: dict = {}  # dir → [command index, ...] in plan order
+    for idx, cmd in enumerate(commands):
+        chains.setdefault(_build_dir_key(cmd, workspace), []).append(idx)
+
+    tasks = []
+
+    async def run_chain(indices: list):
+        for idx in indices:
+            try:
+                results[idx] = await _run_build_command(commands[idx], workspace, timeout)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                results[idx] = {"command": commands[idx], "status": "error", "exit_code": None,
+                                "duration_s": 0.0, "stdout": "", "stderr": str(e)}
+            if results[idx]["status"] != "passed" and fail_fast:
+                for t in tasks:
+                    if t is not asyncio.current_task():
+                        t.cancel()
+                return
+
+    started = time.monotonic()
+    tasks.extend(asyncio.create_task(run_chain(indices)) for indices in chains.values())
+    await asyncio.gather(*tasks, return_exceptions=True)
+    wall = time.monotonic() - started
+
+    for idx, cmd in enumerate(commands):
+        if results[idx] is None:
+            results[idx] = {"command": cmd, "status": "cancelled", "exit_code": None,
+                            "duration_s": 0.0, "stdout": "", "stderr": ""}
+    if commands:
+        timings = ", ".join(f"{os.path.basename(_build_dir_key(r['command'], workspace))}={r['duration_s']}s"
+                            for r in results)
+        await broadcast_log(f"⏱️ Builds finished in {wall:.1f}s wall ({timings})")
+    return results
+
+
+async def phase_review_build_node(state: State):
     """
     Runs per-phase batch review and build commands automatically.
     Fires after all steps in a phase are done (phase_status == 'steps_done').
     
     - If phase.review=true → calls scalable_batch_review (only for files created in this phase)
-    - If phase.build=true → runs build_commands via execute_terminal
+    - If phase.build=true → runs build_commands via run_build_commands (independent dirs in parallel)
     - If build fails → increments retry_count (up to MAX_PHASE_RETRIES), marks failed
     - If all succeeds → advances to next phase, resets step_idx and retry_count
     """
     from langchain_core.messages import SystemMessage, AIMessage
     import json as _json
-    import subprocess
     import hashlib
 
-    task_plan = state.get("task_plan", "")
+    plan = plan_from_state(state)
     phase_idx = state.get("current_phase_idx", 0)
     retry_count = state.get("retry_count", 0)
     state_update = {}
     log_parts = []
 
-    if not task_plan:
+    if plan is None:
         return {"messages": [SystemMessage(content="⚡ Continue.")]}
 
-    try:
-        plan = _json.loads(task_plan)
-        phases = plan.get("phases", [])
-    except _json.JSONDecodeError:
-        return {"messages": [SystemMessage(content="⚡ Continue.")]}
-
-    if phase_idx >= len(phases):
+    phase = plan.phase(phase_idx)
+    if phase is None:
         return {"messages": [SystemMessage(content="✅ All phases complete.")]}
 
-    phase = phases[phase_idx]
-    phase_name = phase.get("name", f"Phase {phase_idx + 1}")
+    phases = plan.phases
+    phase_name = phase.name
     workspace = get_workspace_path()
+    session = current_session()
 
     # ── PER-PHASE REVIEW ──
-    if phase.get("review", False):
+    if phase.review:
         # Only review files created/modified in THIS phase
-        phase_files_to_review = list(_phase_created_files)
+        phase_files_to_review = list(session.phase_created_files)
         if phase_files_to_review:
             # Filter to code files only (skip configs, non-code)
             code_files = []
             for fp in phase_files_to_review:
                 ext = os.path.splitext(fp)[1].lower()
-                if ext not in _SKIP_EXTENSIONS and "node_modules" not in fp:
+                if ext not in _SKIP_EXTENSIONS and not _is_ignored_path(fp):
                     code_files.append(fp)
 
             if code_files:
@@ -5140,10 +6266,9 @@ def phase_review_build_node(state: State):
                 files_to_review = []
                 for fp in code_files:
                     try:
-                        with open(fp, "r", encoding="utf-8", errors="ignore") as f:
-                            content = f.read()
+                        content = file_content_cache.read(fp)
                         h = hashlib.sha256(content.encode()).hexdigest()
-                        if _review_cache.get(fp) != h:
+                        if session.review_cache.get(fp) != h:
                             files_to_review.append((fp, content, h))
                     except Exception:
                         pass
@@ -5156,43 +6281,71 @@ def phase_review_build_node(state: State):
                         layer = _classify_layer(fp)
                         layer_groups.setdefault(layer, []).append((fp, content, h))
 
+                    review_prompt = REVIEW_FAST_PROMPT if REVIEW_MODE == "FAST" else REVIEW_STRICT_PROMPT
                     issues_found = 0
+                    cached_count = 0
+
+                    def apply_review_patch(fr: dict):
+                        """Apply a verdict's unified diff to the file on disk (best effort)."""
+                        patch_path = fr["path"]
+                        if not os.path.isabs(patch_path):
+                            patch_path = os.path.join(workspace, patch_path)
+                        try:
+                            original = file_content_cache.read(patch_path, strict=True)
+                            patched = _apply_unified_diff(original, fr["unified_diff"])
+                            if patched and patched != original:
+                                with open(patch_path, "w", encoding="utf-8") as pf:
+                                    pf.write(patched)
+                                file_content_cache.put(patch_path, patched)
+                        except Exception:
+                            pass
+
                     for layer, file_group in layer_groups.items():
-                        # Build review payload
+                        # Reuse persisted verdicts for content already judged; only send the rest
                         file_payloads = []
+                        group_keys = {}
                         for fp, content, h in file_group:
-                            # Chunk if too large
                             lines = content.split("\n")
-                            if len(lines) > _MAX_LINES_PER_CHUNK:
+                            is_large = len(lines) > _MAX_LINES_PER_CHUNK
+                            # Large files are only reviewed on their first chunk here: keep that
+                            # partial verdict apart from scalable_batch_review's full chunked one
+                            key = _review_verdict_key(content, REVIEW_MODE, f"{layer}:truncated" if is_large else layer,
+                                                      prompt=review_prompt)
+                            verdict = await asyncio.to_thread(review_verdict_cache.get, key)
+                            if verdict is not None:
+                                cached_count += 1
+                                if verdict.get("patch_required") and verdict.get("unified_diff"):
+                                    apply_review_patch(dict(verdict, path=fp))
+                                    issues_found += 1
+                                continue
+                            group_keys[fp] = key
+                            # Chunk if too large
+                            if is_large:
                                 chunk = "\n".join(lines[:_MAX_LINES_PER_CHUNK])
                                 file_payloads.append({"path": fp, "content": chunk + "\n// ... truncated"})
                             else:
                                 file_payloads.append({"path": fp, "content": content})
 
-                        review_prompt = REVIEW_FAST_PROMPT if REVIEW_MODE == "FAST" else REVIEW_STRICT_PROMPT
+                        if not file_payloads:
+                            continue
+
                         payload = _json.dumps({"mode": REVIEW_MODE, "files": file_payloads})
                         try:
                             from langchain_core.messages import HumanMessage as _HM
-                            resp = review_llm.invoke([
+                            resp = await review_llm.ainvoke([
                                 SystemMessage(content=review_prompt),
                                 _HM(content=payload)
                             ])
                             review_result = _json.loads(resp.content.strip())
                             for fr in review_result.get("files", []):
+                                fr_path = fr.get("path", "")
+                                if not os.path.isabs(fr_path):
+                                    fr_path = os.path.join(workspace, fr_path)
+                                if fr_path in group_keys:
+                                    await asyncio.to_thread(review_verdict_cache.put, group_keys[fr_path], fr)
                                 if fr.get("patch_required") and fr.get("unified_diff"):
                                     # Apply patch using unified diff
-                                    patch_path = fr["path"]
-                                    if not os.path.isabs(patch_path):
-                                        patch_path = os.path.join(workspace, patch_path)
-                                    try:
-                                        with open(patch_path, "r", encoding="utf-8") as pf:
-                                            original = pf.read()
-                                        patched = _apply_unified_diff(original, fr["unified_diff"])
-                                        if patched and patched != original:
-                                            with open(patch_path, "w", encoding="utf-8") as pf:
-                                                pf.write(patched)
-                                    except Exception:
-                                        pass
+                                    apply_review_patch(fr)
                                     issues_found += 1
                         except Exception:
                             pass
@@ -5201,13 +6354,13 @@ def phase_review_build_node(state: State):
                     for fp, content, h in files_to_review:
                         # Re-read in case patch was applied
                         try:
-                            with open(fp, "r", encoding="utf-8", errors="ignore") as f:
-                                new_content = f.read()
-                            _review_cache[fp] = hashlib.sha256(new_content.encode()).hexdigest()
+                            new_content = file_content_cache.read(fp)
+                            session.review_cache[fp] = hashlib.sha256(new_content.encode()).hexdigest()
                         except Exception:
-                            _review_cache[fp] = h
+                            session.review_cache[fp] = h
 
-                    log_parts.append(f"📝 Review: {len(files_to_review)} file(s), {issues_found} patch(es)")
+                    cached_note = f", {cached_count} from cache" if cached_count else ""
+                    log_parts.append(f"📝 Review: {len(files_to_review)} file(s), {issues_found} patch(es){cached_note}")
                 else:
                     log_parts.append("📝 Review: all files unchanged, skipped")
             else:
@@ -5217,26 +6370,22 @@ def phase_review_build_node(state: State):
 
     # ── PER-PHASE BUILD ──
     build_failed = False
-    if phase.get("build", False):
-        build_commands = phase.get("build_commands", [])
-        for cmd in build_commands:
-            try:
-                result = subprocess.run(
-                    cmd, shell=True, cwd=workspace,
-                    capture_output=True, text=True, timeout=120
-                )
-                if result.returncode != 0:
-                    build_failed = True
-                    error_output = (result.stderr or result.stdout or "Unknown error")[:500]
-                    log_parts.append(f"❌ Build failed: {cmd}\n{error_output}")
-                else:
-                    log_parts.append(f"✅ Build passed: {cmd}")
-            except subprocess.TimeoutExpired:
+    if phase.build:
+        build_commands = list(phase.build_commands)
+        for res in await run_build_commands(build_commands, workspace):
+            cmd = res["command"]
+            if res["status"] == "passed":
+                log_parts.append(f"✅ Build passed: {cmd} ({res['duration_s']}s)")
+            elif res["status"] == "timeout":
                 build_failed = True
                 log_parts.append(f"❌ Build timed out: {cmd}")
-            except Exception as e:
+            elif res["status"] == "cancelled":
+                build_failed = True
+                log_parts.append(f"⏹️ Build cancelled (sibling failed): {cmd}")
+            else:
                 build_failed = True
-                log_parts.append(f"❌ Build error: {cmd} — {str(e)}")
+                error_output = (res["stderr"] or res["stdout"] or "Unknown error")[:500]
+                log_parts.append(f"❌ Build failed: {cmd}\n{error_output}")
 
     # ── DECIDE NEXT STATE ──
     if build_failed:
@@ -5245,7 +6394,7 @@ def phase_review_build_node(state: State):
             state_update["phase_status"] = "build_failed"
             # Go back to agent to fix the build error
             # Reset step_idx to the last step so agent can see context
-            total_steps = len(phase.get("steps", []))
+            total_steps = len(phase.steps)
             state_update["current_step_idx"] = total_steps  # past end = "fix mode"
             nudge = (
                 f"❌ Phase '{phase_name}' build FAILED (attempt {retry_count + 1}/{MAX_PHASE_RETRIES}). "
@@ -5264,8 +6413,14 @@ def phase_review_build_node(state: State):
         state_update["retry_count"] = 0
         state_update["phase_status"] = "completed"
         state_update["phase_files"] = "[]"
+        # Review/build (and any fix rounds) ran from the end of the last step until now
+        now = time.time()
+        state_update["step_timings"] = list(state.get("step_timings") or []) + [
+            _step_timing(phase_idx, "review_build", None, "review_build", state.get("step_clock") or now, now)
+        ]
+        state_update["step_clock"] = now
         # Clear per-phase file tracking
-        _phase_created_files.clear()
+        session.phase_created_files.clear()
 
         next_phase_idx = phase_idx + 1
         if next_phase_idx < len(phases):
@@ -5273,7 +6428,7 @@ def phase_review_build_node(state: State):
             nudge = (
                 f"✅ Phase '{phase_name}' complete. "
                 f"{' | '.join(log_parts)}\n"
-                f"⚡ Moving to Phase {next_phase_idx + 1}: '{next_phase.get('name', '')}'. "
+                f"⚡ Moving to Phase {next_phase_idx + 1}: '{next_phase.name}'. "
                 f"Execute the first step NOW."
             )
         else:
@@ -5287,7 +6442,7 @@ def phase_review_build_node(state: State):
     return result_msg
 
 
-def integration_validator_node(state: State):
+async def integration_validator_node(state: State):
     """
     Final validation node. Runs after all phases complete.
     Verifies:
@@ -5297,24 +6452,15 @@ def integration_validator_node(state: State):
     - Reports any issues
     """
     from langchain_core.messages import SystemMessage
-    import json as _json
-    import subprocess
 
-    task_plan = state.get("task_plan", "")
+    plan = plan_from_state(state)
     workspace = get_workspace_path()
     validation_results = []
 
-    try:
-        plan = _json.loads(task_plan) if task_plan else {}
-    except _json.JSONDecodeError:
-        plan = {}
-
-    phases = plan.get("phases", [])
-
     # Collect all build commands from all phases
     all_build_cmds = []
-    for phase in phases:
-        all_build_cmds.extend(phase.get("build_commands", []))
+    for phase in (plan.phases if plan else ()):
+        all_build_cmds.extend(phase.build_commands)
 
     # Deduplicate
     seen = set()
@@ -5324,20 +6470,16 @@ def integration_validator_node(state: State):
             seen.add(cmd)
             unique_cmds.append(cmd)
 
-    # Run each build command as a final verification
-    for cmd in unique_cmds:
-        try:
-            result = subprocess.run(
-                cmd, shell=True, cwd=workspace,
-                capture_output=True, text=True, timeout=120
-            )
-            if result.returncode == 0:
-                validation_results.append(f"✅ {cmd}")
-            else:
-                err = (result.stderr or result.stdout or "Unknown error")[:300]
-                validation_results.append(f"❌ {cmd}: {err}")
-        except Exception as e:
-            validation_results.append(f"❌ {cmd}: {str(e)}")
+    # Run all build commands as a final verification (independent builds in parallel)
+    for res in await run_build_commands(unique_cmds, workspace, fail_fast=False):
+        cmd = res["command"]
+        if res["status"] == "passed":
+            validation_results.append(f"✅ {cmd} ({res['duration_s']}s)")
+        elif res["status"] == "timeout":
+            validation_results.append(f"❌ {cmd}: timed out after {BUILD_TIMEOUT}s")
+        else:
+            err = (res["stderr"] or res["stdout"] or "Unknown error")[:300]
+            validation_results.append(f"❌ {cmd}: {err}")
 
     # Check port preservation (verify config files weren't modified to change ports)
     port_check = "✅ Ports preserved (no validation issues)"
@@ -5359,6 +6501,16 @@ def integration_validator_node(state: State):
                 pass
     validation_results.append(port_check)
 
+    timings = state.get("step_timings") or []
+    if plan and timings:
+        report = critical_path_report(plan, timings)
+        plan_timing_reports.append(report)
+        await broadcast_log(
+            f"⏱️ Plan ran in {report['wall_s']}s wall-clock ({report['serial_s']}s of step time, "
+            f"parallelism {report['parallelism']}x); critical path {report['critical_path_s']}s: "
+            + " → ".join(report["critical_path"])
+        )
+
     summary = "\n".join(validation_results)
     nudge = (
         f"🔍 INTEGRATION VALIDATION COMPLETE:\n{summary}\n\n"
@@ -5383,13 +6535,12 @@ def route_tools_or_end(state: State):
     - Orchestrator outputs under key 'agent'
     - Tool nodes output under their node name
     """
-    import json as _json
     last_message = state["messages"][-1]
     
     # No tool calls → step/phase advancement
     if not hasattr(last_message, "tool_calls") or not last_message.tool_calls:
-        task_plan = state.get("task_plan", "")
-        if not task_plan:
+        plan = plan_from_state(state)
+        if plan is None:
             return END
 
         phase_status = state.get("phase_status", "pending")
@@ -5399,36 +6550,21 @@ def route_tools_or_end(state: State):
             # Agent has fixed code → re-run review+build
             return "phase_review_build"
 
-        try:
-            plan = _json.loads(task_plan)
-            phases = plan.get("phases", [])
-            phase_idx = state.get("current_phase_idx", 0)
-            step_idx = state.get("current_step_idx", 0)
-
-            if phase_idx >= len(phases):
-                # All phases done — run integration validator (or END if already validated)
-                if phase_status == "validated":
-                    return END
-                return "integration_validator"
-
-            phase = phases[phase_idx]
-            total_steps = len(phase.get("steps", []))
-
-            if step_idx < total_steps:
-                # More steps in current phase → advance step
-                return "phase_advance"
-            else:
-                # All steps done → check if review/build needed
-                if phase.get("review") or phase.get("build"):
-                    if phase_status != "steps_done":
-                        return "phase_advance"  # let advance set status first
-                    return "phase_review_build"
-                else:
-                    # No review/build — just advance to next phase
-                    return "phase_advance"
-
-        except _json.JSONDecodeError:
-            return END
+        phase = plan.phase(state.get("current_phase_idx", 0))
+        if phase is None:
+            # All phases done — run integration validator (or END if already validated)
+            if phase_status == "validated":
+                return END
+            return "integration_validator"
+
+        if state.get("current_step_idx", 0) < len(phase.steps):
+            # More steps in current phase → advance step
+            return "phase_advance"
+        # All steps done → phase_advance marks them done, then phase_review_build runs
+        # review/build (when flagged) and moves on to the next phase
+        if phase_status != "steps_done":
+            return "phase_advance"  # let advance set status first
+        return "phase_review_build"
     
     # Determine which specialized agent(s) the tool calls target
     targets = set()
@@ -5465,19 +6601,20 @@ def route_start(state: State):
     - Complex tasks (full project, create project, full-stack) → planner first
     - Simple tasks (questions, single file edits) → orchestrator directly
     """
-    messages = state.get("messages", [])
-    if _needs_planning(messages):
+    if request_profile(state).needs_planning:
         return "planner"
     return "agent"
 
 
 # --- Nodes ---
+# Function nodes are async and wrapped by loop_lag_monitor so any event-loop
+# stall they cause is reported per node (see GET /loop-lag in server.py).
 
 # 0) Planner Node — creates structured multi-phase plan, no tools
-workflow.add_node("planner", planner_node)
+workflow.add_node("planner", loop_lag_monitor.wrap("planner", planner_node))
 
 # 1) Orchestrator (named "agent" to preserve server.py streaming key)
-workflow.add_node("agent", orchestrator_agent)
+workflow.add_node("agent", loop_lag_monitor.wrap("agent", orchestrator_agent))
 
 # --- Specialized Tool Agent Nodes ---
 workflow.add_node("workspace_action", workspace_tool_node)
@@ -5491,13 +6628,19 @@ workflow.add_node("review_action", review_tool_node)
 # Fallback: combined tool node for mixed multi-tool calls
 workflow.add_node("action", all_tool_node)
 
+# Compaction stage: every tool node passes through here before the orchestrator
+workflow.add_node("compact", loop_lag_monitor.wrap("compact", compact_history_node))
+
 # --- Phase Orchestration Nodes ---
 # Phase Advance: advances step/phase counter, loops back to agent
-workflow.add_node("phase_advance", phase_advance_node)
+workflow.add_node("phase_advance", loop_lag_monitor.wrap("phase_advance", phase_advance_node))
 # Phase Review+Build: runs batch review + build commands per phase
-workflow.add_node("phase_review_build", phase_review_build_node)
+workflow.add_node("phase_review_build", loop_lag_monitor.wrap("phase_review_build", phase_review_build_node))
 # Integration Validator: final validation after all phases complete
-workflow.add_node("integration_validator", integration_validator_node)
+workflow.add_node("integration_validator", loop_lag_monitor.wrap("integration_validator", integration_validator_node))
+# Step fast path: runs mechanical plan steps (explicit commands) without an LLM turn.
+# Node name ends in "_action" so server.py streams it like the other tool nodes.
+workflow.add_node("step_fast_path_action", loop_lag_monitor.wrap("step_fast_path", step_fast_path_node))
 
 # --- Edges ---
 # START → conditional: planner or agent
@@ -5506,15 +6649,22 @@ workflow.add_conditional_edges(START, route_start, {
     "agent": "agent",
 })
 
-# Planner → Orchestrator (plan output feeds into orchestrator as context)
-workflow.add_edge("planner", "agent")
-
-# Phase Advance → back to Orchestrator (loop to pick up next step)
-workflow.add_edge("phase_advance", "agent")
+# Planner / Phase Advance / Phase Review+Build → next step: the fast path for mechanical
+# steps, straight to review+build once a phase's steps are done, else the Orchestrator
+# (which also fixes failed builds)
+NEXT_STEP_ROUTES = {
+    "agent": "agent",
+    "step_fast_path": "step_fast_path_action",
+    "phase_review_build": "phase_review_build",
+}
+for step_source in ["planner", "phase_advance", "phase_review_build"]:
+    workflow.add_conditional_edges(step_source, route_next_step, NEXT_STEP_ROUTES)
 
-# Phase Review+Build → back to Orchestrator
-# (if build failed, agent fixes code; if passed, agent moves to next phase)
-workflow.add_edge("phase_review_build", "agent")
+# Step fast path → phase_advance on success, or through compaction to the Orchestrator on failure
+workflow.add_conditional_edges("step_fast_path_action", route_after_fast_path, {
+    "phase_advance": "phase_advance",
+    "compact": "compact",
+})
 
 # Integration Validator → back to Orchestrator (for final report generation)
 workflow.add_edge("integration_validator", "agent")
@@ -5536,11 +6686,12 @@ ALL_TOOL_ROUTES = {
 }
 workflow.add_conditional_edges("agent", route_tools_or_end, ALL_TOOL_ROUTES)
 
-# All specialized tool nodes → back to Orchestrator
+# All specialized tool nodes → Compaction → back to Orchestrator
 for agent_node in ["workspace_action", "file_action", "execution_action",
                    "template_action", "test_action", "documentation_action",
                    "review_action", "action"]:
-    workflow.add_edge(agent_node, "agent")
+    workflow.add_edge(agent_node, "compact")
+workflow.add_edge("compact", "agent")
 
 
 app = workflow.compile(
@@ -5548,11 +6699,100 @@ app = workflow.compile(
     debug=False
 )
 
-# Configure recursion limit (agent→tools→agent cycles; increase for long multi-phase tasks)
+# Configure recursion limit (agent→tools→compact→agent cycles; increase for long multi-phase tasks)
 app.config = {
-    "recursion_limit": 200
+    "recursion_limit": 300
 }
 
+# -------------------------------------------------
+# Persistent Checkpoints (SQLite, keyed by session_id)
+# -------------------------------------------------
+# The graph is compiled without a checkpointer so importing brain.py stays side-effect
+# free; server.py calls enable_checkpointing() on startup, which attaches an
+# AsyncSqliteSaver. Every /chat run then uses thread_id = session_id, so the last
+# completed node's state (messages, task_plan, phase/step indices, retry_count) survives
+# a restart or dropped connection and /chat with resume=true continues from there.
+# Needs the optional langgraph-checkpoint-sqlite package; without it runs just aren't
+# persisted.
+
+CHECKPOINT_DB_PATH = os.getenv(
+    "CHECKPOINT_DB_PATH", os.path.join(os.path.expanduser("~"), ".neuralstack", "checkpoints.sqlite3")
+)
+_checkpoint_conn = None
+
+
+async def enable_checkpointing(path: str = CHECKPOINT_DB_PATH) -> bool:
+    """Attach a SQLite checkpointer to `app` (idempotent). Returns False if unavailable."""
+    global _checkpoint_conn
+    if app.checkpointer is not None:
+        return True
+    try:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    except ImportError:
+        logger.warning("[checkpoint] langgraph-checkpoint-sqlite not installed; agent runs will not be resumable")
+        return False
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _checkpoint_conn = await aiosqlite.connect(path)
+    # State["plan"] holds task_plan.py dataclasses: allow exactly those on top of langgraph's safe types
+    serde = JsonPlusSerializer(allowed_msgpack_modules=[(t.__module__, t.__name__) for t in (*PLAN_TYPES, RequestProfile)])
+    saver = AsyncSqliteSaver(_checkpoint_conn, serde=serde)
+    await saver.setup()
+    app.checkpointer = saver
+    logger.info("[checkpoint] SQLite checkpoints enabled: %s", path)
+    return True
+
+
+async def disable_checkpointing():
+    """Detach the checkpointer and close its connection (server shutdown)."""
+    global _checkpoint_conn
+    app.checkpointer = None
+    if _checkpoint_conn is not None:
+        await _checkpoint_conn.close()
+        _checkpoint_conn = None
+
+
+def run_config(session_id: str, recursion_limit: int) -> dict:
+    """astream config for one /chat run; the session is the checkpoint thread."""
+    return {"recursion_limit": recursion_limit, "configurable": {"thread_id": session_id}}
+
+
+def fresh_run_input(messages: list, **fields) -> dict:
+    """Input for a NEW run on a session thread: drops the previous run's checkpointed messages."""
+    from langchain_core.messages import RemoveMessage
+    from langgraph.graph.message import REMOVE_ALL_MESSAGES
+    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *messages], "request_profile": None, **fields}
+
+
+async def get_resumable_run(session_id: str):
+    """Where the session's last run stopped, or None if there is nothing to resume."""
+    if app.checkpointer is None or not session_id:
+        return None
+    snapshot = await app.aget_state({"configurable": {"thread_id": session_id}})
+    # Tasks of the pending step (a task may already have its writes saved, in which case
+    # it is missing from snapshot.next but the run still has to continue past it)
+    pending = list(snapshot.next) or [t.name for t in snapshot.tasks] if snapshot else []
+    if not pending:
+        return None
+    values = snapshot.values or {}
+    request = ""
+    for msg in reversed(values.get("messages", [])):
+        if isinstance(msg, HumanMessage):
+            request = str(msg.content)
+            break
+    return {
+        "next": pending,
+        "has_plan": bool(values.get("task_plan")),
+        "current_phase_idx": values.get("current_phase_idx", 0),
+        "current_step_idx": values.get("current_step_idx", 0),
+        "phase_status": values.get("phase_status", ""),
+        "retry_count": values.get("retry_count", 0),
+        "request": request,
+        "checkpoint_at": snapshot.created_at,
+    }
+
+
 # -------------------------------------------------
 # 7. Local Test
 # -------------------------------------------------
@@ -5567,6 +6807,10 @@ if __name__ == "__main__":
             )
         ],
         "task_plan": "",
+        "plan": None,
+        "completed_steps": [],
+        "step_timings": [],
+        "step_clock": 0.0,
         "current_phase_idx": 0,
         "current_step_idx": 0,
         "phase_status": "pending",
@@ -5575,5 +6819,8 @@ if __name__ == "__main__":
         "workspace_structure": "",
     }
 
-    for output in app.stream(test_input):
-        print(output)
+    async def _run_local_test():
+        async for output in app.astream(test_input):
+            print(output)
+
+    asyncio.run(_run_local_test())
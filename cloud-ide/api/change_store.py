@@ -0,0 +1,209 @@
+"""
+Applied Change Store — per-file version chains instead of full old/new copies per change.
+
+Every manage_file write used to keep the complete old and new content in
+utils.applied_changes until the session was cleared; 15 build-fix rewrites of one file
+meant 30 full copies. Now each file has one chain of versions:
+  - version 0 (and every SNAPSHOT_EVERY-th version) is a zlib-compressed full snapshot;
+  - every other version is a compressed forward delta (line opcodes) from the previous one;
+  - a change record only points at (old version, new version) of its file.
+Compressed blobs live in an in-memory LRU bounded by CHANGE_STORE_MEMORY_BYTES; the least
+recently used ones spill to files under CHANGE_STORE_DIR and are read back on demand.
+Content for /applied-change, revert and revert-all is reconstructed when asked for.
+"""
+
+import atexit
+import difflib
+import hashlib
+import json
+import os
+import shutil
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+CHANGE_STORE_MEMORY_BYTES = int(os.getenv("CHANGE_STORE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+CHANGE_STORE_DIR = os.getenv(
+    "CHANGE_STORE_DIR", os.path.join(os.path.expanduser("~"), ".neuralstack", "change_store")
+)
+SNAPSHOT_EVERY = int(os.getenv("CHANGE_STORE_SNAPSHOT_EVERY", "16"))
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def _pack(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8", errors="surrogatepass"), 6)
+
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob).decode("utf-8", errors="surrogatepass"))
+
+
+def _line_delta(old: str, new: str) -> list:
+    """Opcodes turning old into new: n (copy n lines), -n (skip n lines), [lines] (insert)."""
+    a, b = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b).get_opcodes():
+        if tag == "equal":
+            ops.append(i2 - i1)
+        else:
+            if i2 > i1:
+                ops.append(-(i2 - i1))
+            if j2 > j1:
+                ops.append(b[j1:j2])
+    return ops
+
+
+def _apply_delta(old: str, ops: list) -> str:
+    a, out, pos = old.splitlines(keepends=True), [], 0
+    for op in ops:
+        if isinstance(op, list):
+            out.extend(op)
+        elif op >= 0:
+            out.extend(a[pos:pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(out)
+
+
+class _FileChain:
+    __slots__ = ("versions", "head_hash")
+
+    def __init__(self):
+        self.versions: List[tuple] = []  # ("snap" | "delta", blob id)
+        self.head_hash: Optional[str] = None
+
+
+class AppliedChangeStore:
+    """Version chains for every file touched this session. Safe to share between the event loop and worker threads."""
+
+    def __init__(self, memory_bytes: int = CHANGE_STORE_MEMORY_BYTES, spill_dir: str = CHANGE_STORE_DIR):
+        self.memory_bytes = memory_bytes
+        self.spill_dir = os.path.join(spill_dir, str(os.getpid()))
+        self._chains: Dict[str, _FileChain] = {}
+        self._blobs: "OrderedDict[int, bytes]" = OrderedDict()  # in-memory tier (LRU)
+        self._on_disk: set = set()
+        self._next_blob = 0
+        self._lock = threading.RLock()
+        self.bytes_in_memory = 0
+        self.raw_bytes = 0      # what full old/new copies would have cost
+        self.stored_bytes = 0   # compressed snapshots + deltas actually kept
+        self.spills = 0
+        self.disk_reads = 0
+
+    # ── Blob tiers ────────────────────────────────
+
+    def _put_blob(self, data: bytes) -> int:
+        blob_id = self._next_blob
+        self._next_blob += 1
+        self._blobs[blob_id] = data
+        self.bytes_in_memory += len(data)
+        self.stored_bytes += len(data)
+        self._spill()
+        return blob_id
+
+    def _spill(self):
+        while self.bytes_in_memory > self.memory_bytes and len(self._blobs) > 1:
+            blob_id, data = self._blobs.popitem(last=False)
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                with open(os.path.join(self.spill_dir, f"{blob_id}.z"), "wb") as f:
+                    f.write(data)
+            except OSError:
+                self._blobs[blob_id] = data  # disk unavailable: keep it in memory
+                self._blobs.move_to_end(blob_id, last=False)
+                return
+            self._on_disk.add(blob_id)
+            self.bytes_in_memory -= len(data)
+            self.spills += 1
+
+    def _get_blob(self, blob_id: int) -> bytes:
+        data = self._blobs.get(blob_id)
+        if data is not None:
+            self._blobs.move_to_end(blob_id)
+            return data
+        with open(os.path.join(self.spill_dir, f"{blob_id}.z"), "rb") as f:
+            data = f.read()
+        self.disk_reads += 1
+        return data
+
+    # ── Versions ──────────────────────────────────
+
+    def _content_at(self, chain: _FileChain, version: int) -> str:
+        start = version
+        while chain.versions[start][0] != "snap":
+            start -= 1
+        content = _unpack(self._get_blob(chain.versions[start][1]))
+        for v in range(start + 1, version + 1):
+            content = _apply_delta(content, _unpack(self._get_blob(chain.versions[v][1])))
+        return content
+
+    def _append(self, chain: _FileChain, content: str, previous: Optional[str]) -> int:
+        version = len(chain.versions)
+        if previous is None or version % SNAPSHOT_EVERY == 0:
+            chain.versions.append(("snap", self._put_blob(_pack(content))))
+        else:
+            chain.versions.append(("delta", self._put_blob(_pack(_line_delta(previous, content)))))
+        chain.head_hash = _sha(content)
+        return version
+
+    def record(self, file_path: str, old_content: str, new_content: str) -> tuple:
+        """Add old → new for `file_path`; returns (old version, new version) for the change record."""
+        with self._lock:
+            chain = self._chains.setdefault(file_path, _FileChain())
+            old_hash = _sha(old_content)
+            if chain.head_hash == old_hash:
+                old_version = len(chain.versions) - 1
+            else:
+                # First change to this file, or it was edited outside the agent since the last one
+                head = self._content_at(chain, len(chain.versions) - 1) if chain.versions else None
+                old_version = self._append(chain, old_content, head)
+            new_version = self._append(chain, new_content, old_content)
+            self.raw_bytes += len(old_content) + len(new_content)
+            return old_version, new_version
+
+    def content(self, file_path: str, version: int) -> str:
+        with self._lock:
+            return self._content_at(self._chains[file_path], version)
+
+    def put_text(self, text: str) -> int:
+        """Store an opaque compressed text (e.g. a change's diff); returns its blob id."""
+        with self._lock:
+            self.raw_bytes += len(text)
+            return self._put_blob(zlib.compress(text.encode("utf-8", errors="surrogatepass"), 6))
+
+    def get_text(self, blob_id: int) -> str:
+        with self._lock:
+            return zlib.decompress(self._get_blob(blob_id)).decode("utf-8", errors="surrogatepass")
+
+    def clear(self):
+        with self._lock:
+            self._chains.clear()
+            self._blobs.clear()
+            self._on_disk.clear()
+            self.bytes_in_memory = self.raw_bytes = self.stored_bytes = 0
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "files": len(self._chains),
+                "versions": sum(len(c.versions) for c in self._chains.values()),
+                "blobs_in_memory": len(self._blobs),
+                "blobs_on_disk": len(self._on_disk),
+                "bytes_in_memory": self.bytes_in_memory,
+                "memory_budget": self.memory_bytes,
+                "raw_bytes": self.raw_bytes,
+                "stored_bytes": self.stored_bytes,
+                "spills": self.spills,
+                "disk_reads": self.disk_reads,
+            }
+
+
+# Shared instance behind utils.store_applied_change / get_applied_change
+applied_change_store = AppliedChangeStore()
+atexit.register(lambda: shutil.rmtree(applied_change_store.spill_dir, ignore_errors=True))
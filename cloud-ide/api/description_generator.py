@@ -5,9 +5,12 @@ Reads all solution and test files, sends them to an LLM, and gets back
 a structured academic problem statement. No static extraction (regex/parsing).
 """
 
+import logging
 import os
 from typing import Dict, List, Optional
 
+from workspace_walker import get_ignore_matcher, walk_files
+
 # For LLM
 try:
     from langchain_openai import AzureChatOpenAI
@@ -16,6 +19,7 @@ try:
 except ImportError:
     _LLM_AVAILABLE = False
 
+logger = logging.getLogger("agent")
 
 SKIP_DIRS = {
     '.git', 'node_modules', 'bin', 'obj', '__pycache__', 'venv', '.venv',
@@ -31,16 +35,15 @@ MAX_TOTAL_CHARS = 120_000
 # FILE DISCOVERY & READING
 # ─────────────────────────────────────────────────────────────────────────────
 
-def _walk_code_files(root_dir: str) -> List[str]:
-    results = []
+def _walk_code_files(root_dir: str, workspace: Optional[str] = None) -> List[str]:
+    """Code files under root_dir, skipping SKIP_DIRS and whatever the workspace's ignore files exclude."""
     if not os.path.isdir(root_dir):
-        return results
-    for dirpath, dirnames, filenames in os.walk(root_dir):
-        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS]
-        for f in filenames:
-            if f.endswith(CODE_EXTS):
-                results.append(os.path.join(dirpath, f))
-    return results
+        return []
+    workspace = workspace or root_dir
+    start = os.path.relpath(root_dir, workspace)
+    if start.startswith(".."):
+        workspace, start = root_dir, "."
+    return walk_files(workspace, start=start, suffixes=CODE_EXTS, extra_names=SKIP_DIRS)
 
 
 def _read_file(path: str, max_chars: int = MAX_CHARS_PER_FILE) -> str:
@@ -65,13 +68,13 @@ def _find_solution_and_test_dirs(workspace: str):
     sol_patterns = {'src', 'dotnetapp', 'lib', 'app', 'controllers', 'services', 'models'}
     test_patterns = {'test', 'tests', 'nunit', '__tests__', 'spec'}
     sol, tst = [], []
+    matcher = get_ignore_matcher(workspace, SKIP_DIRS)
 
-    for item in os.listdir(workspace):
-        if item in SKIP_DIRS:
-            continue
-        full = os.path.join(workspace, item)
-        if not os.path.isdir(full):
-            continue
+    try:
+        top_dirs = sorted(entry.name for entry in matcher.scan(".")[0])
+    except OSError:
+        top_dirs = []
+    for item in top_dirs:
         low = item.lower()
         # Top-level dir is clearly solution-only or test-only
         if low in test_patterns or 'test' in low or 'nunit' in low or 'spec' in low:
@@ -83,7 +86,7 @@ def _find_solution_and_test_dirs(workspace: str):
             sol_subs = []
             tst_subs = []
             try:
-                for sub in os.listdir(full):
+                for sub in sorted(entry.name for entry in matcher.scan(item)[0]):
                     sl = sub.lower()
                     if sl in sol_patterns or sl in ('data', 'exceptions'):
                         sol_subs.append(os.path.join(item, sub))
@@ -628,7 +631,7 @@ def _paths_to_file_contents(workspace_path: str, paths: List[str]) -> Dict[str,
             if full.endswith(CODE_EXTS):
                 out[full] = _read_file(full)
         else:
-            for fp in _walk_code_files(full):
+            for fp in _walk_code_files(full, workspace_path):
                 out[fp] = _read_file(fp)
     return out
 
@@ -677,7 +680,7 @@ def generate_project_description(
             solution_dirs, test_dirs = _find_solution_and_test_dirs(workspace_path)
             solution_files = {}
             for d in solution_dirs:
-                for fp in _walk_code_files(os.path.join(workspace_path, d)):
+                for fp in _walk_code_files(os.path.join(workspace_path, d), workspace_path):
                     solution_files[fp] = _read_file(fp)
 
         result['solution_files'] = [os.path.relpath(p, workspace_path) for p in solution_files]
@@ -692,7 +695,7 @@ def generate_project_description(
             test_dirs = _find_solution_and_test_dirs(workspace_path)[1]
             test_files = {}
             for d in test_dirs:
-                for fp in _walk_code_files(os.path.join(workspace_path, d)):
+                for fp in _walk_code_files(os.path.join(workspace_path, d), workspace_path):
                     if fp not in solution_files:
                         test_files[fp] = _read_file(fp)
 
@@ -738,7 +741,6 @@ def generate_project_description(
 
     except Exception as e:
         result['errors'].append(str(e))
-        import traceback
-        traceback.print_exc()
+        logger.exception("Description generation failed: %s", e)
 
     return result
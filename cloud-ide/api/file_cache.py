@@ -0,0 +1,133 @@
+"""
+File Content Cache — shared, byte-bounded LRU of decoded file contents.
+
+manage_file reads/writes and the review collectors go through one cache instead of
+re-reading files from disk. Entries are validated against (st_mtime_ns, st_size, st_ino)
+on every lookup, so an edit made outside the agent (VS Code, a build step, an atomic
+rename-over) is never served stale even within the same mtime tick. The least recently
+used entries are evicted once FILE_CACHE_MAX_BYTES is exceeded.
+"""
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+FILE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("FILE_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+
+
+def _stamp(st: os.stat_result) -> tuple:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class FileContentCache:
+    """path → decoded text, LRU-evicted by total size. Safe to share between the event loop and worker threads."""
+
+    def __init__(self, max_bytes: int = FILE_CACHE_MAX_BYTES, max_entry_bytes: int = FILE_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0       # lookups whose entry no longer matched the file on disk
+        self.evictions = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # path → (stamp, content, lossy, nbytes)
+        self._lock = threading.Lock()
+
+    def _store(self, path: str, stamp: tuple, content: str, lossy: bool):
+        nbytes = sys.getsizeof(content)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.bytes -= old[3]
+            if nbytes > self.max_entry_bytes:
+                return
+            self._entries[path] = (stamp, content, lossy, nbytes)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted[3]
+                self.evictions += 1
+
+    def _lookup(self, path: str) -> Optional[tuple]:
+        """Cached (content, lossy) if the file on disk is unchanged; counts the hit/miss."""
+        try:
+            stamp = _stamp(os.stat(path))
+        except OSError:
+            stamp = None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1], entry[2]
+            if entry is not None:
+                self.stale += 1
+                self.bytes -= entry[3]
+                del self._entries[path]
+            self.misses += 1
+        return None
+
+    def get(self, path: str) -> Optional[str]:
+        """Cached content if still valid, else None (never touches the file's contents)."""
+        found = self._lookup(path)
+        return found[0] if found else None
+
+    def read(self, path: str, strict: bool = False) -> str:
+        """
+        File content as text, from cache when valid, else from disk (and cached).
+        Undecodable bytes are replaced; strict=True raises UnicodeDecodeError for such files instead.
+        Raises OSError like open() does.
+        """
+        found = self._lookup(path)
+        if found is None:
+            with open(path, "rb") as f:
+                before = _stamp(os.fstat(f.fileno()))
+                data = f.read()
+                after = _stamp(os.fstat(f.fileno()))
+            try:
+                content, lossy = data.decode("utf-8"), False
+            except UnicodeDecodeError:
+                content, lossy = data.decode("utf-8", errors="replace"), True
+            content = content.replace("\r\n", "\n").replace("\r", "\n")  # text-mode newlines, as open(path, "r")
+            if before == after:  # not written to while we were reading
+                self._store(path, after, content, lossy)
+            found = (content, lossy)
+        content, lossy = found
+        if strict and lossy:
+            raise UnicodeDecodeError("utf-8", b"", 0, 1, f"{path} is not valid UTF-8")
+        return content
+
+    def put(self, path: str, content: str):
+        """Record content just written to `path` (call after the write has been flushed/closed)."""
+        try:
+            stamp = _stamp(os.stat(path))
+        except OSError:
+            self.invalidate(path)
+            return
+        self._store(path, stamp, content, False)
+
+    def invalidate(self, path: str):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self.bytes -= entry[3]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# Shared instance used by brain.py (manage_file, review collectors) and server.py (stats)
+file_content_cache = FileContentCache()
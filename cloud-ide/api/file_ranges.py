@@ -0,0 +1,190 @@
+"""
+Ranged File Reads — line/byte windows over large files without loading them whole.
+
+manage_file(action="read") and the /read-file-content, /get-file-content endpoints use this
+so a package-lock.json, a migrations snapshot or a minified bundle can be paged through
+instead of flooding the LLM context / HTTP response:
+  - files above FILE_READ_MMAP_THRESHOLD are mmap'd, so only the touched pages are read;
+  - line windows are located through a sparse line-offset index (every LINE_INDEX_STEP lines),
+    built once per file version and reused while paging;
+  - `describe()` gives the size/line-count/outline preamble shown before the first page.
+"""
+
+import mmap
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+MMAP_THRESHOLD = int(os.getenv("FILE_READ_MMAP_THRESHOLD", str(1024 * 1024)))
+PAGE_LINES = int(os.getenv("FILE_READ_PAGE_LINES", "400"))
+PAGE_BYTES = int(os.getenv("FILE_READ_PAGE_BYTES", str(32 * 1024)))
+MAX_RANGE_BYTES = int(os.getenv("FILE_READ_MAX_RANGE_BYTES", str(256 * 1024)))
+LINE_INDEX_STEP = 1000
+OUTLINE_MAX_ENTRIES = 40
+
+# Declarations worth listing in the outline (C#, TS/JS, Python, Java); top-level JSON keys
+_OUTLINE_RE = re.compile(
+    rb"^[ \t]{0,8}(?:(?:export|default|public|private|protected|internal|static|abstract|sealed|"
+    rb"partial|async|final|override|virtual|readonly|declare)\s+)*"
+    rb"(?:class|interface|enum|struct|record|def|function|namespace|module|type)\s+[A-Za-z_$][\w$.<>]*",
+    re.MULTILINE,
+)
+_JSON_KEY_RE = re.compile(rb'^[ \t]{0,2}"([^"\n]{1,80})"\s*:', re.MULTILINE)
+
+_line_indexes: "OrderedDict[str, tuple]" = OrderedDict()  # path → (stamp, [offset of line 1, 1+STEP, ...], total lines)
+_line_indexes_lock = threading.Lock()
+
+
+def _stamp(st: os.stat_result) -> tuple:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+@contextmanager
+def _open_bytes(path: str):
+    """(buffer, stat) — an mmap for large files, plain bytes otherwise; both support find/count/slicing."""
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if st.st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm, st
+        else:
+            yield f.read(), st
+
+
+def _line_index(path: str, buf, st) -> tuple:
+    """([offset of line 1, 1 + STEP, 1 + 2*STEP, ...], total lines) for this version of the file."""
+    stamp = _stamp(st)
+    with _line_indexes_lock:
+        cached = _line_indexes.get(path)
+        if cached and cached[0] == stamp:
+            _line_indexes.move_to_end(path)
+            return cached[1], cached[2]
+    size = len(buf)
+    checkpoints, pos, line = [0], 0, 1
+    while True:
+        nl = buf.find(b"\n", pos)
+        if nl == -1 or nl + 1 >= size:
+            break
+        pos, line = nl + 1, line + 1
+        if (line - 1) % LINE_INDEX_STEP == 0:
+            checkpoints.append(pos)
+    total = line if size else 0
+    with _line_indexes_lock:
+        _line_indexes[path] = (stamp, checkpoints, total)
+        while len(_line_indexes) > 64:
+            _line_indexes.popitem(last=False)
+    return checkpoints, total
+
+
+def _line_offset(buf, checkpoints: List[int], line: int) -> int:
+    """Byte offset where 1-based `line` starts (len(buf) past the end)."""
+    idx = min((line - 1) // LINE_INDEX_STEP, len(checkpoints) - 1)
+    pos, current = checkpoints[idx], idx * LINE_INDEX_STEP + 1
+    while current < line:
+        nl = buf.find(b"\n", pos)
+        if nl == -1:
+            return len(buf)
+        pos, current = nl + 1, current + 1
+    return pos
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+
+def _char_boundary(buf, begin: int, stop: int) -> int:
+    """`stop` moved back so it doesn't split a UTF-8 sequence (continuation bytes are 0b10xxxxxx)."""
+    while begin < stop < len(buf) and (buf[stop] & 0xC0) == 0x80:
+        stop -= 1
+    return stop
+
+
+def _outline(buf, limit: int = OUTLINE_MAX_ENTRIES) -> List[str]:
+    """'L<line>: <declaration>' for the first `limit` declarations (or top-level JSON keys)."""
+    head = bytes(buf[:64]).lstrip()[:1]
+    pattern = _JSON_KEY_RE if head in (b"{", b"[") else _OUTLINE_RE
+    entries, line, last = [], 1, 0
+    for m in pattern.finditer(buf):
+        line += buf[last:m.start()].count(b"\n")  # mmap has no count(); the slice is copied once overall
+        last = m.start()
+        entries.append(f"L{line}: {_decode(m.group(0)).strip()[:120]}")
+        if len(entries) >= limit:
+            break
+    return entries
+
+
+def describe(path: str) -> Dict:
+    """Size, line count and outline of a file (the preamble for paged reads)."""
+    with _open_bytes(path) as (buf, st):
+        _, total_lines = _line_index(path, buf, st)
+        return {"size": st.st_size, "total_lines": total_lines, "outline": _outline(buf),
+                "mmap": isinstance(buf, mmap.mmap)}
+
+
+def read_lines(path: str, start_line: int = 1, end_line: Optional[int] = None,
+               max_bytes: int = MAX_RANGE_BYTES) -> Dict:
+    """
+    Lines start_line..end_line (1-based, inclusive; default one page), capped at `max_bytes`.
+    Returns text plus the window actually served and where the next page starts.
+    """
+    start_line = max(1, int(start_line or 1))
+    end_line = int(end_line) if end_line else start_line + PAGE_LINES - 1
+    end_line = max(end_line, start_line)
+    with _open_bytes(path) as (buf, st):
+        checkpoints, total = _line_index(path, buf, st)
+        begin = _line_offset(buf, checkpoints, start_line)
+        stop = _line_offset(buf, checkpoints, end_line + 1)
+        truncated = False
+        max_bytes = min(max_bytes, MAX_RANGE_BYTES)
+        if stop - begin > max_bytes:
+            # Cut at the last full line inside the budget (or mid-line for a single huge line)
+            cut = buf.rfind(b"\n", begin, begin + max_bytes)
+            stop = cut + 1 if cut != -1 else _char_boundary(buf, begin, begin + max_bytes)
+            truncated = True
+        raw = buf[begin:stop]
+        ends_mid_line = bool(raw) and not raw.endswith(b"\n") and stop < st.st_size
+        served_end = start_line + raw.count(b"\n") + (1 if raw and not raw.endswith(b"\n") else 0) - 1
+        return {
+            "content": _decode(raw),
+            "start_line": start_line,
+            "end_line": served_end,
+            "total_lines": total,
+            "size": st.st_size,
+            "offset": begin,
+            "end_offset": stop,
+            "truncated": truncated,
+            # A single line longer than the budget continues by byte offset
+            "next_line": served_end + 1 if served_end < total and not ends_mid_line else None,
+            "next_offset": stop if ends_mid_line else None,
+        }
+
+
+def read_bytes(path: str, offset: int = 0, length: Optional[int] = None) -> Dict:
+    """Bytes offset..offset+length (default one page, capped at MAX_RANGE_BYTES), decoded as UTF-8."""
+    length = min(int(length or PAGE_BYTES), MAX_RANGE_BYTES)
+    with _open_bytes(path) as (buf, st):
+        size = st.st_size
+        begin = min(max(0, int(offset or 0)), size)
+        stop = min(begin + length, size)
+        # Don't start or end inside a UTF-8 sequence (continuation bytes are 0b10xxxxxx)
+        while begin < stop and (buf[begin] & 0xC0) == 0x80:
+            begin += 1
+        stop = _char_boundary(buf, begin, stop)
+        return {
+            "content": _decode(buf[begin:stop]),
+            "offset": begin,
+            "end_offset": stop,
+            "size": size,
+            "truncated": stop < size,
+            "next_offset": stop if stop < size else None,
+        }
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
@@ -0,0 +1,123 @@
+"""
+Log Pipeline — non-blocking, leveled, structured logging for the "agent" logger.
+
+The request paths used to print() several lines per event straight to stdout; when the
+container's stdout pipe is slow every one of those calls blocks the event loop. Now:
+  - loggers only put records on a bounded in-memory queue (QueueHandler, never blocks;
+    records are dropped and counted once the queue is full);
+  - one background thread (QueueListener) formats and writes them to stdout;
+  - AGENT_LOG_LEVEL filters before anything is formatted, so logger.debug(...) with
+    %-style args costs one level check when debug is off;
+  - AGENT_LOG_FORMAT=json writes one JSON object per line, including any extra= fields;
+  - records logged with extra={"sample": key} (high-frequency events) are sampled:
+    the first and then every AGENT_LOG_SAMPLE_EVERY-th record per key get through.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import Counter
+from typing import Dict
+
+AGENT_LOG_LEVEL = os.getenv("AGENT_LOG_LEVEL", "INFO").upper()
+AGENT_LOG_FORMAT = os.getenv("AGENT_LOG_FORMAT", "text")  # "text" | "json"
+AGENT_LOG_QUEUE_SIZE = int(os.getenv("AGENT_LOG_QUEUE_SIZE", "10000"))
+AGENT_LOG_SAMPLE_EVERY = int(os.getenv("AGENT_LOG_SAMPLE_EVERY", "100"))
+
+_TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RESERVED})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _SamplingFilter(logging.Filter):
+    """Let through the 1st and every N-th record of each `sample` key; others are counted and skipped."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self.seen: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        with self._lock:
+            self.seen[key] += 1
+            n = self.seen[key]
+        if self.every > 1 and n % self.every != 1:
+            return False
+        record.sampled = f"1/{self.every}"
+        if n > 1:
+            record.msg = f"{record.msg} (sampled 1/{self.every}, {n} so far)"
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: _NonBlockingQueueHandler = None
+_listener: logging.handlers.QueueListener = None
+_sampler = _SamplingFilter(AGENT_LOG_SAMPLE_EVERY)
+_setup_lock = threading.Lock()
+
+
+def setup_logging(name: str = "agent") -> logging.Logger:
+    """Route `name` through the queue → background writer pipeline (idempotent); returns the logger."""
+    global _handler, _listener
+    logger = logging.getLogger(name)
+    with _setup_lock:
+        if _listener is None:
+            stream = logging.StreamHandler(sys.stdout)
+            stream.setFormatter(_JsonFormatter() if AGENT_LOG_FORMAT == "json" else logging.Formatter(_TEXT_FORMAT))
+            _handler = _NonBlockingQueueHandler(queue.Queue(AGENT_LOG_QUEUE_SIZE))
+            _handler.addFilter(_sampler)
+            _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+            _listener.start()
+            atexit.register(_listener.stop)  # drains what is still queued
+        if _handler not in logger.handlers:
+            for h in list(logger.handlers):
+                logger.removeHandler(h)
+            logger.addHandler(_handler)
+        logger.setLevel(getattr(logging, AGENT_LOG_LEVEL, logging.INFO))
+        logger.propagate = False
+    return logger
+
+
+def log_stats() -> Dict:
+    """Queue depth, drops and sampled-event counts (for GET /log-stats)."""
+    return {
+        "level": logging.getLevelName(logging.getLogger("agent").level),
+        "format": AGENT_LOG_FORMAT,
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "sampled_events": dict(_sampler.seen),
+        "sample_every": _sampler.every,
+    }
@@ -0,0 +1,368 @@
+"""
+Plan Templates — skeleton plans for recognized project archetypes.
+
+Most project-creation requests fall into a handful of archetypes that planner_node already
+recognizes (fullstack .NET + Angular, .NET Web API, .NET MVC, Angular) and whose setup is
+fixed by TEMPLATE_COPY_COMMANDS. For those the phases, template copy, installs, generators
+and build commands are always the same; only the domain entities (Product, Order, ...)
+change. So instead of sending the full PLANNER_SYSTEM_PROMPT to the LLM:
+  - the entities are pulled out of the request with a few patterns ("manage products and
+    orders", "Book entity", "CRUD for customers");
+  - unless those patterns account for every content word of the request (an explicit entity
+    list), a small delta-fill prompt asks the LLM for just the entity names (memoized per
+    normalized request text);
+  - the skeleton plan for (archetype, entities) is built once and served from an LRU.
+Requests outside these archetypes, or asking for things the skeletons do not cover
+(tests, or features beyond CRUD such as authentication, payments or uploads — see
+FEATURE_KEYWORDS), still go through the full planner.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from request_classifier import KeywordMatcher
+
+PLAN_TEMPLATE_CACHE = os.getenv("PLAN_TEMPLATE_CACHE", "1") != "0"
+PLAN_TEMPLATE_CACHE_SIZE = int(os.getenv("PLAN_TEMPLATE_CACHE_SIZE", "128"))
+MAX_ENTITIES = 6
+
+ARCHETYPES = ("dotnetangularfullstack", "webapi", "mvc", "angular")
+
+ENTITY_FILL_PROMPT = """List the domain entities (data models) the user's project manages.
+Return ONLY JSON: {"entities": ["Product", "Order"]}
+- Singular PascalCase names, at most 6, most important first.
+- No technical names (Controller, Service, Component, App, Api, Database, User Interface).
+- If the request names no entities, return {"entities": []}."""
+
+# Features a CRUD skeleton has no steps for: their presence sends the request to the full planner
+FEATURE_KEYWORDS = (
+    "auth", "authentication", "authorization", "authorize", "jwt", "token", "oauth", "identity",
+    "login", "logout", "log in", "sign in", "sign up", "signup", "register", "registration",
+    "password", "role-based", "rbac", "payment", "checkout", "stripe", "paypal", "cart",
+    "shipping", "email", "notification", "sms", "upload", "file upload", "image", "photo",
+    "search", "pagination", "paging", "filter", "filtering", "sorting", "dashboard", "chart",
+    "report", "export", "import", "pdf", "excel", "csv", "websocket", "signalr", "real-time",
+    "realtime", "chat", "cache", "caching", "redis", "docker", "deploy", "deployment",
+    "localization", "i18n", "dark mode", "map", "geolocation", "scheduler", "cron", "logging",
+    "validation rules", "migration", "seed",
+)
+_FEATURE_MATCHER = KeywordMatcher({"feature": FEATURE_KEYWORDS})
+
+# "manage products and orders", "CRUD for books", "track expenses", "list of employees"
+_LEAD_RE = re.compile(
+    r"\b(?:manag(?:e|es|ing)|crud(?:\s+operations)?(?:\s+(?:for|on|of))?|track(?:s|ing)?|"
+    r"list\s+of|catalog\s+of|entities?|models?\s+(?:for|of))\s+"
+    r"((?:[a-z]+)(?:(?:\s*,\s*|\s+and\s+|\s*,\s*and\s+)[a-z]+){0,5})"
+)
+# "Product entity", "Order model", "user models", "employee management"
+_TRAIL_RE = re.compile(r"\b([a-z]+)\s+(?:entity|entities|models?|management|crud|records?)\b")
+
+_NOT_ENTITIES = frozenset("""
+a an the all their its my our your some any new existing simple basic full this that these those
+app application apps system project projects api apis web webapi frontend backend fullstack stack data database
+service services component components controller controllers page pages form forms list lists ui
+dotnet net angular mvc razor core ef entity entities model models crud operations details detail
+with and or for of to in on using use interface management records record it them
+""".split()) | frozenset(kw for kw in FEATURE_KEYWORDS if " " not in kw) | frozenset("""
+logins signin signup auth authentication tracking shipment delivery payments notifications
+""".split())
+
+# Words that can surround an entity list without naming anything else the project manages:
+# a request made only of these plus the matched entities needs no delta-fill
+_FILLER = _NOT_ENTITIES | frozenset("""
+i we me us you please can could would should will need needs want wants like is are be
+create creates build builds make makes develop generate implement add write set up setup
+which where who whose so as by via at from into per each every also just only
+asp c c# typescript javascript html css bootstrap sql sqlite server ef efcore framework
+modern nice clean responsive beautiful small tiny crud operation manage track list catalog
+""".split())
+
+# "-ies" plurals of words ending in "ie" (and invariant ones): "movies" is not "Movy"
+_IES_EXCEPTIONS = {
+    "movies": "movie", "cookies": "cookie", "calories": "calorie", "zombies": "zombie",
+    "rookies": "rookie", "selfies": "selfie", "smoothies": "smoothie", "brownies": "brownie",
+    "goalies": "goalie", "pies": "pie", "ties": "tie", "lies": "lie",
+    "series": "series", "species": "species",
+}
+
+
+def _singular(word: str) -> str:
+    if word in _IES_EXCEPTIONS:
+        return _IES_EXCEPTIONS[word]
+    if word.endswith("ies") and len(word) > 4 and word[-4] not in "aeiou":
+        return word[:-3] + "y"
+    if word.endswith(("sses", "xes", "ches", "shes")) and len(word) > 4:
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+def _plural(word: str) -> str:
+    if word.endswith("y") and word[-2:-1] not in "aeiou":
+        return word[:-1] + "ies"
+    if word.endswith(("s", "x", "ch", "sh")):
+        return word + "es"
+    return word + "s"
+
+
+def _entity_name(name: str) -> Optional[str]:
+    """'products' → 'Product', 'order items' / 'OrderItems' → 'OrderItem'; None for non-entities."""
+    parts = [p.lower() for p in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])", name.strip())]
+    if not parts or parts[-1] in _NOT_ENTITIES:
+        return None
+    parts[-1] = _singular(parts[-1])
+    if parts[-1] in _NOT_ENTITIES or len("".join(parts)) < 3:
+        return None
+    return "".join(p.capitalize() for p in parts)
+
+
+def normalize_entities(names) -> Tuple[str, ...]:
+    """Deduplicated singular PascalCase names in first-seen order (the cache key part)."""
+    out = []
+    for name in names:
+        entity = _entity_name(str(name))
+        if entity and entity not in out:
+            out.append(entity)
+    return tuple(out[:MAX_ENTITIES])
+
+
+def extract_entities(text: str) -> Tuple[Tuple[str, ...], bool]:
+    """
+    (entities named in the request, complete). `complete` is True only when the patterns
+    account for every content word — anything else ("expenses per category") may name an
+    entity they missed, so the caller asks the delta-fill prompt.
+    """
+    text = text.lower()
+    words, spans = [], []
+    for m in _LEAD_RE.finditer(text):
+        words.extend(re.split(r"\s*,\s*(?:and\s+)?|\s+and\s+", m.group(1)))
+        spans.append(m.span())
+    for m in _TRAIL_RE.finditer(text):
+        words.append(m.group(1))
+        spans.append(m.span())
+    entities = normalize_entities(words)
+    rest = list(text)
+    for start, end in spans:
+        rest[start:end] = " " * (end - start)
+    leftover = [w for w in re.findall(r"[a-z#+]+", "".join(rest)) if w not in _FILLER]
+    return entities, bool(entities) and len(words) <= MAX_ENTITIES and not leftover
+
+
+def extra_features(text: str) -> Tuple[str, ...]:
+    """Feature keywords in the request that the skeletons don't plan for (sorted)."""
+    return tuple(sorted(_FEATURE_MATCHER.matches(text.lower())))
+
+
+def parse_entity_fill(raw: str) -> Tuple[str, ...]:
+    """Entities from the delta-fill LLM reply ({"entities": [...]}, possibly in a ``` block)."""
+    match = re.search(r"\{.*\}", raw or "", re.DOTALL)
+    if not match:
+        return ()
+    try:
+        names = json.loads(match.group(0)).get("entities") or []
+    except (json.JSONDecodeError, AttributeError):
+        return ()
+    if not isinstance(names, list):
+        return ()
+    return normalize_entities(str(n) for n in names)
+
+
+def _kebab(entity: str) -> str:
+    return re.sub(r"(?<!^)(?=[A-Z])", "-", entity).lower()
+
+
+def _phase(name, description, review, build, build_commands, steps, working_directory="."):
+    return {
+        "name": name,
+        "description": description,
+        "review": review,
+        "build": build,
+        "build_commands": build_commands,
+        "working_directory": working_directory,
+        "steps": [dict(step, step=i + 1) for i, step in enumerate(steps)],
+    }
+
+
+def _backend_steps(root: str, entities, views: bool, cors: bool):
+    steps = []
+    for e in entities:
+        steps.append({"action": f"Implement {e} model",
+                      "details": f"Create {root}/Models/{e}.cs with an Id and the {e} properties the user described",
+                      "type": "code"})
+    for e in entities:
+        es = _plural(e)
+        steps.append({"action": f"Implement {es} controller",
+                      "details": (f"Create {root}/Controllers/{es}Controller.cs with list/create/edit/delete "
+                                  f"actions and Razor views under {root}/Views/{es}/") if views else
+                                 (f"Create {root}/Controllers/{es}Controller.cs with GET/GET by id/POST/PUT/DELETE "
+                                  f"under /api/{es.lower()}"),
+                      "type": "code"})
+    if not entities:
+        steps.append({"action": "Implement backend", "type": "code",
+                      "details": f"Models and controllers in {root}/ for what the user asked"})
+    if cors:
+        steps.append({"action": "Configure Program.cs",
+                      "details": "Register services and allow CORS from the Angular app (do NOT change ports)",
+                      "type": "code"})
+    return steps
+
+
+def _angular_setup_steps(app_dir: str, entities, copy_step: int, install: int):
+    """npm install (step number `install`, after the template copy) plus generators that wait for it."""
+    steps = [{"action": "Install Angular deps", "command": f"cd {app_dir} && npm install",
+              "type": "execute", "depends_on": [copy_step]}]
+    for e in entities:
+        k = _kebab(e)
+        steps.append({"action": f"Generate {e} service and components",
+                      "command": (f"cd {app_dir} && npx ng g s services/{k} && npx ng g c components/{k}-list "
+                                  f"&& npx ng g c components/{k}-form"),
+                      "type": "generate", "depends_on": [install]})
+    return steps
+
+
+def _frontend_steps(app_dir: str, entities, api_base: str):
+    steps = []
+    for e in entities:
+        k = _kebab(e)
+        steps.append({"action": f"Implement {e}Service",
+                      "details": f"{app_dir}/src/app/services/{k}.service.ts: HttpClient CRUD calls to {api_base}/{_plural(e).lower()}",
+                      "type": "code"})
+        steps.append({"action": f"Implement {k}-list and {k}-form components",
+                      "details": f"List in a styled card/table layout; form with validation that calls {e}Service",
+                      "type": "code"})
+    if not entities:
+        steps.append({"action": "Implement services and components", "type": "code",
+                      "details": "What the user asked for, under src/app/services and src/app/components"})
+    steps.append({"action": "Setup routing and modules",
+                  "details": "Import HttpClientModule, FormsModule, add routes, update app.component.html with navigation",
+                  "type": "code"})
+    steps.append({"action": "Add attractive CSS", "details": "Global styles.css plus component styles", "type": "code"})
+    return steps
+
+
+def skeleton_plan(archetype: str, entities: Tuple[str, ...], template_cmd: str) -> Dict:
+    """The planner-format plan (same JSON shape as PLANNER_SYSTEM_PROMPT's) for an archetype."""
+    if archetype == "dotnetangularfullstack":
+        backend, frontend = "dotnetangularfullstack/dotnetapp", "dotnetangularfullstack/angularapp"
+        backend_build, frontend_build = f"cd {backend} && dotnet build", f"cd {frontend} && npx ng build"
+        setup = [{"action": "Copy template", "command": template_cmd, "type": "execute"},
+                 {"action": "Restore .NET packages", "command": f"cd {backend} && dotnet restore",
+                  "type": "execute", "depends_on": [1]}]
+        setup += _angular_setup_steps(frontend, entities, copy_step=1, install=3)
+        phases = [
+            _phase("template_setup", "Copy template, install deps and generate scaffolding", False, False, [], setup),
+            _phase("backend_implementation", "Models and API controllers", True, True, [backend_build],
+                   _backend_steps(backend, entities, views=False, cors=True), backend),
+            _phase("frontend_implementation", "Services, components, routing and CSS", True, True, [frontend_build],
+                   _frontend_steps(frontend, entities, "http://localhost:8080/api"), frontend),
+            _phase("integration_validation", "Final build verification", False, True,
+                   [backend_build, frontend_build], []),
+        ]
+        project_type, stack, framework = "full-stack", "mixed", "webapi"
+    elif archetype in ("webapi", "mvc"):
+        build = "cd dotnetapp && dotnet build"
+        phases = [
+            _phase("template_setup", "Copy template", False, False, [],
+                   [{"action": "Copy template", "command": template_cmd, "type": "execute"}]),
+            _phase("backend_implementation", "Models and controllers" + (" with Razor views" if archetype == "mvc" else ""),
+                   True, True, [build], _backend_steps("dotnetapp", entities, views=archetype == "mvc", cors=False),
+                   "dotnetapp"),
+            _phase("integration_validation", "Final build verification", False, True, [build], []),
+        ]
+        project_type, stack, framework = "backend", "dotnet", archetype
+    elif archetype == "angular":
+        app_dir = "angularscaffolding/angularapp"  # package.json, angular.json and src/ live here
+        build = f"cd {app_dir} && npx ng build"
+        setup = [{"action": "Copy template", "command": template_cmd, "type": "execute"}]
+        setup += _angular_setup_steps(app_dir, entities, copy_step=1, install=2)
+        phases = [
+            _phase("template_setup", "Copy template, install deps and generate scaffolding", False, False, [], setup),
+            _phase("frontend_implementation", "Services, components, routing and CSS", True, True, [build],
+                   _frontend_steps(app_dir, entities, "http://localhost:8080/api"), app_dir),
+            _phase("integration_validation", "Final build verification", False, True, [build], []),
+        ]
+        project_type, stack, framework = "frontend", "angular", None
+    else:
+        raise ValueError(f"no skeleton for archetype {archetype!r}")
+    return {
+        "project_type": project_type,
+        "stack": stack,
+        "dotnet_framework": framework,
+        "execution_mode": "MULTI_PHASE",
+        "plan_source": "template",
+        "phases": phases,
+        "final_report": True,
+    }
+
+
+def _normalize_request(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+class PlanTemplateCache:
+    """(archetype, entities) → plan JSON, LRU-bounded; plus request text → delta-filled entities."""
+
+    def __init__(self, max_entries: int = PLAN_TEMPLATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._plans: "OrderedDict[tuple, str]" = OrderedDict()
+        self._filled: "OrderedDict[str, Tuple[str, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.delta_fills = 0
+        self.full_planner = 0
+
+    def _remember(self, table: OrderedDict, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def filled_entities(self, request: str) -> Optional[Tuple[str, ...]]:
+        """Entities an earlier delta-fill returned for the same request text."""
+        with self._lock:
+            return self._filled.get(_normalize_request(request))
+
+    def remember_filled(self, request: str, entities: Tuple[str, ...]):
+        with self._lock:
+            self.delta_fills += 1
+            self._remember(self._filled, _normalize_request(request), entities)
+
+    def plan_json(self, archetype: str, entities: Tuple[str, ...], template_cmd: str) -> str:
+        key = (archetype, entities, template_cmd)
+        with self._lock:
+            cached = self._plans.get(key)
+            if cached is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        plan = json.dumps(skeleton_plan(archetype, entities, template_cmd), indent=2)
+        with self._lock:
+            self._remember(self._plans, key, plan)
+        return plan
+
+    def note_full_planner(self):
+        with self._lock:
+            self.full_planner += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": PLAN_TEMPLATE_CACHE,
+                "plans": len(self._plans),
+                "filled_requests": len(self._filled),
+                "hits": self.hits,
+                "misses": self.misses,
+                "delta_fills": self.delta_fills,
+                "full_planner": self.full_planner,
+            }
+
+
+# Shared instance used by brain.planner_node (stats served by server.py)
+plan_template_cache = PlanTemplateCache()
@@ -0,0 +1,75 @@
+"""
+Request Classifier — one precompiled keyword pass over the user's request.
+
+detect_stack, detect_dotnet_framework, _is_fullstack_dotnet_angular and _needs_planning
+used to run dozens of `kw in text` substring tests each, on every orchestrator turn, and
+short keywords misfired ("ng" in "using", "java" in "javascript", "api" in "rapid").
+KeywordMatcher compiles every keyword table into a single regex with word-boundary
+semantics and counts the distinct keywords per label in one scan. brain.classify_request
+turns the counts into a RequestProfile, which is kept in State["request_profile"] for the
+rest of the run, so later turns don't look at the message history at all.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterable, Mapping
+
+
+def _keyword_pattern(keyword: str) -> str:
+    """`keyword` as a whole word: no letter/digit right before or after it (an 's' plural is allowed)."""
+    pattern = re.escape(keyword)
+    if keyword[:1].isalnum():
+        pattern = r"(?<![a-z0-9])" + pattern
+    if keyword[-1:].isalnum():
+        pattern += (r"s?" if keyword[-1].isalpha() else "") + r"(?![a-z0-9])"
+    return pattern
+
+
+class KeywordMatcher:
+    """label → keywords, matched in lowercase text as whole words with a single compiled regex."""
+
+    def __init__(self, table: Mapping[Hashable, Iterable[str]]):
+        self.labels: Dict[str, list] = {}  # keyword → labels listing it
+        for label, keywords in table.items():
+            for kw in keywords:
+                self.labels.setdefault(kw.lower(), []).append(label)
+        self.label_order = list(table)
+        keywords = sorted(self.labels, key=len, reverse=True)  # longest alternative wins at a position
+        # Lookahead: every position is tried, so keywords overlapping a longer match are found too
+        self._regex = re.compile("(?=(" + "|".join(_keyword_pattern(kw) for kw in keywords) + "))")
+        # A shorter keyword starting at the same position as a longer one ("ng" in "ng serve")
+        # is shadowed by the longer alternative; record what each keyword implies instead.
+        self._implied = {
+            kw: {other for other in keywords if other != kw and re.match(_keyword_pattern(other), kw)}
+            for kw in keywords
+        }
+
+    def matches(self, text: str) -> set:
+        """Distinct keywords present in `text` (expected lowercase)."""
+        found = set()
+        for m in self._regex.finditer(text):
+            kw = m.group(1)
+            if kw not in self.labels:
+                kw = kw[:-1]  # plural 's'
+            if kw not in found:
+                found.add(kw)
+                found |= self._implied[kw]
+        return found
+
+    def scores(self, text: str) -> Dict[Hashable, int]:
+        """label → number of its distinct keywords in `text` (labels without a match left out)."""
+        scores: Dict[Hashable, int] = {}
+        for kw in self.matches(text):
+            for label in self.labels[kw]:
+                scores[label] = scores.get(label, 0) + 1
+        return {label: scores[label] for label in self.label_order if label in scores}
+
+
+@dataclass(frozen=True, slots=True)
+class RequestProfile:
+    """What the latest user request is about (brain.classify_request)."""
+    stack: str = "generic"
+    dotnet_framework: str = "webapi"
+    fullstack_dotnet_angular: bool = False
+    needs_planning: bool = False
+    mentions_tests: bool = False
@@ -0,0 +1,93 @@
+"""
+Review Verdict Cache — content-addressed, persisted across server restarts.
+
+Stores the full JSON verdict the review LLM returned for a file (status, issues,
+patch_required, unified_diff), keyed by (content hash, review mode, layer, rules hash).
+Templates produce many byte-identical files (Program.cs, ApplicationDbContext.cs, ...)
+across sessions and workspaces, so once a file's content has been judged under the
+same prompt, later reviews reuse the verdict instead of calling the LLM again.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "REVIEW_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".neuralstack", "review_cache.sqlite3"),
+)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ReviewVerdictCache:
+    """SQLite-backed verdict store. Safe to share between the event loop and worker threads."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS verdicts ("
+                " key TEXT PRIMARY KEY, verdict TEXT NOT NULL,"
+                " created_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(content: str, mode: str, layer: str, rules: str) -> str:
+        """Key = hash of (content hash, mode, layer, hash of the exact review prompt/rules)."""
+        return _sha256(f"{_sha256(content)}|{mode}|{layer}|{_sha256(rules)}")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the stored verdict (without a path) or None."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE verdicts SET hits = hits + 1 WHERE key = ?", (key,))
+                    conn.commit()
+        except sqlite3.Error:
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, verdict: Dict):
+        """Persist a verdict. The file path is dropped — it is re-attached on lookup."""
+        stored = {k: v for k, v in verdict.items() if k != "path"}
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO verdicts (key, verdict, created_at, hits) VALUES (?, ?, ?, 0)",
+                    (key, json.dumps(stored), time.time()),
+                )
+                conn.commit()
+        except sqlite3.Error:
+            pass  # cache is best-effort; a failed write just means a future re-review
+
+    def stats(self) -> Dict:
+        return {"hits": self.hits, "misses": self.misses, "path": self.path}
+
+
+# Shared instance used by brain.py review paths
+review_verdict_cache = ReviewVerdictCache()
@@ -4,7 +4,14 @@ import asyncio
 import json
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
-from brain import app as agent_app  # Import your LangGraph app
+from brain import app as agent_app, compaction_history  # Import your LangGraph app
+from workspace_index import get_workspace_index
+from file_cache import file_content_cache
+from change_store import applied_change_store
+from plan_templates import plan_template_cache
+from log_pipeline import setup_logging, log_stats
+import file_ranges
+from brain import enable_checkpointing, disable_checkpointing, run_config, fresh_run_input, get_resumable_run
 from langchain_core.messages import HumanMessage, AIMessage
 from typing import Dict, List, Optional
 from uuid import uuid4
@@ -16,33 +23,30 @@ from utils import (
     start_progress_session, end_progress_session, add_progress_task, update_progress_task,
     # New applied changes system
     applied_changes, session_changes, process_applied_change_queue, 
-    clear_session_changes, update_change_status, get_all_session_changes, get_applied_change
+    clear_session_changes, update_change_status, get_all_session_changes, get_applied_change,
+    loop_lag_monitor, begin_session, current_session, drop_session, register_client, unregister_client, send_to_client, ws_stats,
+    broadcast_session_changes_update, handle_client_message
 )
 import os
 import signal
 import time
-import logging
 from datetime import datetime
 import re
 
-# Debug logging for agent steps (set level to logging.DEBUG for verbose)
-logger = logging.getLogger("agent")
-if not logger.handlers:
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s"))
-    logger.addHandler(handler)
-logger.setLevel(logging.INFO)
+# Debug logging for agent steps (AGENT_LOG_LEVEL=DEBUG for verbose)
+# Records go through log_pipeline's queue + background writer (AGENT_LOG_LEVEL / AGENT_LOG_FORMAT)
+logger = setup_logging("agent")
 
 # Session tracking for markdown generation
 session_activities = {}  # session_id -> {files_changed: [], commands_run: [], request: str, response: str}
-current_session_id = None  # Track current active session
+current_session_id = None  # Most recently started session (fallback for /stop-agent without a session_id)
 
 # Agent run cancellation: when True for a session_id, the agent stream loop will stop
 agent_cancel_flags: Dict[str, bool] = {}
 
 def get_current_session_id():
-    """Get the current active session ID"""
-    return current_session_id
+    """Get the session ID of the agent run in the current context (falls back to the latest run)"""
+    return current_session().session_id or current_session_id
 
 def sanitize_filename(text: str) -> str:
     """Convert text to a safe filename"""
@@ -133,11 +137,11 @@ def create_request_summary_markdown(session_id: str, request_text: str, response
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(md_content)
         
-        print(f"📄 Created summary: {filepath}")
+        logger.info("📄 Created summary: %s", filepath)
         return filepath
     
     except Exception as e:
-        print(f"❌ Error creating summary markdown: {e}")
+        logger.exception("❌ Error creating summary markdown: %s", e)
         return None
 
 def track_file_change(session_id: str, file_path: str, action: str = "modified"):
@@ -164,7 +168,7 @@ def track_command(session_id: str, command: str, exit_code: int = None):
 
 # Debug: Log when pending_changes is accessed
 def debug_pending_changes():
-    print(f"📊 Current pending changes: {list(pending_changes.keys())}")
+    logger.debug("📊 Current pending changes: %s", list(pending_changes.keys()))
     return pending_changes
 
 app = FastAPI()
@@ -177,6 +181,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_loop_lag_monitor():
+    """Sample event-loop lag for the lifetime of the server (reported per graph node)."""
+    loop_lag_monitor.start()
+
+@app.on_event("startup")
+async def start_checkpointing():
+    """Persist agent runs to SQLite so they can be resumed after a restart."""
+    await enable_checkpointing()
+
+@app.on_event("shutdown")
+async def stop_checkpointing():
+    await disable_checkpointing()
+
+@app.get("/prompt-usage")
+async def get_prompt_usage(limit: int = 20):
+    """Per-turn orchestrator prompt size: estimated tokens per segment plus provider-reported usage"""
+    from brain import prompt_usage_history
+    return {"ok": True, "turns": list(prompt_usage_history)[-limit:]}
+
+@app.get("/plan-timings")
+async def get_plan_timings(limit: int = 10):
+    """Critical-path reports of recent plan runs: wall-clock vs serial step time and the bounding chain of steps"""
+    from brain import plan_timing_reports
+    return {"ok": True, "runs": list(plan_timing_reports)[-limit:]}
+
+@app.get("/compaction-stats")
+async def get_compaction_stats(limit: int = 20):
+    """Per-run conversation compaction: tool results rewritten and bytes saved"""
+    return {"ok": True, "runs": list(compaction_history)[-limit:]}
+
+@app.get("/ws-stats")
+async def get_ws_stats():
+    """Outbound WebSocket queues: frames waiting/sent and log lines dropped per client"""
+    return {"ok": True, **ws_stats()}
+
+@app.get("/file-cache-stats")
+async def get_file_cache_stats():
+    """Shared file content cache: entries, bytes used vs budget, hit/miss/stale/eviction counts"""
+    return {"ok": True, **file_content_cache.stats()}
+
+@app.get("/log-stats")
+async def get_log_stats():
+    """Logging pipeline: level, queue depth, dropped records and sampled event counts"""
+    return {"ok": True, **log_stats()}
+
+@app.get("/change-store-stats")
+async def get_change_store_stats():
+    """Applied-change history: versions kept, compressed vs raw bytes, memory/disk tiers"""
+    return {"ok": True, **applied_change_store.stats()}
+
+@app.get("/plan-template-stats")
+async def get_plan_template_stats():
+    """Planner shortcuts: skeleton plans served from cache, entity delta-fills, full planner runs"""
+    return {"ok": True, **plan_template_cache.stats()}
+
+@app.get("/loop-lag")
+async def get_loop_lag():
+    """How long each graph node has blocked the event loop (total/max ms, stall count)"""
+    return {"ok": True, "nodes": loop_lag_monitor.snapshot()}
+
 # Chat history storage (session_id -> session data)
 chat_sessions: Dict[str, dict] = {}
 
@@ -201,6 +266,7 @@ class ChatRequest(BaseModel):
     session_id: str = None  # Optional session ID for maintaining history
     workspace_path: str = None  # VS Code workspace folder path (or scope folder when scope_path set)
     scope_path: str = None  # When set, use this folder as workspace for this request (read/list/run in this folder)
+    resume: bool = False  # Continue this session's interrupted run from its last checkpoint instead of starting a new one
 
 # @app.post("/chat")
 # async def chat(request: ChatRequest):
@@ -227,8 +293,10 @@ async def chat(request: ChatRequest):
     # Get or create session
     session_id, session = get_or_create_session(request.session_id)
     
-    # Set current session ID for tracking
+    # Set current session ID for tracking; bind this request's session context so the
+    # agent run (and every task it spawns) uses its own workspace/review state
     current_session_id = session_id
+    begin_session(session_id)
     logger.info("[STEP 2] Session ready: session_id=%s", session_id)
     
     # Scaffolding: use workspace root so agent can read templates; target folder is scope_path
@@ -257,39 +325,67 @@ async def chat(request: ChatRequest):
             else:
                 await broadcast_log(f"📁 Working in: {request.workspace_path}")
 
+    # Resume path: continue the session's last run from its checkpoint (no re-planning)
+    resumable = None
+    if request.resume:
+        resumable = await get_resumable_run(session_id)
+        if not resumable:
+            await broadcast_log("⏯️ Nothing to resume for this session — send the request again to start a new run.")
+            return {"response": "Nothing to resume: the last run for this session finished or was never checkpointed.",
+                    "session_id": session_id, "session_title": session["title"], "summary_file": None}
+        if not session["messages"] and resumable["request"]:
+            # Session history is in memory only; after a restart seed it from the checkpoint
+            session["messages"].append(HumanMessage(content=resumable["request"]))
+            session["title"] = resumable["request"][:50] + ("..." if len(resumable["request"]) > 50 else "")
+        phase_info = (f" (phase {resumable['current_phase_idx'] + 1}, step {resumable['current_step_idx'] + 1})"
+                      if resumable["has_plan"] else "")
+        await broadcast_log(f"⏯️ Resuming run at {', '.join(resumable['next'])}{phase_info}")
+
     # Start progress tracking session
     await start_progress_session()
 
     # Add initial task
     analyze_task = await add_progress_task("Analyzing request", "Understanding what you need...")
 
-    # Add user message to history
-    session["messages"].append(HumanMessage(content=message_to_store))
-    session["updated_at"] = datetime.now().isoformat()
-    
-    # Update title based on first message
-    if len(session["messages"]) == 1:
-        # Use first 50 chars of message as title
-        session["title"] = request.message[:50] + ("..." if len(request.message) > 50 else "")
+    if not resumable:
+        # Add user message to history
+        session["messages"].append(HumanMessage(content=message_to_store))
+        session["updated_at"] = datetime.now().isoformat()
+        
+        # Update title based on first message
+        if len(session["messages"]) == 1:
+            # Use first 50 chars of message as title
+            session["title"] = request.message[:50] + ("..." if len(request.message) > 50 else "")
     
     await update_progress_task(analyze_task, "completed", "Request analyzed")
     
     # Set current request message so tools (e.g. execute_terminal) can block template copy when user asked to write test cases
-    set_current_request_message(request.message)
-    logger.info("[STEP 4] Request context set: message_preview=%s", (request.message or "")[:60])
-
-    # Create inputs with full conversation history and recursion limit
-    inputs = {
-        "messages": session["messages"].copy(),
-        "task_plan": "",
-        "current_phase_idx": 0,
-        "current_step_idx": 0,
-        "phase_status": "pending",
-        "phase_files": "[]",
-        "retry_count": 0,
-        "workspace_structure": "",
-    }
-    config = {"recursion_limit": 150}  # Allow longer agent→tool→agent chains before stopping
+    request_text = resumable["request"] if resumable else request.message
+    set_current_request_message(request_text)
+    logger.info("[STEP 4] Request context set: message_preview=%s", (request_text or "")[:60])
+
+    # Create inputs with full conversation history and recursion limit.
+    # The session is the checkpoint thread: a new run replaces the previous run's state,
+    # a resumed run passes no input so the graph continues from the last checkpoint.
+    if resumable:
+        inputs = None
+    else:
+        inputs = fresh_run_input(
+            session["messages"].copy(),
+            task_plan="",
+            plan=None,
+            completed_steps=[],
+            step_timings=[],
+            step_clock=0.0,
+            current_phase_idx=0,
+            current_step_idx=0,
+            phase_status="pending",
+            phase_files="[]",
+            retry_count=0,
+            workspace_structure="",
+            compaction_stats={},
+        )
+    config = run_config(session_id, recursion_limit=225)  # Allow longer agent→tool→compact→agent chains before stopping
     final_response = ""
     agent_stopped_by_user = False
 
@@ -299,6 +395,7 @@ async def chat(request: ChatRequest):
     # Track current task for updates
     current_task_id = await add_progress_task("Processing", "Agent is thinking...")
     tool_count = 0
+    compaction_stats = {}
 
     STREAM_CHUNK_TIMEOUT = 45  # If no chunk for this many seconds, broadcast "still thinking"
     agent_stream_queue = asyncio.Queue()
@@ -315,9 +412,8 @@ async def chat(request: ChatRequest):
             await agent_stream_queue.put(("done", None))
 
     async def run_agent():
-        nonlocal final_response, agent_stopped_by_user, current_task_id, tool_count
+        nonlocal final_response, agent_stopped_by_user, current_task_id, tool_count, compaction_stats
         producer = asyncio.create_task(_stream_producer())
-        print(f"🔥 Producer: {producer}")
         try:
             while True:
                 try:
@@ -431,6 +527,10 @@ async def chat(request: ChatRequest):
                                 await update_progress_task(current_task_id, "completed", "Phase complete")
                                 current_task_id = await add_progress_task("Next phase", "Starting next phase...")
 
+                    # Conversation compaction (running totals for this run)
+                    if key == "compact" and value:
+                        compaction_stats = value.get("compaction_stats") or compaction_stats
+
                     if key == "integration_validator":
                         msgs = value.get("messages", [])
                         if msgs and hasattr(msgs[-1], 'content'):
@@ -451,6 +551,12 @@ async def chat(request: ChatRequest):
         # Clear cancel flag so next run is not immediately cancelled
         agent_cancel_flags.pop(session_id, None)
 
+        if compaction_stats.get("bytes_saved"):
+            compaction_history.append({"session_id": session_id, "finished_at": datetime.now().isoformat(),
+                                       **compaction_stats})
+            await broadcast_log(f"🗜️ Compacted {compaction_stats['tool_results_compacted']} tool results, "
+                                f"saved {compaction_stats['bytes_saved'] / 1024:.1f} KB of context")
+
         # Mark final task as complete (unless already updated by stop)
         if not agent_stopped_by_user:
             await update_progress_task(current_task_id, "completed", "Done")
@@ -466,7 +572,7 @@ async def chat(request: ChatRequest):
         # Create markdown summary of this request
         summary_path = create_request_summary_markdown(
             session_id=session_id,
-            request_text=request.message,
+            request_text=request_text,
             response_text=final_response,
             workspace_path=request.workspace_path
         )
@@ -565,36 +671,32 @@ async def test_file_change():
 @app.websocket("/ws/logs")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    connected_clients.add(websocket)
-    print(f"✅ WebSocket client connected. Total clients: {len(connected_clients)}")
+    register_client(websocket)
+    logger.info("✅ WebSocket client connected. Total clients: %d", len(connected_clients))
     
     try:
         # Keep connection alive and allow client to send ping/pong
         while True:
             try:
-                # Wait for any message from client (ping) or timeout
-                await asyncio.wait_for(websocket.receive_text(), timeout=60)
+                # Wait for any message from client (ping / protocol hello) or timeout
+                text = await asyncio.wait_for(websocket.receive_text(), timeout=60)
+                await handle_client_message(websocket, text)
             except asyncio.TimeoutError:
                 # Send a ping to keep connection alive
-                try:
-                    await websocket.send_json({"type": "ping"})
-                except Exception:
-                    break
+                if websocket not in connected_clients:
+                    break  # writer task dropped this client (send failed / too slow)
+                await send_to_client(websocket, {"type": "ping"})
     except WebSocketDisconnect:
-        print("❌ WebSocket client disconnected")
+        logger.info("❌ WebSocket client disconnected")
     except Exception as e:
-        print(f"⚠️ WebSocket error: {e}")
+        logger.warning("⚠️ WebSocket error: %s", e)
     finally:
-        connected_clients.discard(websocket)
-        print(f"📊 Remaining clients: {len(connected_clients)}")
+        unregister_client(websocket)
+        logger.info("📊 Remaining clients: %d", len(connected_clients))
 
 @app.post("/emit-test-log")
 async def emit_test_log():
-    for ws in connected_clients:
-        await ws.send_json({
-            "type": "log",
-            "content": "🔥 Test log from FastAPI"
-        })
+    await broadcast_log("🔥 Test log from FastAPI")
     return {"ok": True}
 
 @app.post("/clear-history")
@@ -652,25 +754,28 @@ async def get_session(session_id: str):
         }
     }
 
+@app.get("/session/{session_id}/resumable")
+async def get_session_resumable(session_id: str):
+    """Whether the session's last agent run stopped early and can be resumed with /chat resume=true"""
+    run = await get_resumable_run(session_id)
+    return {"ok": True, "resumable": bool(run), "run": run}
+
 @app.delete("/session/{session_id}")
 async def delete_session(session_id: str):
     """Delete a chat session"""
     if session_id in chat_sessions:
         del chat_sessions[session_id]
+        drop_session(session_id)
         return {"ok": True, "message": f"Session {session_id} deleted"}
     return {"ok": False, "error": "Session not found"}
 
 @app.get("/get-pending-change/{change_id}")
 async def get_pending_change(change_id: str):
     """Get details of a pending file change"""
-    print(f"🔍 Looking for pending change: {change_id}")
-    print(f"📊 Available changes: {list(pending_changes.keys())}")
-    
     if change_id not in pending_changes:
-        print(f"❌ Change {change_id} not found in pending_changes")
+        logger.debug("❌ Change %s not found in pending_changes (available: %s)", change_id, list(pending_changes.keys()))
         return {"ok": False, "error": f"Change not found. Available: {list(pending_changes.keys())}"}
     
-    print(f"✅ Found change {change_id}")
     return {
         "ok": True,
         "change": pending_changes[change_id]
@@ -817,7 +922,7 @@ async def revert_file_change(request: RevertChangeRequest):
 async def accept_file_change(request: RevertChangeRequest):
     """Accept an applied change (just marks it as accepted, file already changed)"""
     change_id = request.change_id
-    change = get_applied_change(change_id)
+    change = get_applied_change(change_id, with_content=False)
     
     if not change:
         return {"ok": False, "message": "Change not found"}
@@ -898,23 +1003,14 @@ async def clear_all_session_changes():
     await broadcast_session_changes_update()
     return {"ok": True, "message": "Session changes cleared"}
 
-async def broadcast_session_changes_update():
-    """Broadcast updated session changes to all clients"""
-    changes = get_all_session_changes()
-    
-    for ws in connected_clients:
-        try:
-            await ws.send_json({
-                "type": "session_changes_update",
-                "changes": changes
-            })
-        except Exception:
-            pass
-
 @app.get("/get-file-content")
-async def get_file_content(path: str):
-    """Get current content of a file"""
+async def get_file_content(path: str, start_line: int = None, end_line: int = None,
+                           offset: int = None, length: int = None):
+    """Get current content of a file (or one line/byte window of it when a range is given)"""
     try:
+        if os.path.exists(path) and any(v is not None for v in (start_line, end_line, offset, length)):
+            window = await asyncio.to_thread(_read_window, path, start_line, end_line, offset, length)
+            return {"ok": True, **window}
         if os.path.exists(path):
             with open(path, 'r') as f:
                 content = f.read()
@@ -1026,9 +1122,8 @@ class FileListRequest(BaseModel):
 
 @app.post("/list-workspace-files")
 async def list_workspace_files(request: FileListRequest = None):
-    """List files in the workspace for @ mention picker"""
+    """List files in the workspace for @ mention picker (ranked matches from the workspace index)"""
     from utils import get_workspace_path, set_workspace_path
-    import fnmatch
     
     # Use workspace from request if provided, otherwise try stored one
     workspace = None
@@ -1041,55 +1136,15 @@ async def list_workspace_files(request: FileListRequest = None):
     if not workspace:
         return {"ok": False, "message": "No workspace path set"}
     
-    search_filter = request.search.lower() if request and request.search else None
-    
-    files = []
-    ignore_patterns = [
-        '*.pyc', '__pycache__', '.git', 'node_modules', '.vscode',
-        'venv', '.env', '*.egg-info', '.DS_Store', '*.log',
-        'dist', 'build', '.next', '.cache', 'coverage'
-    ]
+    search_filter = request.search if request and request.search else None
     
     try:
-        for root, dirs, filenames in os.walk(workspace):
-            # Filter out ignored directories
-            dirs[:] = [d for d in dirs if not any(
-                fnmatch.fnmatch(d, pattern) for pattern in ignore_patterns
-            )]
-            
-            for filename in filenames:
-                # Skip ignored files
-                if any(fnmatch.fnmatch(filename, pattern) for pattern in ignore_patterns):
-                    continue
-                
-                full_path = os.path.join(root, filename)
-                rel_path = os.path.relpath(full_path, workspace)
-                
-                # Apply search filter
-                if search_filter and search_filter not in rel_path.lower():
-                    continue
-                
-                # Get file info
-                try:
-                    stat = os.stat(full_path)
-                    files.append({
-                        "path": rel_path,
-                        "full_path": full_path,
-                        "name": filename,
-                        "size": stat.st_size,
-                        "is_directory": False
-                    })
-                except OSError:
-                    continue
-            
-            # Limit to prevent overwhelming UI
-            if len(files) > 100:
-                break
-        
-        # Sort by path
-        files.sort(key=lambda x: x["path"])
-        
-        return {"ok": True, "files": files[:100], "workspace": workspace}
+        # First call per workspace builds the index off the event loop; later calls
+        # only apply the changes the watcher (or directory-mtime poll) picked up.
+        files = await asyncio.to_thread(
+            lambda: get_workspace_index(workspace).search_files(search_filter, limit=100)
+        )
+        return {"ok": True, "files": files, "workspace": workspace}
     except Exception as e:
         return {"ok": False, "message": str(e)}
 
@@ -1102,7 +1157,6 @@ class FolderListRequest(BaseModel):
 async def list_workspace_folders(request: FolderListRequest = None):
     """List folders in the workspace for / prompt folder picker (same workspace as @ files)"""
     from utils import get_workspace_path, set_workspace_path
-    import fnmatch
 
     workspace = None
     if request and request.workspace_path:
@@ -1114,39 +1168,19 @@ async def list_workspace_folders(request: FolderListRequest = None):
     if not workspace:
         return {"ok": False, "message": "No workspace path set"}
 
-    search_filter = request.search.lower() if request and request.search else None
-    ignore_patterns = [
-        '__pycache__', '.git', 'node_modules', '.vscode',
-        'venv', '.env', '*.egg-info', '.DS_Store',
-        'dist', 'build', '.next', '.cache', 'coverage'
-    ]
-    folders = []
+    search_filter = request.search if request and request.search else None
     try:
         # Include workspace root
         root_name = os.path.basename(workspace.rstrip(os.sep)) or workspace
-        folders.append({
+        folders = [{
             "path": ".",
             "name": root_name,
             "full_path": workspace,
-        })
-        for root, dirs, _ in os.walk(workspace):
-            dirs[:] = [d for d in dirs if not any(
-                fnmatch.fnmatch(d, pattern) for pattern in ignore_patterns
-            )]
-            for d in dirs:
-                full_path = os.path.join(root, d)
-                rel_path = os.path.relpath(full_path, workspace)
-                if search_filter and search_filter not in rel_path.lower():
-                    continue
-                folders.append({
-                    "path": rel_path,
-                    "name": d,
-                    "full_path": full_path,
-                })
-            if len(folders) > 80:
-                break
-        folders.sort(key=lambda x: x["path"])
-        return {"ok": True, "folders": folders[:80], "workspace": workspace}
+        }]
+        folders.extend(await asyncio.to_thread(
+            lambda: get_workspace_index(workspace).search_folders(search_filter, limit=79)
+        ))
+        return {"ok": True, "folders": folders, "workspace": workspace}
     except Exception as e:
         return {"ok": False, "message": str(e)}
 
@@ -1154,10 +1188,26 @@ async def list_workspace_folders(request: FolderListRequest = None):
 class ReadFileRequest(BaseModel):
     path: str = None
     workspace_path: str = None
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
+    offset: Optional[int] = None
+    length: Optional[int] = None
+
+# Above this size /read-file-content returns the first window (whole lines, up to
+# FILE_READ_MAX_RANGE_BYTES) plus size/outline instead of the whole file
+READ_FILE_CONTENT_MAX_BYTES = int(os.getenv("READ_FILE_CONTENT_MAX_BYTES", str(1024 * 1024)))
+
+def _read_window(full_path: str, start_line=None, end_line=None, offset=None, length=None) -> dict:
+    """Line window (default) or byte window (offset/length) of a file — see file_ranges."""
+    if offset is not None or (length is not None and start_line is None):
+        return file_ranges.read_bytes(full_path, offset or 0, length)
+    return file_ranges.read_lines(full_path, start_line or 1, end_line)
 
 @app.post("/read-file-content")
-async def read_file_content(path: str = None, request: ReadFileRequest = None):
-    """Read file content for context"""
+async def read_file_content(path: str = None, request: ReadFileRequest = None,
+                            start_line: int = None, end_line: int = None,
+                            offset: int = None, length: int = None):
+    """Read file content for context (optionally one line/byte window; large files are paged)"""
     from utils import get_workspace_path, set_workspace_path
     
     # Get path from query param or request body
@@ -1187,6 +1237,26 @@ async def read_file_content(path: str = None, request: ReadFileRequest = None):
         if not os.path.exists(full_path):
             return {"ok": False, "message": f"File not found: {file_path}"}
         
+        if request:
+            start_line = start_line if start_line is not None else request.start_line
+            end_line = end_line if end_line is not None else request.end_line
+            offset = offset if offset is not None else request.offset
+            length = length if length is not None else request.length
+        ranged = any(v is not None for v in (start_line, end_line, offset, length))
+        if ranged or os.path.getsize(full_path) > READ_FILE_CONTENT_MAX_BYTES:
+            if not ranged:
+                start_line, end_line = 1, 2 ** 31  # as many whole lines as one window allows
+            window = await asyncio.to_thread(_read_window, full_path, start_line, end_line, offset, length)
+            if not ranged:
+                window["outline"] = (await asyncio.to_thread(file_ranges.describe, full_path))["outline"]
+            return {
+                "ok": True,
+                "path": file_path,
+                **window,
+                "total_size": window["size"],
+                "size": len(window["content"]),
+            }
+        
         with open(full_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
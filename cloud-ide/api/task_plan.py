@@ -0,0 +1,190 @@
+"""
+Task Plan — the planner's multi-phase plan as a parsed, typed object.
+
+planner_node produces the plan as JSON (kept in State["task_plan"] and shown to the LLM);
+it is parsed and validated ONCE into a TaskPlan stored in State["plan"]. The routers and
+phase nodes in brain.py then read phases/steps by index instead of json.loads-ing the plan
+string on every graph transition. Checkpoints written before State had a "plan" field (or
+restored without it) fall back to `plan_from_state`, which parses each distinct plan
+string once.
+
+Steps may declare `depends_on` (step numbers within the same phase). A step without it
+depends on every earlier step, which is the old strictly sequential order; steps whose
+dependencies are all done can run concurrently (see the fast path in brain.py).
+`critical_path_report` turns the per-step timings recorded during a run into the
+wall-clock vs serial time and the chain of steps that bounded the run.
+"""
+
+import json
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True, slots=True)
+class PlanStep:
+    number: int
+    action: str = ""
+    type: str = "code"
+    command: str = ""
+    details: str = ""
+    depends_on: Optional[Tuple[int, ...]] = None  # step numbers; None = every earlier step
+
+    def __post_init__(self):
+        if self.depends_on is not None:
+            object.__setattr__(self, "depends_on", tuple(self.depends_on))
+
+    @classmethod
+    def from_dict(cls, raw, idx: int) -> "PlanStep":
+        if not isinstance(raw, dict):
+            return cls(number=idx + 1, action=str(raw))
+        number = raw.get("step", idx + 1)
+        depends_on = raw.get("depends_on")
+        if depends_on is not None:
+            if not isinstance(depends_on, list):
+                depends_on = [depends_on]
+            depends_on = tuple(int(d) for d in depends_on if str(d).strip().isdigit())
+        return cls(
+            number=number if isinstance(number, int) else idx + 1,
+            action=str(raw.get("action") or ""),
+            type=str(raw.get("type") or "code"),
+            command=str(raw.get("command") or ""),
+            details=str(raw.get("details") or ""),
+            depends_on=depends_on,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class PlanPhase:
+    name: str
+    description: str = ""
+    review: bool = False
+    build: bool = False
+    build_commands: Tuple[str, ...] = ()
+    working_directory: str = "."
+    steps: Tuple[PlanStep, ...] = ()
+
+    @classmethod
+    def from_dict(cls, raw, idx: int) -> "PlanPhase":
+        if not isinstance(raw, dict):
+            raw = {"description": str(raw)}
+        steps = raw.get("steps") or []
+        commands = raw.get("build_commands") or []
+        return cls(
+            name=str(raw.get("name") or f"Phase {idx + 1}"),
+            description=str(raw.get("description") or ""),
+            review=bool(raw.get("review", False)),
+            build=bool(raw.get("build", False)),
+            build_commands=tuple(str(c) for c in (commands if isinstance(commands, list) else [commands])),
+            working_directory=str(raw.get("working_directory") or "."),
+            steps=tuple(PlanStep.from_dict(s, i) for i, s in enumerate(steps if isinstance(steps, list) else [])),
+        )
+
+    def __post_init__(self):
+        # Checkpoints restore tuples as lists
+        object.__setattr__(self, "build_commands", tuple(self.build_commands))
+        object.__setattr__(self, "steps", tuple(self.steps))
+
+    @property
+    def needs_review_build(self) -> bool:
+        return self.review or self.build
+
+    def dependencies(self, idx: int) -> Tuple[int, ...]:
+        """Indexes of the steps that must be done before step `idx` can start."""
+        step = self.steps[idx]
+        if step.depends_on is None:
+            return tuple(range(idx))
+        by_number = {s.number: i for i, s in enumerate(self.steps)}
+        return tuple(by_number[n] for n in step.depends_on if n in by_number and by_number[n] != idx)
+
+
+@dataclass(frozen=True, slots=True)
+class TaskPlan:
+    phases: Tuple[PlanPhase, ...] = ()
+    stack: str = ""
+
+    @classmethod
+    def from_dict(cls, raw: dict) -> "TaskPlan":
+        phases = raw.get("phases") or []
+        return cls(
+            phases=tuple(PlanPhase.from_dict(p, i) for i, p in enumerate(phases if isinstance(phases, list) else [])),
+            stack=str(raw.get("stack") or ""),
+        )
+
+    def __post_init__(self):
+        object.__setattr__(self, "phases", tuple(self.phases))
+
+    def phase(self, idx: int) -> Optional[PlanPhase]:
+        """Phase at `idx`, or None once every phase is done."""
+        return self.phases[idx] if 0 <= idx < len(self.phases) else None
+
+
+@lru_cache(maxsize=32)
+def parse_task_plan(task_plan: str) -> Optional[TaskPlan]:
+    """TaskPlan for a plan JSON string (None if empty or not a JSON object)."""
+    if not task_plan:
+        return None
+    try:
+        raw = json.loads(task_plan)
+    except json.JSONDecodeError:
+        return None
+    return TaskPlan.from_dict(raw) if isinstance(raw, dict) else None
+
+
+def plan_from_state(state) -> Optional[TaskPlan]:
+    """The active plan: State["plan"] when present, else parsed (once) from State["task_plan"]."""
+    plan = state.get("plan")
+    if isinstance(plan, TaskPlan):
+        return plan
+    return parse_task_plan(state.get("task_plan") or "")
+
+
+def step_key(phase_idx: int, step_idx) -> str:
+    """Key of a step (or of a phase's "review_build") in State["completed_steps"] and timings."""
+    return f"{phase_idx}.{step_idx}"
+
+
+def critical_path_report(plan: TaskPlan, timings: List[Dict]) -> Dict:
+    """
+    Wall-clock vs serial time of a run and its critical path.
+    `timings` entries: {"phase", "step" (index or "review_build"), "label", "mode", "start", "end"}.
+    A step waits for its dependencies and for the previous phase's review/build.
+    """
+    if not timings:
+        return {"wall_s": 0.0, "serial_s": 0.0, "critical_path_s": 0.0, "parallelism": 1.0, "critical_path": []}
+    entries = {step_key(t["phase"], t["step"]): t for t in timings}
+    finish: Dict[str, float] = {}
+    came_from: Dict[str, Optional[str]] = {}
+    for key in sorted(entries, key=lambda k: entries[k]["start"]):
+        t = entries[key]
+        phase = plan.phase(t["phase"])
+        if t["step"] == "review_build":
+            deps = [step_key(t["phase"], j) for j in range(len(phase.steps))] if phase else []
+        elif phase is not None and t["step"] < len(phase.steps):
+            deps = [step_key(t["phase"], j) for j in phase.dependencies(t["step"])]
+        else:
+            deps = []
+        if t["phase"] > 0:
+            deps.append(step_key(t["phase"] - 1, "review_build"))
+        best = max((d for d in deps if d in finish), key=finish.get, default=None)
+        finish[key] = (t["end"] - t["start"]) + (finish[best] if best else 0.0)
+        came_from[key] = best
+    key, path = max(finish, key=finish.get), []
+    critical_s = finish[key]
+    while key is not None:
+        t = entries[key]
+        path.append(f"{t['label']} ({t['mode']}, {t['end'] - t['start']:.1f}s)")
+        key = came_from[key]
+    wall = max(t["end"] for t in timings) - min(t["start"] for t in timings)
+    serial = sum(t["end"] - t["start"] for t in timings)
+    return {
+        "wall_s": round(wall, 2),
+        "serial_s": round(serial, 2),
+        "critical_path_s": round(critical_s, 2),
+        "parallelism": round(serial / wall, 2) if wall > 0 else 1.0,
+        "critical_path": path[::-1],
+    }
+
+
+# Types stored in State, for the checkpointer's msgpack allowlist
+PLAN_TYPES = (TaskPlan, PlanPhase, PlanStep)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The api modules are flat (run from cloud-ide/api), make them importable from tests/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
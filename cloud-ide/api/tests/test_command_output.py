@@ -0,0 +1,46 @@
+"""Command output capture (brain.CommandOutput): bounded in memory, complete on disk."""
+
+import time
+
+import pytest
+
+import brain
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(brain, "COMMAND_LOG_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _wait_closed(fh, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not fh.closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert fh.closed
+
+
+def test_spill_file_has_every_line_in_order():
+    output = brain.CommandOutput("npm install")
+    fh = output._fh
+    for i in range(20000):
+        output.add("stderr" if i % 10 == 0 else "stdout", f"line {i} " + "x" * 40)
+    output.close()
+    _wait_closed(fh)
+    with open(output.path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "$ npm install"
+    assert len(lines) == 20001
+    assert lines[1].startswith("[stderr] line 0 ") and lines[-1].startswith("line 19999 ")
+    assert output.truncated and f"log_id={output.log_id}" in output.notice()
+
+
+def test_lines_are_batched_off_the_caller():
+    output = brain.CommandOutput("dotnet test")
+    fh = output._fh
+    output.add("stdout", "first")
+    assert output._pending[-1] == "first\n"  # buffered, not written by add()
+    output.close()
+    _wait_closed(fh)
+    with open(output.path, encoding="utf-8") as f:
+        assert f.read() == "$ dotnet test\nfirst\n"
@@ -0,0 +1,39 @@
+"""manage_file(action="edit") blocks (brain._apply_edit_blocks): only whole, correctly indented lines match."""
+
+import pytest
+
+from brain import _apply_edit_blocks
+
+
+def _block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n"
+
+
+def test_search_replace_whole_line():
+    text, _, count = _apply_edit_blocks("count = 0\nprint(1)\n", _block("count = 0\n", "count = 5\n"))
+    assert (text, count) == ("count = 5\nprint(1)\n", 1)
+
+
+def test_search_does_not_match_inside_a_line():
+    with pytest.raises(ValueError, match="not found"):
+        _apply_edit_blocks("total_count = 0\nprint(1)\n", _block("count = 0\n", "count = 5\n"))
+
+
+def test_search_picks_the_whole_line_over_a_suffix():
+    text, _, _ = _apply_edit_blocks("total_count = 0\ncount = 0\n", _block("count = 0\n", "count = 5\n"))
+    assert text == "total_count = 0\ncount = 5\n"
+
+
+def test_hunk_indentation_must_match():
+    original = "def f():\n    if x:\n        return 1\n"
+    diff = "@@ -3,1 +3,1 @@\n-    return 1\n+    return 2\n"
+    with pytest.raises(ValueError, match="not found"):
+        _apply_edit_blocks(original, diff)
+
+
+def test_loose_match_ignores_trailing_whitespace_only():
+    original = "def f():  \n    return 1\n"
+    text, _, _ = _apply_edit_blocks(original, "@@ -1,2 +1,2 @@\n def f():\n-    return 1\n+    return 2\n")
+    assert text == "def f():\n    return 2\n"
+    with pytest.raises(ValueError, match="not found"):
+        _apply_edit_blocks("  def f():\n", _block("def f():\n", "def g():\n"))
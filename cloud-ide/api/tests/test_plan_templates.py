@@ -0,0 +1,86 @@
+"""Skeleton plans (plan_templates.skeleton_plan) must point at the real template trees."""
+
+import os
+import re
+
+import pytest
+
+import plan_templates
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         "dotnettemplates")
+
+# Same copy commands as brain.TEMPLATE_COPY_COMMANDS (brain is too heavy to import here)
+COPY_COMMANDS = {
+    "dotnetangularfullstack": "cp -r dotnettemplates/dotnetangularfullstack .",
+    "webapi": "cp -r dotnettemplates/dotnetwebapi/. .",
+    "mvc": "cp -r dotnettemplates/dotnetmvc/. .",
+    "angular": "cp -r dotnettemplates/angularscaffolding .",
+}
+
+
+def _template_path(copy_cmd: str, rel: str) -> str:
+    """Where workspace-relative `rel` comes from after running `copy_cmd` in an empty workspace."""
+    source = copy_cmd.split()[2]
+    if source.endswith("/."):  # contents copied into the workspace root
+        return os.path.join(TEMPLATES, source[len("dotnettemplates/"):-2], rel)
+    return os.path.join(TEMPLATES, os.path.dirname(source[len("dotnettemplates/"):]), rel)
+
+
+def _is_angular_project(path: str) -> bool:
+    return all(os.path.exists(os.path.join(path, name)) for name in ("package.json", "angular.json", "src/app"))
+
+
+def _is_dotnet_project(path: str) -> bool:
+    return os.path.isdir(path) and any(name.endswith(".csproj") for name in os.listdir(path))
+
+
+@pytest.mark.parametrize("archetype", plan_templates.ARCHETYPES)
+def test_skeleton_paths_exist_in_template(archetype):
+    copy_cmd = COPY_COMMANDS[archetype]
+    plan = plan_templates.skeleton_plan(archetype, ("Product", "OrderItem"), copy_cmd)
+    for phase in plan["phases"]:
+        if phase["working_directory"] != ".":
+            assert os.path.isdir(_template_path(copy_cmd, phase["working_directory"])), phase["name"]
+        commands = list(phase["build_commands"]) + [s["command"] for s in phase["steps"] if "command" in s]
+        for command in commands:
+            match = re.match(r"cd (\S+) && (\S+)", command)
+            if not match:
+                continue
+            project = _template_path(copy_cmd, match.group(1))
+            if match.group(2) in ("npm", "npx"):
+                assert _is_angular_project(project), command
+            elif match.group(2) == "dotnet":
+                assert _is_dotnet_project(project), command
+        for step in phase["steps"]:
+            for path in re.findall(r"(\S+)/src/app/", step.get("details", "")):
+                assert _is_angular_project(_template_path(copy_cmd, path)), step["details"]
+            for path in re.findall(r"(\S+)/(?:Models|Controllers)/", step.get("details", "")):
+                assert _is_dotnet_project(_template_path(copy_cmd, path)), step["details"]
+
+
+def test_angular_skeleton_uses_angularapp():
+    plan = plan_templates.skeleton_plan("angular", ("Book",), COPY_COMMANDS["angular"])
+    setup = plan["phases"][0]["steps"]
+    assert setup[1]["command"] == "cd angularscaffolding/angularapp && npm install"
+    assert plan["phases"][1]["working_directory"] == "angularscaffolding/angularapp"
+
+
+@pytest.mark.parametrize("request_text, entities", [
+    ("angular app to manage movies, cookies and series", ("Movie", "Cookie", "Series")),
+    ("CRUD for categories and companies", ("Category", "Company")),
+    ("dotnet webapi with user models and order entities", ("User", "Order")),
+    ("create a fullstack dotnet angular app to manage employees and departments", ("Employee", "Department")),
+])
+def test_explicit_entity_lists_are_complete(request_text, entities):
+    assert plan_templates.extract_entities(request_text) == (entities, True)
+
+
+@pytest.mark.parametrize("request_text", [
+    "build a .net web api that tracks expenses per category",
+    "Create a web api for a library to manage books",
+    "create an angular app for my bakery",
+])
+def test_partial_extraction_needs_delta_fill(request_text):
+    _, complete = plan_templates.extract_entities(request_text)
+    assert not complete
@@ -0,0 +1,89 @@
+"""Per-session agent state (utils.SessionContext): isolation under concurrent runs and idle eviction."""
+
+import asyncio
+import random
+
+import pytest
+
+import utils
+
+N_SESSIONS = 64
+
+
+async def _fake_run(i: int) -> list:
+    """What one agent run does with its session: set it up, then read it back across awaits/threads."""
+    utils.begin_session(f"load-{i}")
+    utils.set_workspace_path(f"/ws/{i}")
+    utils.set_current_request_message(f"request {i}")
+    utils.current_session().modified_files.add(f"/ws/{i}/file.cs")
+    seen = []
+    for _ in range(5):
+        await asyncio.sleep(random.random() / 100)
+        # Child tasks and executor threads (LangGraph tools/nodes) must see the same session
+        seen.append(await asyncio.create_task(_read_session()))
+        seen.append(await asyncio.to_thread(_read_session_sync))
+    return seen
+
+
+async def _read_session():
+    return _read_session_sync()
+
+
+def _read_session_sync():
+    s = utils.current_session()
+    return s.session_id, utils.get_workspace_path(), utils.get_current_request_message(), set(s.modified_files)
+
+
+def test_parallel_sessions_do_not_interfere():
+    async def main():
+        return await asyncio.gather(*(_fake_run(i) for i in range(N_SESSIONS)))
+
+    results = asyncio.run(main())
+    for i, seen in enumerate(results):
+        expected = (f"load-{i}", f"/ws/{i}", f"request {i}", {f"/ws/{i}/file.cs"})
+        assert seen and all(s == expected for s in seen), (i, seen[:2])
+    for i in range(N_SESSIONS):
+        ctx = utils._sessions[f"load-{i}"]
+        assert ctx.workspace_path == f"/ws/{i}" and ctx.modified_files == {f"/ws/{i}/file.cs"}
+
+
+def test_outside_a_run_uses_the_default_session():
+    async def run_then_check():
+        await _fake_run(0)
+
+    asyncio.run(run_then_check())
+    # asyncio.run used a copied context: this thread never bound a session
+    assert utils.current_session() is utils._default_session
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(utils, "_sessions", type(utils._sessions)())
+    return utils._sessions
+
+
+def test_registry_is_bounded(fresh_registry, monkeypatch):
+    monkeypatch.setattr(utils, "SESSION_MAX_CONTEXTS", 3)
+
+    async def main():
+        for i in range(5):
+            await asyncio.create_task(_begin(f"s{i}"))
+
+    asyncio.run(main())
+    assert list(fresh_registry) == ["s2", "s3", "s4"]
+
+
+def test_idle_sessions_are_evicted(fresh_registry, monkeypatch):
+    monkeypatch.setattr(utils, "SESSION_IDLE_TTL", 60)
+
+    async def main():
+        await asyncio.create_task(_begin("idle"))
+        fresh_registry["idle"].last_used -= 120
+        await asyncio.create_task(_begin("active"))
+
+    asyncio.run(main())
+    assert list(fresh_registry) == ["active"]
+
+
+async def _begin(session_id: str):
+    utils.begin_session(session_id)
@@ -0,0 +1,60 @@
+"""Workspace index watcher (workspace_index.WorkspaceIndex): watches follow the indexed directories."""
+
+import os
+import time
+
+import pytest
+
+import workspace_index
+
+
+@pytest.fixture
+def index(tmp_path):
+    for rel in ("src/app", "node_modules/pkg/lib", ".git/objects", "dist/assets"):
+        os.makedirs(tmp_path / rel)
+    (tmp_path / "src/app/a.ts").write_text("")
+    index = workspace_index.WorkspaceIndex(str(tmp_path))
+    if index._inotify is None:
+        index.close()
+        pytest.skip("inotify watcher unavailable")
+    yield index
+    index.close()
+
+
+def _settle():
+    time.sleep(0.3)
+
+
+def test_ignored_directories_are_not_watched(index, tmp_path):
+    assert index._watched == {"src", "src/app"}
+    os.makedirs(tmp_path / "node_modules/new")
+    os.makedirs(tmp_path / "src/feature/deep")
+    (tmp_path / "src/feature/deep/b.ts").write_text("")
+    _settle()
+    assert index.find_files("b.ts") == ["src/feature/deep/b.ts"]
+    assert index._watched == {"src", "src/app", "src/feature", "src/feature/deep"}
+
+
+def test_removed_directories_drop_their_watch(index, tmp_path):
+    os.makedirs(tmp_path / "src/tmp")
+    _settle()
+    index.refresh()
+    assert "src/tmp" in index._watched
+    os.rmdir(tmp_path / "src/tmp")
+    _settle()
+    index.refresh()
+    assert "src/tmp" not in index._watched
+
+
+def test_watch_limit_falls_back_to_polling(index, tmp_path, monkeypatch):
+    def limit_reached(path):
+        raise OSError(28, "inotify watch limit reached")
+
+    monkeypatch.setattr(index._inotify, "add_watch", limit_reached)
+    os.makedirs(tmp_path / "lib")
+    _settle()
+    index.refresh()
+    assert index._inotify is None
+    (tmp_path / "lib/c.ts").write_text("")
+    index._last_refresh = 0.0  # don't wait for WORKSPACE_INDEX_REFRESH_S
+    assert index.find_files("c.ts") == ["lib/c.ts"]
@@ -0,0 +1,48 @@
+"""Ignore rules (workspace_walker): build-output names are pruned for the pickers only."""
+
+import os
+
+import pytest
+
+import brain
+import utils
+from description_generator import _walk_code_files
+from workspace_index import WorkspaceIndex
+from workspace_walker import get_ignore_matcher
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    for rel in ("build/tasks/compile.py", "Build/Steps.cs", "src/app.py", "node_modules/pkg/index.js"):
+        path = tmp_path / rel
+        os.makedirs(path.parent, exist_ok=True)
+        path.write_text("")
+    utils.set_workspace_path(str(tmp_path))
+    return tmp_path
+
+
+def test_source_dir_named_build_is_reviewed(workspace):
+    assert brain._is_code_file(str(workspace / "build/tasks/compile.py"))
+    assert brain._is_code_file(str(workspace / "Build/Steps.cs"))
+    assert not brain._is_code_file(str(workspace / "node_modules/pkg/index.js"))
+
+
+def test_gitignored_build_dir_is_skipped(workspace):
+    (workspace / ".gitignore").write_text("build/\n")
+    assert get_ignore_matcher(str(workspace)).is_ignored_path("build/tasks/compile.py")
+    assert not brain._is_code_file(str(workspace / "build/tasks/compile.py"))
+
+
+def test_description_walk_keeps_its_own_skip_set(workspace):
+    found = {os.path.relpath(p, workspace) for p in _walk_code_files(str(workspace), str(workspace))}
+    # description_generator.SKIP_DIRS has always listed (lowercase) build/
+    assert found == {"src/app.py", os.path.join("Build", "Steps.cs")}
+
+
+def test_picker_index_prunes_build_output(workspace):
+    index = WorkspaceIndex(str(workspace))
+    try:
+        assert index.find_files("compile.py") == []
+        assert index.find_files("app.py") == ["src/app.py"]
+    finally:
+        index.close()
@@ -2,6 +2,16 @@
 import uuid
 from typing import Dict
 import asyncio
+import contextvars
+import inspect
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from change_store import applied_change_store
 
 # Global set to track connected WebSocket clients
 connected_clients = set()
@@ -9,20 +19,18 @@ connected_clients = set()
 # Store pending file changes awaiting approval (legacy - keeping for compatibility)
 pending_changes: Dict[str, dict] = {}
 
-# Store APPLIED file changes (for the new workflow - changes applied, can be reverted)
+# Store APPLIED file changes (for the new workflow - changes applied, can be reverted).
+# Records hold metadata only; old/new content and the diff live in change_store.applied_change_store
+# and are reconstructed by get_applied_change().
 applied_changes: Dict[str, dict] = {}
 
-# Queue for file change notifications (to be sent when event loop is available)
-file_change_queue = []
+# Queues for change notifications (to be sent when event loop is available), drained after every tool call
+file_change_queue: deque = deque()     # proposed changes (file_change)
+applied_change_queue: deque = deque()  # applied changes (file_applied)
 
-# Session changes list (all changes in current session for the sidebar)
+# Session changes list (all changes in current session for the sidebar, in order) and its index by change_id
 session_changes: list = []
-
-# Current workspace path from VS Code (set by server.py, used by brain.py)
-current_workspace_path: str = None
-
-# Current user request message (set by server.py before agent run, used by brain.py execute_terminal to block template copy when user asked to write test cases)
-current_request_message: str = None
+_session_index: Dict[str, dict] = {}
 
 # Track running processes for interactive input and kill support
 running_processes: Dict[str, dict] = {}
@@ -31,45 +39,294 @@ running_processes: Dict[str, dict] = {}
 current_tasks: Dict[str, dict] = {}
 task_counter = 0
 
+# =============================================
+# Per-request Session Context
+# =============================================
+# Workspace, request message and the agent's review/cache state live on a SessionContext
+# bound to a ContextVar by server.py's /chat (begin_session). asyncio tasks and executor
+# threads started by LangGraph copy the context, so every node and tool of one agent run
+# sees the same SessionContext while concurrent runs (different workspaces) stay isolated.
+# Code running outside an agent run (e.g. the file-picker endpoints) falls back to a
+# process-wide default session, which also remembers the last workspace that was set.
+# Contexts not used for SESSION_IDLE_TTL seconds (or beyond the SESSION_MAX_CONTEXTS most
+# recently used) are dropped from the registry; a run still holding one keeps using it.
+
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", str(6 * 3600)))
+SESSION_MAX_CONTEXTS = int(os.getenv("SESSION_MAX_CONTEXTS", "256"))
+
+class SessionContext:
+    """State for one chat session's agent runs (one instance per session_id)."""
+
+    def __init__(self, session_id: str = None, workspace_path: str = None):
+        self.session_id = session_id
+        self.workspace_path = workspace_path  # from VS Code (set by server.py, used by brain.py)
+        # Current user request (used by brain.py execute_terminal to block template copy when user asked to write test cases)
+        self.request_message = ""
+        # Review / cache state used by brain.py (see the SCALABLE REVIEW SYSTEM section there)
+        self.modified_files: set = set()
+        self.phase_created_files: set = set()
+        self.review_cache: dict = {}
+        self.workspace_structure_cache: dict = {}
+        self.dotnet_framework = "webapi"
+        self.last_used = time.monotonic()
+
+
+_default_session = SessionContext()
+_sessions: "OrderedDict[str, SessionContext]" = OrderedDict()  # least recently used first
+_session_ctx: contextvars.ContextVar = contextvars.ContextVar("session_ctx", default=None)
+
+
+def begin_session(session_id: str) -> SessionContext:
+    """Bind the SessionContext for `session_id` to the current task and everything it spawns."""
+    ctx = _sessions.get(session_id)
+    if ctx is None:
+        ctx = _sessions[session_id] = SessionContext(session_id, _default_session.workspace_path)
+    _sessions.move_to_end(session_id)
+    ctx.last_used = time.monotonic()
+    _evict_idle_sessions()
+    _session_ctx.set(ctx)
+    return ctx
+
+
+def _evict_idle_sessions():
+    now = time.monotonic()
+    while _sessions:
+        session_id, oldest = next(iter(_sessions.items()))
+        if now - oldest.last_used <= SESSION_IDLE_TTL and len(_sessions) <= SESSION_MAX_CONTEXTS:
+            break
+        del _sessions[session_id]
+
+
+def current_session() -> SessionContext:
+    """The SessionContext of the running agent run (or the process-wide default)."""
+    ctx = _session_ctx.get()
+    if ctx is None:
+        return _default_session
+    ctx.last_used = time.monotonic()
+    return ctx
+
+
+def drop_session(session_id: str):
+    """Forget a session's context (called when the chat session is deleted)."""
+    _sessions.pop(session_id, None)
+
+
 def set_workspace_path(path: str):
     """Set the current workspace path"""
-    global current_workspace_path
-    current_workspace_path = path
-    print(f"📂 Workspace path set to: {path}")
+    ctx = current_session()
+    ctx.workspace_path = path
+    _default_session.workspace_path = path  # fallback for requests that don't pass a workspace
+    _ws_logger.info("📂 Workspace path set to: %s", path)
 
 def get_workspace_path() -> str:
     """Get the current workspace path"""
-    return current_workspace_path
+    return current_session().workspace_path
 
 def set_current_request_message(message: str):
     """Set the current user request message (used to block template copy when user asked to write test cases)."""
-    global current_request_message
-    current_request_message = message or ""
+    current_session().request_message = message or ""
 
 def get_current_request_message() -> str:
     """Get the current user request message, or empty string if not set."""
-    return current_request_message or ""
+    return current_session().request_message or ""
+
+# =============================================
+# WebSocket Outbound Channels (batched log broadcasting)
+# =============================================
+# Every client gets its own outbound frame queue drained by a writer task, so a slow
+# client never stalls the agent. broadcast_log only buffers the line; the buffer is
+# flushed as ONE {"type": "log"} frame (lines joined by "\n") every WS_LOG_FLUSH_MS,
+# or earlier once WS_LOG_BATCH_MAX_LINES are pending. Each frame is JSON-serialized once
+# and the same text is queued to every client. Other message types go through
+# broadcast_json, which flushes pending log lines first so ordering is preserved.
+#
+# Slow clients: once a client has WS_CLIENT_MAX_QUEUE frames waiting, its oldest log
+# frames are dropped (a "lines dropped" notice is sent in their place); non-log frames
+# are never dropped, but a client whose queue keeps growing past 4x the cap, or whose
+# send blocks longer than WS_SEND_TIMEOUT, is disconnected. With
+# WS_SLOW_CLIENT_POLICY=block, broadcast_log instead waits (up to WS_SEND_TIMEOUT) for
+# room in the slowest client's queue before returning.
+
+WS_LOG_FLUSH_INTERVAL = float(os.getenv("WS_LOG_FLUSH_MS", "25")) / 1000
+WS_LOG_BATCH_MAX_LINES = int(os.getenv("WS_LOG_BATCH_MAX_LINES", "500"))
+WS_CLIENT_MAX_QUEUE = int(os.getenv("WS_CLIENT_MAX_QUEUE", "256"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop")  # "drop" | "block"
+
+
+def _dumps(message: dict) -> str:
+    # Same encoding Starlette's send_json uses
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class _ClientChannel:
+    """Outbound frame queue + writer task for one WebSocket client."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.frames = deque()  # (log_lines, text); log_lines == 0 for non-log frames
+        self.wakeup = asyncio.Event()
+        self.room = asyncio.Event()
+        self.room.set()
+        self.closed = False
+        self.protocol = 1  # sidebar protocol the client asked for with a "hello" (see Applied File Changes)
+        self.frames_sent = 0
+        self.lines_dropped = 0
+        self._pending_drop_notice = 0
+        self.task = asyncio.get_running_loop().create_task(self._writer())
+
+    def put(self, text: str, log_lines: int = 0):
+        if self.closed:
+            return
+        if len(self.frames) >= WS_CLIENT_MAX_QUEUE:
+            for i, (n, _) in enumerate(self.frames):
+                if n:
+                    del self.frames[i]
+                    self.lines_dropped += n
+                    self._pending_drop_notice += n
+                    break
+            else:
+                if len(self.frames) >= WS_CLIENT_MAX_QUEUE * 4:
+                    _ws_logger.warning("[ws] disconnecting client: %d undelivered frames", len(self.frames))
+                    self.task.cancel()
+                    return
+        self.frames.append((log_lines, text))
+        if len(self.frames) >= WS_CLIENT_MAX_QUEUE:
+            self.room.clear()
+        self.wakeup.set()
+
+    async def _send(self, text: str):
+        await asyncio.wait_for(self.ws.send_text(text), timeout=WS_SEND_TIMEOUT)
+        self.frames_sent += 1
+
+    async def _writer(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.frames:
+                    if self._pending_drop_notice:
+                        n, self._pending_drop_notice = self._pending_drop_notice, 0
+                        await self._send(_dumps({"type": "log", "content": f"⚠️ {n} log lines dropped (client too slow)"}))
+                    _, text = self.frames.popleft()
+                    if len(self.frames) < WS_CLIENT_MAX_QUEUE // 2:
+                        self.room.set()
+                    await self._send(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            _ws_logger.info("[ws] client send failed, dropping client: %s", e)
+        finally:
+            self.closed = True
+            self.frames.clear()
+            self.room.set()
+            connected_clients.discard(self.ws)
+            if _channels.get(self.ws) is self:
+                del _channels[self.ws]
+
+
+_ws_logger = logging.getLogger("agent")
+_channels: Dict[object, _ClientChannel] = {}
+_log_lines: list = []
+_log_flush_handle = None
+
+
+def register_client(ws):
+    """Start tracking a connected WebSocket (creates its outbound channel)."""
+    connected_clients.add(ws)
+    _channel(ws)
+
+
+def unregister_client(ws):
+    """Stop tracking a WebSocket and cancel its writer task."""
+    connected_clients.discard(ws)
+    ch = _channels.pop(ws, None)
+    if ch:
+        ch.task.cancel()
+
+
+def _channel(ws) -> _ClientChannel:
+    ch = _channels.get(ws)
+    if ch is None or ch.closed:
+        ch = _channels[ws] = _ClientChannel(ws)
+    return ch
+
+
+def _fanout(text: str, log_lines: int = 0):
+    """Queue one pre-serialized frame to every connected client."""
+    for ws in list(connected_clients):
+        _channel(ws).put(text, log_lines)
+    for ws in [ws for ws in _channels if ws not in connected_clients]:
+        unregister_client(ws)
+
+
+def _flush_logs():
+    """Send all buffered log lines as a single frame."""
+    global _log_flush_handle
+    if _log_flush_handle is not None:
+        _log_flush_handle.cancel()
+        _log_flush_handle = None
+    if not _log_lines:
+        return
+    lines = _log_lines[:]
+    _log_lines.clear()
+    _fanout(_dumps({"type": "log", "content": "\n".join(lines), "lines": len(lines)}), len(lines))
+
+
+async def broadcast_json(message: dict):
+    """Queue a (non-log) message for every client, after any log lines already buffered."""
+    if not connected_clients:
+        return
+    _flush_logs()
+    _fanout(_dumps(message))
+
+
+def _fanout_versioned(frames: Dict[int, str]):
+    """Queue a frame per client according to its sidebar protocol (no entry = nothing for that protocol)."""
+    for ws in list(connected_clients):
+        ch = _channel(ws)
+        text = frames.get(ch.protocol)
+        if text is not None:
+            ch.put(text)
+
+
+async def send_to_client(ws, message: dict):
+    """Queue a message for a single client (keeps ordering with broadcast frames)."""
+    _channel(ws).put(_dumps(message))
+
+
+def ws_stats() -> dict:
+    """Per-client outbound queue depth and delivery counters (for GET /ws-stats)."""
+    return {
+        "clients": [
+            {"queued_frames": len(ch.frames), "frames_sent": ch.frames_sent, "lines_dropped": ch.lines_dropped}
+            for ch in _channels.values()
+        ],
+        "buffered_log_lines": len(_log_lines),
+        "policy": WS_SLOW_CLIENT_POLICY,
+    }
+
 
 async def broadcast_log(message: str):
-    """Broadcast a log message to all connected WebSocket clients."""
+    """Buffer a log line for all connected WebSocket clients (sent in batched frames)."""
+    global _log_flush_handle
     if not connected_clients:
-        print(f"⚠️ No WebSocket clients connected. Log: {message}")
+        _ws_logger.info("⚠️ No WebSocket clients connected. Log: %s", message, extra={"sample": "log_no_clients"})
         return
-    
-    disconnected = set()
-    for ws in connected_clients:
-        try:
-            await ws.send_json({
-                "type": "log",
-                "content": message
-            })
-        except Exception as e:
-            print(f"❌ Failed to send to client: {e}")
-            disconnected.add(ws)
-    
-    # Remove disconnected clients
-    for ws in disconnected:
-        connected_clients.discard(ws)
+
+    _log_lines.append(message)
+    if len(_log_lines) >= WS_LOG_BATCH_MAX_LINES:
+        _flush_logs()
+    elif _log_flush_handle is None:
+        _log_flush_handle = asyncio.get_running_loop().call_later(WS_LOG_FLUSH_INTERVAL, _flush_logs)
+
+    if WS_SLOW_CLIENT_POLICY == "block":
+        for ch in list(_channels.values()):
+            if not ch.room.is_set():
+                try:
+                    await asyncio.wait_for(ch.room.wait(), timeout=WS_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    pass  # fall back to dropping for this client
 
 def store_pending_change(file_path: str, old_content: str, new_content: str, diff: str) -> str:
     """Store a pending file change and return its ID."""
@@ -90,53 +347,37 @@ def notify_file_change(change_id: str, file_path: str, is_new: bool = False):
         "file_path": file_path,
         "is_new": is_new
     })
-    print(f"📝 File change queued: {file_path} (ID: {change_id})")
+    _ws_logger.debug("📝 File change queued: %s (ID: %s)", file_path, change_id)
 
 async def broadcast_file_change(change_id: str):
     """Broadcast a file change proposal to all connected clients."""
-    print(f"🔍 Broadcasting file change: {change_id}")
-    print(f"📊 Connected clients: {len(connected_clients)}")
-    
     if change_id not in pending_changes:
-        print(f"⚠️ Change ID {change_id} not found in pending_changes")
+        _ws_logger.warning("⚠️ Change ID %s not found in pending_changes", change_id)
         return
     
     change = pending_changes[change_id]
-    print(f"📝 Sending file change: {change['file_path']}")
     
     if not connected_clients:
-        print("⚠️ No WebSocket clients connected! File change cannot be displayed.")
-        print("💡 Make sure the VS Code extension sidebar is open and WebSocket is connected.")
+        _ws_logger.warning("⚠️ No WebSocket clients connected! File change %s cannot be displayed "
+                           "(is the VS Code extension sidebar open?)", change["file_path"])
         return
     
-    disconnected = set()
-    for ws in connected_clients:
-        try:
-            message = {
-                "type": "file_change",
-                "change_id": change_id,
-                "file_path": change["file_path"],
-                "diff": change["diff"],
-                "is_new_file": change["is_new_file"],
-                "preview": change["new_content"][:500] if change["is_new_file"] else None,
-                "new_content": change["new_content"]  # Full content for diff editor
-            }
-            await ws.send_json(message)
-            print(f"✅ File change sent to WebSocket client")
-        except Exception as e:
-            print(f"❌ Failed to send file change to client: {e}")
-            disconnected.add(ws)
-    
-    for ws in disconnected:
-        connected_clients.discard(ws)
+    message = {
+        "type": "file_change",
+        "change_id": change_id,
+        "file_path": change["file_path"],
+        "diff": change["diff"],
+        "is_new_file": change["is_new_file"],
+        "preview": change["new_content"][:500] if change["is_new_file"] else None,
+        "new_content": change["new_content"]  # Full content for diff editor
+    }
+    await broadcast_json(message)
+    _ws_logger.debug("✅ File change %s queued for %d WebSocket client(s)", change_id, len(connected_clients))
 
 async def process_file_change_queue():
     """Process queued file change notifications"""
-    global file_change_queue
-    print(f"🔄 Processing file change queue... ({len(file_change_queue)} items)")
     while file_change_queue:
-        notification = file_change_queue.pop(0)
-        print(f"📤 Processing queued change: {notification['change_id']}")
+        notification = file_change_queue.popleft()
         await broadcast_file_change(notification["change_id"])
 
 # =============================================
@@ -187,17 +428,7 @@ async def broadcast_progress(action: str, task_id: str = None, task_name: str =
         "details": details,
         "tasks": list(current_tasks.values())
     }
-    
-    disconnected = set()
-    for ws in connected_clients:
-        try:
-            await ws.send_json(message)
-        except Exception as e:
-            print(f"❌ Failed to send progress to client: {e}")
-            disconnected.add(ws)
-    
-    for ws in disconnected:
-        connected_clients.discard(ws)
+    await broadcast_json(message)
 
 
 async def add_progress_task(name: str, details: str = "") -> str:
@@ -240,143 +471,189 @@ async def end_progress_session():
 # =============================================
 # Applied File Changes Tracking (New Workflow)
 # =============================================
+# Sidebar protocol. Clients that never say hello (protocol 1, the shipped extension)
+# get one "file_applied" event per write with that change's old/new content and diff,
+# plus "session_changes_update" after accept/revert. A client that sends
+#   {"type": "hello", "protocol": 2}
+# gets one "changes_snapshot" (every change's metadata + seq) and from then on only
+# small deltas, each numbered with the next seq:
+#   {"type": "change_added",  "protocol": 2, "seq": n, "change": {...metadata...}}
+#   {"type": "change_status", "protocol": 2, "seq": n, "status": s, "change_ids": [...]}
+#   {"type": "changes_snapshot", ...}  again after the session changes are cleared
+# A change takes its seq when it is stored, so a snapshot already covers every event
+# whose seq is <= its own (a change_added for such a change is skipped by the client).
+# Content is fetched on demand from GET /applied-change/{id}; a client that sees a gap
+# in seq sends hello again to resync. Neither kind of event carries the whole change list
+# per write any more, so event size no longer grows with the session.
+
+SIDEBAR_PROTOCOL = 2
+
+changes_seq = 0
+_status_deltas: list = []  # (change_id, status) since the last broadcast_session_changes_update
+_changes_reset = False
+
+
+def _sidebar_entry(change_id: str, record: dict) -> dict:
+    return {
+        "change_id": change_id,
+        "file_path": record["file_path"],
+        "file_name": os.path.basename(record["file_path"]),
+        "is_new_file": record["is_new_file"],
+        "status": record["status"],
+    }
+
+
+def changes_snapshot() -> dict:
+    """Protocol 2 snapshot of the sidebar (metadata only)."""
+    return {"type": "changes_snapshot", "protocol": SIDEBAR_PROTOCOL, "seq": changes_seq,
+            "changes": get_all_session_changes()}
+
+
+async def handle_client_message(ws, text: str):
+    """React to a message a WebSocket client sent (hello/protocol negotiation; anything else is a keep-alive)."""
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        return
+    if not isinstance(msg, dict) or msg.get("type") != "hello":
+        return
+    try:
+        protocol = min(int(msg.get("protocol", 1)), SIDEBAR_PROTOCOL)
+    except (TypeError, ValueError):
+        protocol = 1
+    _channel(ws).protocol = protocol
+    if protocol >= 2:
+        await send_to_client(ws, changes_snapshot())
+
 
 def store_applied_change(file_path: str, old_content: str, new_content: str, diff: str, is_new_file: bool = False) -> str:
     """Store an applied file change (already written to disk) and return its ID."""
-    import os
+    global changes_seq
     change_id = str(uuid.uuid4())[:8]
     
-    print(f"💾 STORING APPLIED CHANGE: {file_path}")
-    print(f"   Change ID: {change_id}")
-    print(f"   Is new file: {is_new_file}")
-    
+    old_version, new_version = applied_change_store.record(file_path, old_content, new_content)
     applied_changes[change_id] = {
         "file_path": file_path,
-        "old_content": old_content,
-        "new_content": new_content,
-        "diff": diff,
+        "old_version": old_version,
+        "new_version": new_version,
+        "diff_blob": applied_change_store.put_text(diff or ""),
         "is_new_file": is_new_file,
         "status": "applied",
         "timestamp": __import__('datetime').datetime.now().isoformat()
     }
     
-    # Also add to session changes for sidebar display
-    session_changes.append({
-        "change_id": change_id,
-        "file_path": file_path,
-        "file_name": os.path.basename(file_path),
-        "is_new_file": is_new_file,
-        "status": "applied"
-    })
+    # Also add to session changes for sidebar display; the seq moves with the list, so a
+    # snapshot taken before broadcast_applied_change runs is consistent with it
+    entry = _sidebar_entry(change_id, applied_changes[change_id])
+    session_changes.append(entry)
+    _session_index[change_id] = entry
+    changes_seq += 1
+    applied_changes[change_id]["seq"] = changes_seq
     
-    print(f"📝 Applied change stored: {file_path} (ID: {change_id})")
-    print(f"📊 Total applied_changes: {len(applied_changes)}")
-    print(f"📊 Total session_changes: {len(session_changes)}")
+    _ws_logger.debug("[changes] stored %s: %s (new=%s, total=%d)", change_id, file_path, is_new_file, len(applied_changes))
     return change_id
 
 
 def notify_applied_change(change_id: str, file_path: str, is_new: bool = False):
     """Queue an applied file change notification"""
-    print(f"📢 NOTIFY APPLIED CHANGE: {file_path} (ID: {change_id})")
-    file_change_queue.append({
+    applied_change_queue.append({
         "change_id": change_id,
         "file_path": file_path,
         "is_new": is_new,
         "type": "applied"
     })
-    print(f"📋 Queue now has {len(file_change_queue)} items")
+    _ws_logger.debug("[changes] queued %s: %s (%d queued)", change_id, file_path, len(applied_change_queue))
 
 
 async def broadcast_applied_change(change_id: str):
-    """Broadcast an applied file change to all connected clients."""
-    print(f"🔍 Broadcasting applied change: {change_id}")
-    print(f"📊 Applied changes dict: {list(applied_changes.keys())}")
-    print(f"📊 Session changes list: {len(session_changes)} items")
-    
-    if change_id not in applied_changes:
-        print(f"⚠️ Change ID {change_id} not found in applied_changes")
+    """Tell every connected client about a newly applied change (a delta, never the whole list)."""
+    record = applied_changes.get(change_id)
+    if record is None:
+        _ws_logger.warning("[changes] %s not found in applied_changes", change_id)
         return
     
-    change = applied_changes[change_id]
-    
     if not connected_clients:
-        print("⚠️ No WebSocket clients connected!")
         return
+    _flush_logs()
     
-    print(f"📡 Broadcasting to {len(connected_clients)} clients")
-    
-    # Build session changes list with all required fields
-    changes_for_sidebar = []
-    for sc in session_changes:
-        changes_for_sidebar.append({
-            "change_id": sc.get("change_id", ""),
-            "file_path": sc.get("file_path", ""),
-            "file_name": sc.get("file_name", ""),
-            "is_new_file": sc.get("is_new_file", False),
-            "status": sc.get("status", "applied")
+    frames = {
+        SIDEBAR_PROTOCOL: _dumps({"type": "change_added", "protocol": SIDEBAR_PROTOCOL, "seq": record["seq"],
+                                  "change": _sidebar_entry(change_id, record)}),
+    }
+    if any(_channel(ws).protocol == 1 for ws in connected_clients):
+        change = get_applied_change(change_id)  # legacy clients open the diff view straight from the event
+        frames[1] = _dumps({
+            "type": "file_applied",
+            "change_id": change_id,
+            "file_path": change["file_path"],
+            "diff": change["diff"],
+            "is_new_file": change["is_new_file"],
+            "old_content": change["old_content"],
+            "new_content": change["new_content"],
+            "status": change["status"],
         })
-    
-    print(f"📋 Sending {len(changes_for_sidebar)} changes to sidebar")
-    
-    disconnected = set()
-    for ws in connected_clients:
-        try:
-            message = {
-                "type": "file_applied",
-                "change_id": change_id,
-                "file_path": change["file_path"],
-                "diff": change["diff"],
-                "is_new_file": change["is_new_file"],
-                "old_content": change["old_content"],
-                "new_content": change["new_content"],
-                "status": change["status"],
-                "all_changes": changes_for_sidebar
-            }
-            print(f"📤 Sending message: type={message['type']}, file={message['file_path']}, changes={len(message['all_changes'])}")
-            await ws.send_json(message)
-            print(f"✅ Applied change sent to WebSocket client")
-        except Exception as e:
-            print(f"❌ Failed to send applied change to client: {e}")
-            import traceback
-            traceback.print_exc()
-            disconnected.add(ws)
-    
-    for ws in disconnected:
-        connected_clients.discard(ws)
+    _fanout_versioned(frames)
+    _ws_logger.debug("[changes] broadcast %s (seq %d) to %d client(s)", change_id, record["seq"], len(connected_clients))
 
 
 async def process_applied_change_queue():
     """Process queued applied file change notifications"""
-    global file_change_queue
-    print(f"🔄 Processing applied change queue... (total queue: {len(file_change_queue)} items)")
-    
-    items_to_process = [item for item in file_change_queue if item.get("type") == "applied"]
-    print(f"📊 Found {len(items_to_process)} applied changes to process")
-    
-    for item in items_to_process:
-        print(f"📤 Broadcasting applied change: {item['change_id']}")
-        file_change_queue.remove(item)
+    while applied_change_queue:
+        item = applied_change_queue.popleft()
         await broadcast_applied_change(item["change_id"])
 
 
+async def broadcast_session_changes_update():
+    """Send the accept/revert/clear changes made since the last call (deltas for protocol 2, the list for 1)."""
+    global changes_seq, _changes_reset
+    deltas, reset = _status_deltas[:], _changes_reset
+    _status_deltas.clear()
+    _changes_reset = False
+    v2 = []
+    if reset:
+        changes_seq += 1
+        v2.append(_dumps(changes_snapshot()))
+    by_status: Dict[str, list] = {}
+    for change_id, status in deltas:
+        by_status.setdefault(status, []).append(change_id)
+    for status, change_ids in by_status.items():
+        changes_seq += 1
+        v2.append(_dumps({"type": "change_status", "protocol": SIDEBAR_PROTOCOL, "seq": changes_seq,
+                          "status": status, "change_ids": change_ids}))
+    
+    if not connected_clients:
+        return
+    _flush_logs()
+    v1 = _dumps({"type": "session_changes_update", "changes": get_all_session_changes()})
+    for ws in list(connected_clients):
+        ch = _channel(ws)
+        for text in (v2 if ch.protocol >= 2 else [v1]):
+            ch.put(text)
+
+
 def clear_session_changes():
     """Clear all session changes (called when starting new session)"""
-    global session_changes, applied_changes
-    session_changes = []
-    applied_changes = {}
-    print("🗑️ Session changes cleared")
+    global _changes_reset
+    session_changes.clear()
+    _session_index.clear()
+    applied_changes.clear()
+    applied_change_store.clear()
+    _status_deltas.clear()
+    _changes_reset = True
+    _ws_logger.info("🗑️ Session changes cleared")
 
 
 def update_change_status(change_id: str, status: str):
     """Update the status of an applied change (accepted/reverted)"""
-    if change_id in applied_changes:
-        applied_changes[change_id]["status"] = status
-        # Update in session_changes list too
-        for change in session_changes:
-            if change["change_id"] == change_id:
-                change["status"] = status
-                break
-        print(f"📝 Change {change_id} status updated to: {status}")
+    record = applied_changes.get(change_id)
+    if record is not None:
+        record["status"] = status
+        # Update in session_changes list too (same dict object as in the list)
+        entry = _session_index.get(change_id)
+        if entry is not None:
+            entry["status"] = status
+        _status_deltas.append((change_id, status))
+        _ws_logger.debug("[changes] %s status -> %s", change_id, status)
 
 
 def get_all_session_changes():
@@ -384,6 +661,129 @@ def get_all_session_changes():
     return session_changes.copy()
 
 
-def get_applied_change(change_id: str):
-    """Get details of an applied change"""
-    return applied_changes.get(change_id)
+def get_applied_change(change_id: str, with_content: bool = True):
+    """Get details of an applied change, with old/new content and diff reconstructed from the change store"""
+    record = applied_changes.get(change_id)
+    if record is None:
+        return None
+    change = {k: v for k, v in record.items() if k not in ("old_version", "new_version", "diff_blob")}
+    if not with_content:
+        return change
+    change["old_content"] = applied_change_store.content(record["file_path"], record["old_version"])
+    change["new_content"] = applied_change_store.content(record["file_path"], record["new_version"])
+    change["diff"] = applied_change_store.get_text(record["diff_blob"])
+    return change
+
+
+
+# =============================================
+# Event Loop Lag Monitor
+# =============================================
+
+class LoopLagMonitor:
+    """
+    Measures how long the asyncio event loop is blocked and attributes the stall to the
+    graph node(s) running at the time.
+
+    A background task sleeps for `interval` seconds and checks how late it woke up; any
+    overshoot beyond `threshold` is time the loop could not service WebSocket sends,
+    /stop-agent, /kill-process, etc. Node entry/exit also settles the pending lag so a
+    node that blocks right up to its return is still charged for it.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.02):
+        self.interval = interval
+        self.threshold = threshold
+        self.stats: Dict[str, dict] = {}
+        self._active: Dict[str, int] = {}
+        self._deadline = None
+        self._task = None
+        self._logger = logging.getLogger("agent")
+
+    def start(self):
+        """Start the sampling task on the running loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._deadline = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._settle(loop.time())
+
+    def _settle(self, now: float):
+        """Charge lag accumulated since the last expected wake-up to the active node(s)."""
+        if self._deadline is None:
+            return
+        lag = now - self._deadline
+        if lag <= 0:
+            return
+        self._deadline = now
+        if lag < self.threshold:
+            return
+        for name in (list(self._active) or ["(outside graph nodes)"]):
+            entry = self._entry(name)
+            entry["blocked_ms"] += lag * 1000
+            entry["max_block_ms"] = max(entry["max_block_ms"], lag * 1000)
+            entry["stalls"] += 1
+
+    def _entry(self, name: str) -> dict:
+        return self.stats.setdefault(name, {"calls": 0, "blocked_ms": 0.0, "max_block_ms": 0.0, "stalls": 0})
+
+    def _now(self):
+        try:
+            return asyncio.get_running_loop().time()
+        except RuntimeError:
+            return None
+
+    @contextmanager
+    def track(self, name: str):
+        """Attribute any loop stall that happens while the block runs to `name`."""
+        now = self._now()
+        if now is not None:
+            self._settle(now)
+        entry = self._entry(name)
+        entry["calls"] += 1
+        before = entry["blocked_ms"]
+        self._active[name] = self._active.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            now = self._now()
+            if now is not None:
+                self._settle(now)
+            self._active[name] -= 1
+            if not self._active[name]:
+                del self._active[name]
+            blocked = entry["blocked_ms"] - before
+            if blocked:
+                self._logger.info("[loop-lag] node=%s blocked the event loop for %.0f ms", name, blocked)
+
+    def wrap(self, name: str, fn):
+        """Wrap a (sync or async) graph node so its loop stalls are reported under `name`."""
+        async def node(state):
+            with self.track(name):
+                result = fn(state)
+                if inspect.isawaitable(result):
+                    result = await result
+            return result
+        node.__name__ = getattr(fn, "__name__", name)
+        node.__doc__ = fn.__doc__
+        return node
+
+    def snapshot(self) -> dict:
+        """Per-node lag stats (rounded) for the /loop-lag endpoint."""
+        return {
+            name: {
+                "calls": e["calls"],
+                "blocked_ms": round(e["blocked_ms"], 1),
+                "max_block_ms": round(e["max_block_ms"], 1),
+                "stalls": e["stalls"],
+            }
+            for name, e in self.stats.items()
+        }
+
+
+# Shared monitor: graph nodes are wrapped with it in brain.py; server.py starts it.
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,539 @@
+"""
+Workspace Path Index — in-memory file/folder index for the @-mention and / folder pickers.
+
+The pickers used to os.walk the whole workspace (fnmatch + os.stat per file) on every
+keystroke and stop after the first 100/80 hits in walk order. Each workspace is now
+indexed once (skipping whatever workspace_walker ignores: built-in and build-output names,
+.gitignore, .dockerignore, the project ignore file); afterwards only directories that
+changed are rescanned:
+  - on Linux with `watchdog` installed, its inotify wrapper puts one non-recursive watch on
+    each indexed directory (node_modules/, .git/, dist/, ... are never indexed, so never
+    watched), added and removed with the directories; events mark their directory dirty;
+  - otherwise, or once the inotify watch limit is reached, directory mtimes are re-checked at
+    most every WORKSPACE_INDEX_REFRESH_S (adding/removing/renaming an entry bumps the
+    directory's mtime).
+Queries rank every indexed path (exact/prefix/substring/subsequence) and return the best
+matches rather than the first ones found. Substring candidates come from a trigram index over
+the distinct path segments (a workspace has far fewer distinct folder/file names than paths),
+so a query only scores the paths that can contain it. Basename hits rank above directory hits,
+and recently modified entries get a small boost. The same index backs the agent's find_file tool.
+"""
+
+import fnmatch
+import heapq
+import itertools
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from workspace_walker import BUILD_OUTPUT_PATTERNS, get_ignore_matcher
+
+logger = logging.getLogger("agent")
+
+INDEX_REFRESH_INTERVAL = float(os.getenv("WORKSPACE_INDEX_REFRESH_S", "2"))
+MAX_WORKSPACE_INDEXES = int(os.getenv("WORKSPACE_INDEX_MAX_WORKSPACES", "8"))
+RECENCY_BOOST = float(os.getenv("WORKSPACE_INDEX_RECENCY_BOOST", "50"))
+RECENCY_HALF_LIFE = float(os.getenv("WORKSPACE_INDEX_RECENCY_HALF_LIFE_S", "3600"))
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def _name_score(query: str, name_lower: str) -> float:
+    """Relevance of a file/folder name (last path segment) that contains `query`."""
+    if name_lower == query:
+        return 1000.0
+    if name_lower.startswith(query):
+        return 800.0
+    return 600.0 - name_lower.index(query)
+
+
+def _substring_score(query: str, rel_lower: str) -> float:
+    """Relevance of a path that contains `query` (both lowercase)."""
+    name_lower = rel_lower.rsplit("/", 1)[-1]
+    if query in name_lower:
+        score = _name_score(query, name_lower)
+    else:
+        score = 400.0 - rel_lower.index(query) / 10
+    return score - len(rel_lower) / 100
+
+
+def _recency_boost(mtime: float, now: float) -> float:
+    """Up to RECENCY_BOOST for an entry modified just now, halving every RECENCY_HALF_LIFE."""
+    age = max(now - mtime, 0.0)
+    return RECENCY_BOOST * 0.5 ** (age / RECENCY_HALF_LIFE)
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _subsequence_re(text: str):
+    # "[^a]*a[^b]*b..." matches a subsequence in one linear pass (no backtracking blow-up)
+    return re.compile("".join(f"[^{re.escape(ch)}]*{re.escape(ch)}" for ch in text))
+
+
+class _SegmentTrigramIndex:
+    """
+    Trigram postings over the distinct lowercase segments of a set of paths.
+
+    A query piece without "/" can only occur inside a single segment, so its candidates are
+    the paths of the (few) segments that contain it. Paths are kept per segment by role —
+    as their name (last segment) or as one of their parent folders — so name matches, which
+    always outrank folder matches, can be expanded best-segment-first and the rest skipped
+    once they can no longer reach the top `limit`.
+    """
+
+    def __init__(self):
+        self._by_name: Dict[str, set] = {}           # segment → rel paths named by it
+        self._by_dir: Dict[str, set] = {}            # segment → rel paths with it as a parent folder
+        self._segments_by_gram: Dict[str, set] = {}  # trigram → segments that contain it
+
+    def _link(self, table: dict, seg: str, rel: str):
+        paths = table.get(seg)
+        if paths is None:
+            if seg not in self._by_name and seg not in self._by_dir:
+                for gram in _trigrams(seg):
+                    self._segments_by_gram.setdefault(gram, set()).add(seg)
+            paths = table[seg] = set()
+        paths.add(rel)
+
+    def _unlink(self, table: dict, seg: str, rel: str):
+        paths = table.get(seg)
+        if paths is None:
+            return
+        paths.discard(rel)
+        if paths:
+            return
+        del table[seg]
+        if seg in self._by_name or seg in self._by_dir:
+            return
+        for gram in _trigrams(seg):
+            segs = self._segments_by_gram.get(gram)
+            if segs is not None:
+                segs.discard(seg)
+                if not segs:
+                    del self._segments_by_gram[gram]
+
+    def add(self, rel: str):
+        *dirs, name = rel.lower().split("/")
+        self._link(self._by_name, name, rel)
+        for seg in set(dirs):
+            self._link(self._by_dir, seg, rel)
+
+    def discard(self, rel: str):
+        *dirs, name = rel.lower().split("/")
+        self._unlink(self._by_name, name, rel)
+        for seg in set(dirs):
+            self._unlink(self._by_dir, seg, rel)
+
+    def _segments_containing(self, piece: str):
+        grams = _trigrams(piece)
+        if grams:
+            pools = sorted((self._segments_by_gram.get(g, set()) for g in grams), key=len)
+            segments = pools[0].intersection(*pools[1:])
+        else:  # 1–2 characters: scan the distinct segments instead
+            segments = set(self._by_name).union(self._by_dir)
+        return [seg for seg in segments if piece in seg]
+
+    def candidates(self, query: str):
+        """Paths that may contain `query` (lowercase); None when the query can't narrow them."""
+        pieces = [p for p in query.split("/") if p]
+        if not pieces:
+            return None
+        result = set()
+        for seg in self._segments_containing(max(pieces, key=len)):
+            result.update(self._by_name.get(seg, ()))
+            result.update(self._by_dir.get(seg, ()))
+        return result
+
+    def rank(self, query: str, limit: int, mtime_of) -> list:
+        """
+        Best `limit` (score, rel) pairs for a lowercase query: name matches, then folder
+        matches, then fuzzy (per-segment subsequence) matches — each later tier only when it
+        can still place.
+        """
+        now = time.time()
+        best: list = []  # min-heap of (score, rel)
+        seen = set()
+
+        def offer(score, rel):
+            seen.add(rel)
+            if len(best) < limit:
+                heapq.heappush(best, (score, rel))
+            elif score > best[0][0]:
+                heapq.heapreplace(best, (score, rel))
+
+        def can_place(max_score):
+            return len(best) < limit or max_score > best[0][0]
+
+        pieces = [p for p in query.split("/") if p]
+        if not pieces:
+            return []
+        piece = max(pieces, key=len)
+        segments = self._segments_containing(piece)
+
+        if "/" not in query:
+            by_score = sorted(((_name_score(query, seg), seg) for seg in segments if seg in self._by_name),
+                              reverse=True)
+            for score, seg in by_score:
+                if not can_place(score + RECENCY_BOOST):
+                    break
+                for rel in self._by_name[seg]:
+                    offer(score - len(rel) / 100 + _recency_boost(mtime_of(rel), now), rel)
+            if can_place(400.0 + RECENCY_BOOST):
+                for seg in segments:
+                    for rel in self._by_dir.get(seg, ()):
+                        if rel not in seen:
+                            rl = rel.lower()
+                            offer(400.0 - rl.index(query) / 10 - len(rl) / 100
+                                  + _recency_boost(mtime_of(rel), now), rel)
+        else:
+            for seg in segments:
+                for table in (self._by_name, self._by_dir):
+                    for rel in table.get(seg, ()):
+                        rl = rel.lower()
+                        if rel not in seen and query in rl:
+                            offer(_substring_score(query, rl) + _recency_boost(mtime_of(rel), now), rel)
+
+        if can_place(120.0):
+            # Fuzzy: the longest piece must be a subsequence of one segment, the whole query
+            # a subsequence of the path; name matches and earlier / tighter completion rank higher
+            piece_re, fuzzy = _subsequence_re(piece), _subsequence_re(query)
+            for seg in set(self._by_name).union(self._by_dir):
+                if not piece_re.match(seg):
+                    continue
+                for table in (self._by_name, self._by_dir):
+                    for rel in table.get(seg, ()):
+                        if rel in seen:
+                            continue
+                        rl = rel.lower()
+                        m = fuzzy.match(rl)
+                        if m:
+                            name_hit = 20.0 if piece_re.match(rl.rsplit("/", 1)[-1]) else 0.0
+                            offer(100.0 + name_hit - m.end() / 10 - len(rl) / 100, rel)
+        return sorted(best, reverse=True)
+
+
+class WorkspaceIndex:
+    """Files and folders under one workspace root, kept current incrementally."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, tuple] = {}           # rel path → (size, mtime)
+        self.dir_mtimes: Dict[str, float] = {}      # rel dir ("." = root) → mtime at last scan
+        self._children: Dict[str, tuple] = {}       # rel dir → (file names, subdir names)
+        self._dirty: set = set()
+        self._version = 0                           # bumped on every rescan
+        self._entries_cache: Dict[str, tuple] = {}  # kind → (version, [(rel_lower, rel), ...])
+        self._grams = {"files": _SegmentTrigramIndex(), "folders": _SegmentTrigramIndex()}
+        self._lock = threading.RLock()
+        self._ignore = get_ignore_matcher(self.root, BUILD_OUTPUT_PATTERNS)
+        self._inotify = None                        # watchdog Inotify, None = polling
+        self._watched: set = set()                  # rel dirs with an inotify watch (root excluded)
+        self._last_refresh = 0.0
+        started = time.monotonic()
+        self._start_watcher()  # before indexing: each directory is watched as it is scanned
+        self._index_tree(".")
+        logger.info("[workspace-index] indexed %s: %d files, %d dirs in %.0f ms (watcher=%s)",
+                    self.root, len(self.files), len(self.dir_mtimes),
+                    (time.monotonic() - started) * 1000, bool(self._inotify))
+
+    # ── Indexing ──────────────────────────────────
+
+    def _abs(self, rel: str) -> str:
+        return self.root if rel == "." else os.path.join(self.root, rel)
+
+    def _rel(self, rel_dir: str, name: str) -> str:
+        return name if rel_dir == "." else f"{rel_dir}/{name}"
+
+    def _put_file(self, rel: str, st):
+        if rel not in self.files:
+            self._grams["files"].add(rel)
+        self.files[rel] = (st.st_size, st.st_mtime)
+
+    def _pop_file(self, rel: str):
+        if self.files.pop(rel, None) is not None:
+            self._grams["files"].discard(rel)
+
+    def _pop_dir(self, rel_dir: str):
+        if self.dir_mtimes.pop(rel_dir, None) is not None and rel_dir != ".":
+            self._grams["folders"].discard(rel_dir)
+            self._unwatch(rel_dir)
+
+    def _scan_dir(self, rel_dir: str):
+        """Index the direct entries of one directory; returns its subdirectory names."""
+        file_names, subdirs = set(), set()
+        try:
+            mtime = os.stat(self._abs(rel_dir)).st_mtime
+            if rel_dir not in self.dir_mtimes and rel_dir != ".":
+                self._grams["folders"].add(rel_dir)
+            if rel_dir not in self._watched and rel_dir != ".":
+                self._watch(rel_dir)
+            self.dir_mtimes[rel_dir] = mtime
+            dirs, files = self._ignore.scan(rel_dir)
+            subdirs.update(entry.name for entry in dirs)
+            for entry in files:
+                try:
+                    self._put_file(self._rel(rel_dir, entry.name), entry.stat())
+                    file_names.add(entry.name)
+                except OSError:
+                    continue
+        except OSError:
+            self._pop_dir(rel_dir)
+        self._children[rel_dir] = (file_names, subdirs)
+        return subdirs
+
+    def _index_tree(self, rel_dir: str):
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            for name in self._scan_dir(current):
+                stack.append(self._rel(current, name))
+
+    def _drop_tree(self, rel_dir: str):
+        file_names, subdirs = self._children.pop(rel_dir, (set(), set()))
+        self._pop_dir(rel_dir)
+        for name in file_names:
+            self._pop_file(self._rel(rel_dir, name))
+        for name in subdirs:
+            self._drop_tree(self._rel(rel_dir, name))
+
+    def _rescan_dir(self, rel_dir: str):
+        """Re-read one directory: add/remove its files, index new subtrees, drop removed ones."""
+        if rel_dir not in self._children:
+            return
+        old_files, old_subdirs = self._children[rel_dir]
+        old_rules = self._ignore.chain(rel_dir)
+        subdirs = self._scan_dir(rel_dir)
+        if self._ignore.chain(rel_dir) != old_rules:
+            # An ignore file here changed: re-filter the whole subtree
+            for name in old_subdirs:
+                self._drop_tree(self._rel(rel_dir, name))
+            old_subdirs = set()
+        for name in old_files - self._children[rel_dir][0]:
+            self._pop_file(self._rel(rel_dir, name))
+        for name in old_subdirs - subdirs:
+            self._drop_tree(self._rel(rel_dir, name))
+        for name in subdirs - old_subdirs:
+            self._index_tree(self._rel(rel_dir, name))
+
+    # ── Change tracking ───────────────────────────
+
+    def _start_watcher(self):
+        try:
+            from watchdog.observers.inotify_c import Inotify, InotifyConstants as C
+        except Exception:  # not Linux, or watchdog not installed
+            return
+        # Only what changes a directory's listing or a file's size/mtime; no open/read noise
+        mask = (C.IN_CREATE | C.IN_DELETE | C.IN_MOVED_FROM | C.IN_MOVED_TO | C.IN_CLOSE_WRITE
+                | C.IN_DELETE_SELF | C.IN_MOVE_SELF)
+        try:
+            self._inotify = Inotify(os.fsencode(self.root), event_mask=mask)
+        except OSError as e:
+            logger.warning("[workspace-index] watcher unavailable for %s, polling instead: %s", self.root, e)
+            return
+        threading.Thread(target=self._read_events, args=(self._inotify,),
+                         name="workspace-index-watch", daemon=True).start()
+
+    def _watch(self, rel_dir: str):
+        if self._inotify is None:
+            return
+        try:
+            self._inotify.add_watch(os.fsencode(self._abs(rel_dir)))
+            self._watched.add(rel_dir)
+        except FileNotFoundError:
+            pass  # removed again before it was watched; the parent's event covers it
+        except OSError as e:  # inotify watch limit (max_user_watches), ...
+            logger.warning("[workspace-index] cannot watch %s (%s): polling %s instead", rel_dir, e, self.root)
+            self._stop_watcher()
+
+    def _unwatch(self, rel_dir: str):
+        if self._inotify is None or rel_dir not in self._watched:
+            return
+        self._watched.discard(rel_dir)
+        path = self._abs(rel_dir)
+        if not os.path.isdir(path):
+            return  # deleted/moved: the kernel drops (or keeps following) the watch itself
+        try:
+            self._inotify.remove_watch(os.fsencode(path))  # still there, but now ignored
+        except (KeyError, OSError):
+            pass
+
+    def _stop_watcher(self):
+        inotify, self._inotify = self._inotify, None
+        self._watched.clear()
+        if inotify is not None:
+            inotify.close()
+            self._last_refresh = 0.0  # poll on the next refresh
+
+    def _read_events(self, inotify):
+        """Watcher thread: mark the directories that events touched dirty until the watcher is closed."""
+        while True:
+            try:
+                events = inotify.read_events()
+            except (OSError, KeyError):
+                events = []  # a record for a watch already removed spoils the batch: treat as lost
+            if self._inotify is not inotify:  # closed (or fell back to polling)
+                return
+            if not events:
+                # Events were lost (IN_Q_OVERFLOW records are skipped, or a failed read): rescan everything
+                with self._lock:
+                    self._dirty.update(self.dir_mtimes)
+                continue
+            for event in events:
+                path = os.fsdecode(event.src_path)
+                if event.is_ignored:
+                    # The kernel dropped this directory's watch (deleted/moved away): re-watch
+                    # it if a directory of that name is indexed again
+                    rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    with self._lock:
+                        self._watched.discard(rel)
+                    continue
+                # Entries created inside an indexed directory may still be ignored (node_modules/)
+                if not self._ignore.is_ignored_path(path):
+                    self._mark_dirty(path, event.is_directory)
+
+    def _mark_dirty(self, abs_path: str, is_directory: bool):
+        rel = os.path.relpath(abs_path, self.root).replace(os.sep, "/")
+        if rel.startswith(".."):
+            return
+        parent = os.path.dirname(rel) or "."
+        with self._lock:
+            self._dirty.add(parent)
+            if is_directory and rel != ".":
+                self._dirty.add(rel)
+
+    def refresh(self):
+        """Apply pending changes (watcher events, or changed directory mtimes when polling)."""
+        with self._lock:
+            if self._inotify is None:
+                now = time.monotonic()
+                if now - self._last_refresh >= INDEX_REFRESH_INTERVAL:
+                    self._last_refresh = now
+                    for rel_dir, mtime in list(self.dir_mtimes.items()):
+                        try:
+                            if os.stat(self._abs(rel_dir)).st_mtime != mtime:
+                                self._dirty.add(rel_dir)
+                        except OSError:
+                            self._dirty.add(os.path.dirname(rel_dir) or ".")
+            dirty, self._dirty = self._dirty, set()
+            for rel_dir in sorted(dirty, key=len):
+                self._rescan_dir(rel_dir)
+            if dirty:
+                self._version += 1
+            # Files edited in place don't change their directory; refresh size/mtime lazily
+            # in search results instead.
+
+    def close(self):
+        with self._lock:
+            self._stop_watcher()
+
+    # ── Queries ───────────────────────────────────
+
+    def _entries(self, kind: str) -> list:
+        """(rel_lower, rel) for every file or folder; rebuilt only after the index changed."""
+        with self._lock:
+            cached = self._entries_cache.get(kind)
+            if cached and cached[0] == self._version:
+                return cached[1]
+            paths = self.files if kind == "files" else [d for d in self.dir_mtimes if d != "."]
+            # Shallow, short paths first: this order is also the answer to an empty query
+            entries = sorted(((rel.lower(), rel) for rel in paths),
+                             key=lambda e: (e[1].count("/"), len(e[1]), e[1]))
+            self._entries_cache[kind] = (self._version, entries)
+            return entries
+
+    def _search(self, kind: str, query: str, limit: int) -> List[str]:
+        self.refresh()
+        with self._lock:
+            q = (query or "").lower()
+            if not q.strip("/"):
+                return [rel for _, rel in self._entries(kind)[:limit]]
+            if kind == "files":
+                mtime_of = lambda rel: self.files.get(rel, (0, 0.0))[1]
+            else:
+                mtime_of = lambda rel: self.dir_mtimes.get(rel, 0.0)
+            return [rel for _, rel in self._grams[kind].rank(q, limit, mtime_of)]
+
+    def search_files(self, query: str = None, limit: int = 100) -> List[dict]:
+        """Top `limit` files for `query`, best match first."""
+        results = []
+        for rel in self._search("files", query, limit):
+            full_path = self._abs(rel)
+            try:
+                size = os.stat(full_path).st_size
+            except OSError:
+                continue
+            results.append({
+                "path": rel,
+                "full_path": full_path,
+                "name": os.path.basename(rel),
+                "size": size,
+                "is_directory": False,
+            })
+        return results
+
+    def find_files(self, name: str, under: str = ".", limit: int = 50) -> List[str]:
+        """
+        Indexed files and folders under `under` (rel dir) whose name — or path suffix, when
+        `name` contains "/" — equals `name` or matches it as a glob (e.g. "*.sln", "nunit/*.cs").
+        Most recently modified first.
+        """
+        self.refresh()
+        name = name.strip().strip("/").replace(os.sep, "/")
+        prefix = "" if under in ("", ".") else under.rstrip("/") + "/"
+        with self._lock:
+            dirs = [d for d in self.dir_mtimes if d != "."]
+            if _GLOB_CHARS.search(name):
+                if "/" in name:
+                    matches = [rel for rel in itertools.chain(self.files, dirs)
+                               if fnmatch.fnmatchcase(rel, name) or fnmatch.fnmatchcase(rel, "*/" + name)]
+                else:
+                    matches = [rel for rel in itertools.chain(self.files, dirs)
+                               if fnmatch.fnmatchcase(rel.rsplit("/", 1)[-1], name)]
+            else:
+                candidates = self._grams["files"].candidates(name.lower())
+                if candidates is None:
+                    candidates = self.files
+                matches = [rel for rel in itertools.chain(candidates, dirs)
+                           if rel == name or rel.endswith("/" + name)]
+            matches = [rel for rel in matches if rel.startswith(prefix)]
+            mtime_of = lambda rel: self.files[rel][1] if rel in self.files else self.dir_mtimes[rel]
+            matches.sort(key=lambda rel: (-mtime_of(rel), rel.count("/"), rel))
+        return matches[:limit]
+
+    def search_folders(self, query: str = None, limit: int = 80) -> List[dict]:
+        """Top `limit` folders (excluding the root) for `query`, best match first."""
+        return [
+            {"path": rel, "name": os.path.basename(rel), "full_path": self._abs(rel)}
+            for rel in self._search("folders", query, limit)
+        ]
+
+
+# Shared per-workspace indexes (most recently used last)
+_indexes: "OrderedDict[str, WorkspaceIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_workspace_index(root: str) -> WorkspaceIndex:
+    """Index for `root`, built on first use (blocking — call via asyncio.to_thread)."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is not None:
+            _indexes.move_to_end(root)
+            return index
+    index = WorkspaceIndex(root)
+    with _indexes_lock:
+        existing = _indexes.get(root)
+        if existing is not None:  # built concurrently by another request
+            index.close()
+            return existing
+        _indexes[root] = index
+        while len(_indexes) > MAX_WORKSPACE_INDEXES:
+            _, evicted = _indexes.popitem(last=False)
+            evicted.close()
+    return index
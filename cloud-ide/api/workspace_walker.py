@@ -0,0 +1,280 @@
+"""
+Workspace Walker — one ignore-aware directory traversal for everything in api/.
+
+Every workspace traversal (the file/folder pickers' index, find_file, the project
+description generator, the review collectors) goes through this module so that huge
+generated directories are pruned before they are ever descended into:
+  - built-in names (.git, node_modules, __pycache__, ...) plus caller-specific extras; generic
+    build-output names (BUILD_OUTPUT_PATTERNS: dist, build, ...) are such an extra, passed only
+    by the pickers' index: a `build/` package or `Build` namespace folder is source to the
+    review and description collectors unless an ignore file lists it;
+  - `.gitignore` files at every level (deeper files take precedence, last match wins, "!" re-includes);
+  - `.dockerignore` and the project ignore file (WORKSPACE_IGNORE_FILE, gitignore syntax) at the root.
+Each ignore file is compiled once into regexes and only recompiled when its mtime/size changes.
+"""
+
+import fnmatch
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_IGNORE_PATTERNS = [
+    '*.pyc', '__pycache__', '.git', 'node_modules', '.vscode',
+    'venv', '.env', '*.egg-info', '.DS_Store', '*.log',
+]
+BUILD_OUTPUT_PATTERNS = ('dist', 'build', '.next', '.cache', 'coverage')
+PROJECT_IGNORE_FILE = os.getenv("WORKSPACE_IGNORE_FILE", ".neuralstackignore")
+ROOT_IGNORE_FILES = (".gitignore", ".dockerignore", PROJECT_IGNORE_FILE)
+MAX_IGNORE_MATCHERS = int(os.getenv("WORKSPACE_IGNORE_MAX_MATCHERS", "16"))
+
+
+# ── Ignore file compilation ───────────────────
+
+def _glob_to_regex(pattern: str) -> str:
+    """gitignore glob → regex body ("**" spans directories, "*"/"?" stay within one)."""
+    out, i, n = [], 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class _IgnoreFile:
+    """Compiled rules of one ignore file, matched against paths relative to its directory."""
+
+    def __init__(self, lines: Iterable[str], anchor_all: bool = False):
+        # anchor_all: .dockerignore patterns are relative to the root ("foo" ≠ "a/foo")
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negate, dir_only)
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.strip("/") if anchor_all else line.rstrip("/")
+            if not line:
+                continue
+            anchored = anchor_all or "/" in line
+            body = _glob_to_regex(line.lstrip("/"))
+            regex = re.compile(("^" if anchored else "^(?:.*/)?") + body + "$")
+            self.rules.append((regex, negate, dir_only))
+        self._has_negation = any(negate for _, negate, _ in self.rules)
+        if not self._has_negation:
+            # Common case: one alternation per kind instead of a rule-by-rule scan
+            self._any = self._combine(r for r, _, dir_only in self.rules if not dir_only)
+            self._dirs = self._combine(r for r, _, dir_only in self.rules if dir_only)
+
+    @staticmethod
+    def _combine(regexes):
+        parts = [r.pattern for r in regexes]
+        return re.compile("|".join(f"(?:{p})" for p in parts)) if parts else None
+
+    def match(self, rel: str, is_dir: bool) -> Optional[bool]:
+        """True = ignored, False = re-included, None = no rule applies."""
+        if not self._has_negation:
+            if self._any is not None and self._any.match(rel):
+                return True
+            if is_dir and self._dirs is not None and self._dirs.match(rel):
+                return True
+            return None
+        for regex, negate, dir_only in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                return not negate
+        return None
+
+
+_compiled: dict = {}  # abs path → ((mtime_ns, size), _IgnoreFile)
+_compiled_lock = threading.Lock()
+
+
+def _load_ignore_file(path: str) -> Optional[_IgnoreFile]:
+    """Compiled rules for `path` (None if missing); recompiled only when the file changed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        _compiled.pop(path, None)
+        return None
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _compiled.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            rules = _IgnoreFile(f, anchor_all=os.path.basename(path) == ".dockerignore")
+    except OSError:
+        return None
+    with _compiled_lock:
+        _compiled[path] = (stamp, rules)
+    return rules
+
+
+# ── Matcher ───────────────────────────────────
+
+class IgnoreMatcher:
+    """Decides what is ignored under one root; `walk()` / `scan()` apply it while traversing."""
+
+    def __init__(self, root: str, extra_names: Iterable[str] = (), use_ignore_files: bool = True):
+        self.root = os.path.abspath(root)
+        self.use_ignore_files = use_ignore_files
+        patterns = list(DEFAULT_IGNORE_PATTERNS) + list(extra_names)
+        self._names = re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+        self._chains: dict = {}  # rel dir → ((base rel dir, _IgnoreFile), ...) deepest first
+
+    def _abs(self, rel: str) -> str:
+        return self.root if rel == "." else os.path.join(self.root, rel)
+
+    def _local_rules(self, rel_dir: str) -> tuple:
+        if not self.use_ignore_files:
+            return ()
+        names = ROOT_IGNORE_FILES if rel_dir == "." else (".gitignore",)
+        found = []
+        for name in names:
+            rules = _load_ignore_file(os.path.join(self._abs(rel_dir), name))
+            if rules is not None:
+                found.append((rel_dir, rules))
+        return tuple(found)
+
+    def chain(self, rel_dir: str, refresh: bool = False) -> tuple:
+        """Ignore files that apply inside `rel_dir`, deepest first."""
+        if not refresh:
+            cached = self._chains.get(rel_dir)
+            if cached is not None:
+                return cached
+        parent = () if rel_dir == "." else self.chain(os.path.dirname(rel_dir) or ".")
+        chain = self._local_rules(rel_dir) + parent
+        self._chains[rel_dir] = chain
+        return chain
+
+    def is_ignored(self, rel: str, is_dir: bool, chain: tuple = None) -> bool:
+        """Whether the entry `rel` (parent assumed not ignored) is ignored."""
+        name = rel.rsplit("/", 1)[-1]
+        if self._names.match(name):
+            return True
+        if chain is None:
+            chain = self.chain(os.path.dirname(rel) or ".")
+        for base, rules in chain:
+            decision = rules.match(rel if base == "." else rel[len(base) + 1:], is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+    def is_ignored_path(self, path: str) -> bool:
+        """Whether `path` (absolute or root-relative) or any folder above it is ignored."""
+        rel = os.path.relpath(path, self.root) if os.path.isabs(path) else path
+        rel = rel.replace(os.sep, "/")
+        if rel.startswith(".."):
+            return False
+        parts = [p for p in rel.split("/") if p and p != "."]
+        for i in range(len(parts)):
+            if self.is_ignored("/".join(parts[:i + 1]), is_dir=i < len(parts) - 1):
+                return True
+        return False
+
+    def scan(self, rel_dir: str) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+        """(subdirectories, files) of one directory that are not ignored. Raises OSError."""
+        chain = self.chain(rel_dir, refresh=True)  # picks up edits to this directory's ignore files
+        prefix = "" if rel_dir == "." else rel_dir + "/"
+        dirs, files = [], []
+        with os.scandir(self._abs(rel_dir)) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if not is_dir and not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if self.is_ignored(prefix + entry.name, is_dir, chain):
+                    continue
+                (dirs if is_dir else files).append(entry)
+        return dirs, files
+
+    def walk(self, start: str = ".") -> Iterator[Tuple[str, List[os.DirEntry], List[os.DirEntry]]]:
+        """
+        Top-down (rel_dir, subdir entries, file entries), like os.walk. Ignored directories
+        are never entered; callers may prune further by removing entries from the subdir list.
+        """
+        start = start.replace(os.sep, "/").strip("/") or "."
+        if start != "." and self.is_ignored_path(start):
+            return
+        stack = [start]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                dirs, files = self.scan(rel_dir)
+            except OSError:
+                continue
+            yield rel_dir, dirs, files
+            prefix = "" if rel_dir == "." else rel_dir + "/"
+            stack.extend(prefix + d.name for d in reversed(dirs))
+
+
+_matchers: "OrderedDict[tuple, IgnoreMatcher]" = OrderedDict()
+_matchers_lock = threading.Lock()
+
+
+def get_ignore_matcher(root: str, extra_names: Iterable[str] = (), use_ignore_files: bool = True) -> IgnoreMatcher:
+    """
+    Shared matcher for (root, extra names); ignore files are re-checked on every scan.
+    use_ignore_files=False prunes only the built-in/extra names (e.g. to look inside .gitignore'd bin/).
+    """
+    key = (os.path.abspath(root), tuple(sorted(extra_names)), use_ignore_files)
+    with _matchers_lock:
+        matcher = _matchers.get(key)
+        if matcher is None:
+            matcher = _matchers[key] = IgnoreMatcher(*key)
+            while len(_matchers) > MAX_IGNORE_MATCHERS:
+                _matchers.popitem(last=False)
+        else:
+            _matchers.move_to_end(key)
+        return matcher
+
+
+def walk_files(root: str, start: str = ".", suffixes: Tuple[str, ...] = None,
+               extra_names: Iterable[str] = ()) -> List[str]:
+    """Absolute paths of the non-ignored files under root/start (optionally by suffix)."""
+    matcher = get_ignore_matcher(root, extra_names)
+    results = []
+    for rel_dir, _, files in matcher.walk(start):
+        for entry in files:
+            if suffixes is None or entry.name.endswith(suffixes):
+                results.append(entry.path)
+    return results